@@ -1,19 +1,19 @@
 import json
-import re
 
+from validation import EMAIL_PATTERN, check_person
 
-# Helper function for email validation
+
+# Helper function for email validation; the rule itself lives in validation.py
 def is_valid_email(email):
-    return re.match(r"[^@]+@[^@]+\.[^@]+", email)
+    return EMAIL_PATTERN.fullmatch(email)
 
 class Person:
-    def __init__(self, name, age, _email):
+    def __init__(self, name, age, _email, campus=""):
         self.name = name
         self.age = age
-        if int(age) < 0:
-            raise ValueError("Age cannot be negative")
-        if not is_valid_email(_email):
-            raise ValueError("Invalid email format")
+        self.campus = campus  # Campus or department; selects the data shard
+        # Raises ValueError naming every problem (see validation.py)
+        check_person(age, _email)
         self._email = _email
 
     def introduce(self):
@@ -37,8 +37,8 @@ class Person:
         )
 
 class Student(Person):
-    def __init__(self, name, age, _email, student_id, registered_courses=None):
-        super().__init__(name, age, _email)
+    def __init__(self, name, age, _email, student_id, registered_courses=None, campus=""):
+        super().__init__(name, age, _email, campus)
         self.student_id = student_id
         self.registered_courses = registered_courses if registered_courses is not None else []
 
@@ -52,7 +52,8 @@ class Student(Person):
             "Age": self.age,
             "email": self._email,
             "id": self.student_id,
-            "registered_courses": self.registered_courses
+            "registered_courses": self.registered_courses,
+            "campus": self.campus
         }
 
     @classmethod
@@ -63,13 +64,14 @@ class Student(Person):
             age=data["Age"],
             _email=data["email"],
             student_id=data["id"],
-            registered_courses=data.get("registered_courses", [])
+            registered_courses=data.get("registered_courses", []),
+            campus=data.get("campus", "")
         )
 
 
 class Instructor(Person):
-    def __init__(self, name, age, _email, instructor_id, assigned_courses=None):
-        super().__init__(name, age, _email)
+    def __init__(self, name, age, _email, instructor_id, assigned_courses=None, campus=""):
+        super().__init__(name, age, _email, campus)
         self.instructor_id = instructor_id
         self.assigned_courses = assigned_courses if assigned_courses is not None else []
 
@@ -77,12 +79,90 @@ class Instructor(Person):
         self.assigned_courses.append(course)
 
 class Course:
-    def __init__(self, course_id, course_name, instructor=None, enrolled_students=None):
+    def __init__(self, course_id, course_name, instructor=None, enrolled_students=None, meetings=None, room=None,
+                 campus="", capacity=None):
         self.course_id = course_id
         self.course_name = course_name
         self.instructor = instructor  # Instructor object
         self.enrolled_students = enrolled_students if enrolled_students is not None else []  # List of Student objects
+        self.meetings = meetings if meetings is not None else []  # List of scheduling.Meeting
+        self.room = room
+        self.campus = campus
+        self.capacity = capacity  # Maximum enrolled students; None means unlimited
+
+    def is_full(self):
+        return self.capacity is not None and len(self.enrolled_students) >= self.capacity
 
     def add_student(self, student):
+        # Concurrent registrations go through registration.RegistrationDesk instead
+        if student in self.enrolled_students:
+            return
+        if self.is_full():
+            raise ValueError(f"Course {self.course_id} is full ({self.capacity} seats)")
         self.enrolled_students.append(student)
 
+
+
+# Helper to read a person record no matter which GUI produced it.
+# tkinter2 stores Student objects (or dicts keyed "n_entry"/"name"), the PyQt
+# app stores dicts keyed "ID"/"Name"/"Email"/"Courses".
+def person_fields(record):
+    if isinstance(record, Person):
+        person_id = getattr(record, "student_id", None)
+        if person_id is None:
+            person_id = getattr(record, "instructor_id", "")
+        courses = getattr(record, "registered_courses", None)
+        if courses is None:
+            courses = getattr(record, "assigned_courses", [])
+        return {
+            "id": person_id,
+            "name": record.name,
+            "age": record.age,
+            "email": record._email,
+            "courses": courses
+        }
+    return {
+        "id": record.get("id", record.get("ID", "")),
+        "name": record.get("n_entry", record.get("name", record.get("Name", ""))),
+        "age": record.get("Age", record.get("age", 0)),
+        "email": record.get("email", record.get("Email", "")),
+        "courses": record.get("registered_courses",
+                              record.get("assigned_courses", record.get("Courses", [])))
+    }
+
+
+# Helper to read the ID of any record: Student/Instructor/Course objects or dicts
+def record_id(record):
+    if isinstance(record, Person):
+        return person_fields(record)["id"]
+    if isinstance(record, Course):
+        return record.course_id
+    return record.get("id", record.get("ID", ""))
+
+
+# Helper to read a course record: Course objects, tkinter2 dicts
+# ("course_name"/"id"/"instructor_name"/"enrolled_students") or PyQt dicts ("ID"/"Name").
+# Dicts keep meetings as "Mon 09:00-10:15" strings, Course objects as scheduling.Meeting
+def course_fields(record):
+    if isinstance(record, Course):
+        instructor = record.instructor
+        if isinstance(instructor, Person):
+            instructor = instructor.name
+        return {
+            "id": record.course_id,
+            "name": record.course_name,
+            "instructor": instructor or "",
+            "students": record.enrolled_students,
+            "capacity": record.capacity,
+            "meetings": record.meetings,
+            "room": record.room
+        }
+    return {
+        "id": record.get("id", record.get("ID", "")),
+        "name": record.get("course_name", record.get("Name", "")),
+        "instructor": record.get("instructor_name") or "",
+        "students": record.get("enrolled_students", []),
+        "capacity": record.get("capacity", record.get("Capacity")),
+        "meetings": record.get("meetings", record.get("Meetings", [])),
+        "room": record.get("room", record.get("Room"))
+    }
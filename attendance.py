@@ -0,0 +1,229 @@
+"""
+attendance.py
+=============
+
+Attendance tracking keyed by (course ID, date, student ID).
+
+Marks are never written into `school_data.json`. They go to date-partitioned,
+append-only files under an `attendance/` directory, one file per day
+(`attendance/2024-10-01.log`). Each course gives every student a fixed bit
+position (kept in the append-only `attendance/roster.log`), so one class
+meeting is held in memory as two integers used as bitmaps: who was recorded
+and who was present. A partition can be compacted to one bitmap line per
+course.
+
+Per-student, per-course and per-(course, student) counters are kept up to date
+on every mark, so attendance rates are dictionary lookups.
+
+Classes:
+--------
+- AttendanceStore
+"""
+
+import datetime
+import json
+import os
+
+ATTENDANCE_DIR = "attendance"
+ROSTER_FILE = "roster.log"
+
+
+def _date_key(day):
+    if isinstance(day, (datetime.date, datetime.datetime)):
+        return day.strftime("%Y-%m-%d")
+    # Validate and normalise strings such as "2024-10-01"
+    return datetime.date.fromisoformat(day).isoformat()
+
+
+def _rate(counter):
+    present, recorded = counter
+    return present / recorded if recorded else None
+
+
+class AttendanceStore:
+    """
+    Date-partitioned attendance store.
+
+    Attributes:
+    -----------
+    directory : str
+        Folder holding the partitions and the roster file.
+    days : dict
+        date -> {course_id: [recorded_bitmap, present_bitmap]}.
+    """
+
+    def __init__(self, directory=ATTENDANCE_DIR):
+        self.directory = directory
+        self.days = {}
+        self._positions = {}      # course_id -> {student_id: bit}
+        self._students = {}       # course_id -> [student_id by bit]
+        self._by_student = {}     # student_id -> [present, recorded]
+        self._by_course = {}      # course_id -> [present, recorded]
+        self._by_pair = {}        # (course_id, student_id) -> [present, recorded]
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # --- storage ---
+
+    def _partition_path(self, date_key):
+        return os.path.join(self.directory, date_key + ".log")
+
+    def _append(self, path, record):
+        with open(path, "a") as file_handler:
+            file_handler.write(json.dumps(record) + "\n")
+
+    def _load(self):
+        roster_path = os.path.join(self.directory, ROSTER_FILE)
+        if os.path.exists(roster_path):
+            with open(roster_path, "r") as file_handler:
+                for line in file_handler:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._assign_bit(record["course"], record["student"])
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(".log") or file_name == ROSTER_FILE:
+                continue
+            date_key = file_name[:-4]
+            with open(os.path.join(self.directory, file_name), "r") as file_handler:
+                for line in file_handler:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if "student" in record:
+                        self._apply(date_key, record["course"], record["student"], record["present"])
+                    else:
+                        self._apply_bitmaps(date_key, record["course"],
+                                            int(record["recorded"], 16), int(record["present"], 16))
+
+    def _assign_bit(self, course_id, student_id):
+        positions = self._positions.setdefault(course_id, {})
+        if student_id not in positions:
+            positions[student_id] = len(positions)
+            self._students.setdefault(course_id, []).append(student_id)
+            return True
+        return False
+
+    def _bit(self, course_id, student_id):
+        if self._assign_bit(course_id, student_id):
+            self._append(os.path.join(self.directory, ROSTER_FILE),
+                         {"course": course_id, "student": student_id})
+        return self._positions[course_id][student_id]
+
+    # --- counters ---
+
+    def _count(self, course_id, student_id, present_delta, recorded_delta):
+        for table, key in ((self._by_student, student_id), (self._by_course, course_id),
+                           (self._by_pair, (course_id, student_id))):
+            counter = table.setdefault(key, [0, 0])
+            counter[0] += present_delta
+            counter[1] += recorded_delta
+
+    def _apply(self, date_key, course_id, student_id, present):
+        bit = 1 << self._positions[course_id][student_id]
+        bitmaps = self.days.setdefault(date_key, {}).setdefault(course_id, [0, 0])
+        was_recorded = bool(bitmaps[0] & bit)
+        was_present = bool(bitmaps[1] & bit)
+        bitmaps[0] |= bit
+        if present:
+            bitmaps[1] |= bit
+        else:
+            bitmaps[1] &= ~bit
+        self._count(course_id, student_id, int(present) - int(was_present), 0 if was_recorded else 1)
+
+    def _apply_bitmaps(self, date_key, course_id, recorded, present):
+        students = self._students.get(course_id, [])
+        for bit, student_id in enumerate(students):
+            mask = 1 << bit
+            if recorded & mask:
+                self._apply(date_key, course_id, student_id, bool(present & mask))
+
+    # --- public API ---
+
+    def mark(self, course_id, day, student_id, present=True):
+        """
+        Records one student as present or absent for one course meeting.
+        Marking the same student again on the same day overwrites the earlier mark.
+        """
+        date_key = _date_key(day)
+        self._bit(course_id, student_id)
+        self._append(self._partition_path(date_key),
+                     {"course": course_id, "student": student_id, "present": bool(present)})
+        self._apply(date_key, course_id, student_id, bool(present))
+
+    def mark_many(self, course_id, day, present_ids, absent_ids=()):
+        """
+        Records a whole class at once with a single file append.
+        """
+        date_key = _date_key(day)
+        lines = []
+        for student_ids, present in ((present_ids, True), (absent_ids, False)):
+            for student_id in student_ids:
+                self._bit(course_id, student_id)
+                self._apply(date_key, course_id, student_id, present)
+                lines.append(json.dumps({"course": course_id, "student": student_id,
+                                         "present": present}))
+        if lines:
+            with open(self._partition_path(date_key), "a") as file_handler:
+                file_handler.write("\n".join(lines) + "\n")
+
+    def is_present(self, course_id, day, student_id):
+        """
+        Returns True/False, or None if no mark was recorded.
+        """
+        bitmaps = self.days.get(_date_key(day), {}).get(course_id)
+        bit = self._positions.get(course_id, {}).get(student_id)
+        if bitmaps is None or bit is None or not bitmaps[0] >> bit & 1:
+            return None
+        return bool(bitmaps[1] >> bit & 1)
+
+    def present_students(self, course_id, day):
+        bitmaps = self.days.get(_date_key(day), {}).get(course_id)
+        if bitmaps is None:
+            return []
+        students = self._students[course_id]
+        present = bitmaps[1]
+        return [students[bit] for bit in range(present.bit_length()) if present >> bit & 1]
+
+    def daily_count(self, course_id, day):
+        """
+        Returns (present, recorded) for one course meeting, by popcount.
+        """
+        bitmaps = self.days.get(_date_key(day), {}).get(course_id)
+        if bitmaps is None:
+            return 0, 0
+        return bin(bitmaps[1]).count("1"), bin(bitmaps[0]).count("1")
+
+    def student_rate(self, student_id):
+        return _rate(self._by_student.get(student_id, (0, 0)))
+
+    def course_rate(self, course_id, start=None, end=None):
+        """
+        Attendance rate of a course, over all days or between two dates (inclusive).
+        """
+        if start is None and end is None:
+            return _rate(self._by_course.get(course_id, (0, 0)))
+        start_key = _date_key(start) if start is not None else ""
+        end_key = _date_key(end) if end is not None else "9999"
+        present = recorded = 0
+        for date_key, courses in self.days.items():
+            if start_key <= date_key <= end_key and course_id in courses:
+                day_present, day_recorded = self.daily_count(course_id, date_key)
+                present += day_present
+                recorded += day_recorded
+        return present / recorded if recorded else None
+
+    def student_course_rate(self, student_id, course_id):
+        return _rate(self._by_pair.get((course_id, student_id), (0, 0)))
+
+    def compact(self, day):
+        """
+        Rewrites one day's partition as one bitmap line per course.
+        """
+        date_key = _date_key(day)
+        path = self._partition_path(date_key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as file_handler:
+            for course_id, (recorded, present) in self.days.get(date_key, {}).items():
+                file_handler.write(json.dumps({"course": course_id, "recorded": format(recorded, "x"),
+                                               "present": format(present, "x")}) + "\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,388 @@
+"""
+audit.py
+========
+
+Audit trail of every change to students, instructors and courses: who made
+it, when, and the values before and after.
+
+An `AuditLog` subscribes to a `school_store` bus and turns each change event
+into an entry. Entries are first appended to a plain journal (so nothing is
+lost if the application stops), then, every `block_entries` entries, written
+as one gzip-compressed block to the current segment file. A segment is
+rotated once it reaches `segment_bytes`, and the oldest segments are removed
+when there are more than `max_segments`.
+
+Each segment has a sparse index next to it: one line per block with its
+offset, size, first and last timestamp and the keys ("student" and
+"student:<ID>") of the entries it holds. A query for one record or one time
+range reads the index, decompresses only the blocks that can match and
+never touches the rest of the history. Segments are concatenated gzip
+members, so `zcat` reads them as well.
+
+Entry fields:
+-------------
+- seq, ts, actor : sequence number, time (seconds since the epoch), user
+- entity, kind, id : as in the change event
+- changes : {field: [old, new]} for updates
+- record : the whole record for inserts and deletes
+
+Usage:
+------
+    python audit.py AUDIT_DIR [ENTITY [ID [FIELD]]] [--day YYYY-MM-DD]
+
+Classes:
+--------
+- Block
+- AuditLog
+
+Functions:
+----------
+- default_actor
+- day_bounds
+- describe
+"""
+
+import datetime
+import getpass
+import gzip
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from school_store import INSERTED, UPDATED, DELETED
+
+JOURNAL_FILE = "journal.jsonl"
+BLOCK_ENTRIES = 256
+SEGMENT_BYTES = 1 << 20
+ID_FIELDS = ("student_id", "instructor_id", "course_id", "id", "ID")
+
+Block = namedtuple("Block", "segment offset length first last last_seq count keys")
+Block.__doc__ = """Index entry of one compressed block: where it is, its time range,
+its last sequence number, its entry count and the keys of its entries."""
+
+
+def default_actor():
+    """
+    The user recorded as making the changes: SMS_USER, else the login name.
+    """
+    actor = os.environ.get("SMS_USER")
+    if actor:
+        return actor
+    try:
+        return getpass.getuser()
+    except (OSError, KeyError):
+        return "unknown"
+
+
+def day_bounds(day):
+    """
+    (start, end) timestamps of a local calendar day, for `AuditLog.query`.
+    `day` is a date or a "YYYY-MM-DD" string.
+    """
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    start = datetime.datetime.combine(day, datetime.time())
+    return start.timestamp(), (start + datetime.timedelta(days=1)).timestamp()
+
+
+def _plain(value):
+    # JSON-ready copy of a field value or record
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_plain(item) for item in value]
+    if hasattr(value, "__dict__"):
+        return _plain(vars(value))
+    return str(value)
+
+
+def _field_name(field):
+    # "_email", "Email" and "email" are the same field to a query
+    return field.lstrip("_").lower()
+
+
+def _keys(entry):
+    entity = entry["entity"]
+    keys = {entity}
+    if entry["id"] is not None:
+        keys.add(f"{entity}:{entry['id']}")
+    for field in ID_FIELDS:
+        if field in entry.get("changes", {}):
+            keys.add(f"{entity}:{entry['changes'][field][0]}")
+    return keys
+
+
+def describe(entry):
+    """
+    One line for an entry, e.g. for a history window or the command line.
+    """
+    when = datetime.datetime.fromtimestamp(entry["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+    text = f"{when} {entry['actor']} {entry['kind']} {entry['entity']}"
+    if entry["id"] is not None:
+        text += f" {entry['id']}"
+    if entry.get("changes"):
+        text += ": " + ", ".join(f"{field} {old!r} -> {new!r}"
+                                 for field, (old, new) in entry["changes"].items())
+    return text
+
+
+class AuditLog:
+    """
+    Compressed, rotating audit log in one directory.
+
+    Parameters:
+    -----------
+    directory : str
+        Created if needed; an existing log is continued.
+    actor : str, optional
+        User recorded with each change (default: `default_actor()`).
+    block_entries : int
+        Entries per compressed block.
+    segment_bytes : int
+        Size at which a new segment file is started.
+    max_segments : int, optional
+        Oldest segments beyond this many are deleted (default: keep all).
+    clock : callable
+        Returns the current time in seconds.
+    """
+
+    def __init__(self, directory, actor=None, block_entries=BLOCK_ENTRIES, segment_bytes=SEGMENT_BYTES,
+                 max_segments=None, clock=time.time):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.actor = actor or default_actor()
+        self.block_entries = block_entries
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.clock = clock
+        self.blocks_read = 0     # blocks decompressed by the last query
+
+        self._blocks = []        # oldest first
+        self._segments = sorted(int(name[6:12]) for name in os.listdir(directory)
+                                if name.startswith("audit-") and name.endswith(".idx"))
+        for segment in self._segments:
+            with open(self._path(segment, ".idx"), "r") as file_handler:
+                for line in file_handler:
+                    if line.strip():
+                        fields = json.loads(line)
+                        fields["keys"] = frozenset(fields["keys"])
+                        self._blocks.append(Block(**fields))
+        self._seq = self._blocks[-1].last_seq if self._blocks else 0
+
+        # Journal entries already in a block (the application stopped between
+        # writing the block and emptying the journal) are dropped
+        self._journal_path = os.path.join(directory, JOURNAL_FILE)
+        self._pending = []
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "r") as file_handler:
+                for line in file_handler:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry["seq"] > self._seq:
+                            self._pending.append(entry)
+        if self._pending:
+            self._seq = self._pending[-1]["seq"]
+        self._journal = open(self._journal_path, "a")
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.directory, f"audit-{segment:06d}{suffix}")
+
+    # --- recording ---
+
+    def attach(self, bus):
+        """
+        Records every change published on `bus`; returns the subscription handle.
+        """
+        return bus.subscribe(self.record_events, batch=True)
+
+    def record_events(self, events):
+        """
+        Appends one entry per change event (a transaction's events share a timestamp).
+        """
+        now = self.clock()
+        entries = []
+        for event in events:
+            self._seq += 1
+            entry = {"seq": self._seq, "ts": now, "actor": self.actor, "entity": event.entity,
+                     "kind": event.kind, "id": None if event.record_id is None else str(event.record_id)}
+            if event.kind == UPDATED:
+                entry["changes"] = {field: [_plain(old), _plain(new)]
+                                    for field, (old, new) in event.changes.items()}
+            elif event.kind in (INSERTED, DELETED):
+                entry["record"] = _plain(event.record)
+            entries.append(entry)
+        self._journal.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._journal.flush()
+        self._pending.extend(entries)
+        if len(self._pending) >= self.block_entries:
+            self.flush()
+
+    def flush(self):
+        """
+        Compresses the journal's entries into a block of the current segment.
+        """
+        if not self._pending:
+            return
+        if not self._segments or os.path.getsize(self._path(self._segments[-1], ".jsonl.gz")) >= self.segment_bytes:
+            self._segments.append(self._segments[-1] + 1 if self._segments else 1)
+        segment = self._segments[-1]
+
+        data = gzip.compress("".join(json.dumps(entry) + "\n" for entry in self._pending).encode())
+        data_path = self._path(segment, ".jsonl.gz")
+        offset = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        with open(data_path, "ab") as file_handler:
+            file_handler.write(data)
+        keys = set()
+        for entry in self._pending:
+            keys |= _keys(entry)
+        block = Block(segment, offset, len(data), self._pending[0]["ts"], self._pending[-1]["ts"],
+                      self._pending[-1]["seq"], len(self._pending), frozenset(keys))
+        # The index line makes the block visible; until it is written the journal still counts
+        with open(self._path(segment, ".idx"), "a") as file_handler:
+            file_handler.write(json.dumps(dict(block._asdict(), keys=sorted(keys))) + "\n")
+        self._blocks.append(block)
+        self._pending = []
+        self._journal.close()
+        self._journal = open(self._journal_path, "w")
+        self._rotate()
+
+    def _rotate(self):
+        while self.max_segments and len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            self._blocks = [block for block in self._blocks if block.segment != oldest]
+            for suffix in (".idx", ".jsonl.gz"):
+                os.remove(self._path(oldest, suffix))
+
+    def close(self):
+        self.flush()
+        self._journal.close()
+
+    # --- queries ---
+
+    def _read_block(self, block):
+        self.blocks_read += 1
+        with open(self._path(block.segment, ".jsonl.gz"), "rb") as file_handler:
+            file_handler.seek(block.offset)
+            data = gzip.decompress(file_handler.read(block.length))
+        return [json.loads(line) for line in data.decode().splitlines()]
+
+    def query(self, entity=None, record_id=None, start=None, end=None, field=None):
+        """
+        Entries matching every given condition, oldest first.
+
+        Parameters:
+        -----------
+        entity : str, optional
+            "student", "instructor" or "course".
+        record_id : str, optional
+            Only this record (needs `entity`); also finds entries from before
+            its ID was changed to this one.
+        start, end : float, optional
+            Time range in seconds since the epoch, `end` excluded (see `day_bounds`).
+        field : str, optional
+            Only updates of this field ("email" matches "_email" and "Email"),
+            plus the inserts and deletes of whole records.
+        """
+        if record_id is not None and entity is None:
+            raise ValueError("A record ID needs an entity")
+        wanted = _field_name(field) if field is not None else None
+        self.blocks_read = 0
+
+        def matches(entry):
+            if end is not None and entry["ts"] >= end:
+                return False
+            if wanted is not None and entry["kind"] == UPDATED:
+                return any(_field_name(name) == wanted for name in entry["changes"])
+            return True
+
+        if record_id is None:
+            return [entry for entry in self._scan(entity, start, end) if matches(entry)]
+
+        # Follow ID changes backwards: the entries of a former ID count up to
+        # the change. Renames after `end` matter too, so only `start` bounds the scan.
+        found = {}
+        aliases = [(str(record_id), None)]    # (ID, only entries before this seq)
+        seen = set()
+        while aliases:
+            current, before = aliases.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            for entry in self._scan(f"{entity}:{current}", start, None):
+                if before is not None and entry["seq"] >= before:
+                    continue
+                if matches(entry):
+                    found[entry["seq"]] = entry
+                for name in ID_FIELDS:
+                    old, new = entry.get("changes", {}).get(name, (None, None))
+                    if old is not None and str(new) == current:
+                        aliases.append((str(old), entry["seq"]))
+        return [found[seq] for seq in sorted(found)]
+
+    def _scan(self, key, start, end):
+        # Entries with `key` (all if None) in the time range, from the blocks
+        # the index says can hold them and from the journal
+        def matches(entry):
+            if start is not None and entry["ts"] < start or end is not None and entry["ts"] >= end:
+                return False
+            return key is None or key in _keys(entry)
+
+        found = []
+        for block in self._blocks:
+            if start is not None and block.last < start or end is not None and block.first >= end:
+                continue
+            if key is not None and key not in block.keys:
+                continue
+            found.extend(entry for entry in self._read_block(block) if matches(entry))
+        found.extend(entry for entry in self._pending if matches(entry))
+        return found
+
+    def field_history(self, entity, record_id, field):
+        """
+        (time, actor, old value, new value) for every change of one field of one record.
+        """
+        wanted = _field_name(field)
+        history = []
+        for entry in self.query(entity, record_id, field=field):
+            for name, (old, new) in entry.get("changes", {}).items():
+                if _field_name(name) == wanted:
+                    history.append((entry["ts"], entry["actor"], old, new))
+        return history
+
+    def stats(self):
+        """
+        Segments, blocks, entries (compressed and pending) and bytes on disk.
+        """
+        size = sum(os.path.getsize(self._path(segment, suffix))
+                   for segment in self._segments for suffix in (".idx", ".jsonl.gz"))
+        return {"segments": len(self._segments), "blocks": len(self._blocks),
+                "entries": sum(block.count for block in self._blocks), "pending": len(self._pending),
+                "bytes": size}
+
+
+def main(args):
+    day = None
+    if "--day" in args:
+        position = args.index("--day")
+        day = args[position + 1]
+        args = args[:position] + args[position + 2:]
+    if not args:
+        print("Usage: python audit.py AUDIT_DIR [ENTITY [ID [FIELD]]] [--day YYYY-MM-DD]")
+        return 1
+    log = AuditLog(args[0])
+    entity, record_id, field = (args[1:] + [None] * 3)[:3]
+    start, end = day_bounds(day) if day else (None, None)
+    entries = log.query(entity, record_id, start, end, field)
+    for entry in entries:
+        print(describe(entry))
+    stats = log.stats()
+    print(f"{len(entries)} entries; {log.blocks_read} of {stats['blocks']} blocks read")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,357 @@
+"""
+dedup.py
+========
+
+Duplicate and near-duplicate detection for students and instructors.
+
+Comparing every record with every other one is O(n^2). Instead each record
+is put into a few "blocks" that likely duplicates share:
+
+- its ID,
+- its normalized email (lower case, "+tag" removed from the local part),
+- a phonetic name key (Soundex of the last name + first initial, and the
+  same with first and last name swapped for reversed entries).
+
+Only records sharing a block are compared, which keeps the work close to
+linear. Each candidate pair gets a similarity score (Jaro-Winkler on names
+plus email, ID and age agreement) and pairs above a threshold are reported.
+`merge` folds one record into another and rewires course enrollments
+through the record stores.
+
+Given a `school_store` bus, a `DedupIndex` follows the change events of its
+entity, so one index can serve every duplicate check of a session.
+
+Classes:
+--------
+- DedupIndex
+
+Functions:
+----------
+- normalize_email
+- soundex
+- jaro_winkler
+- similarity
+- find_duplicates
+- merge
+"""
+
+import re
+from collections import defaultdict, namedtuple
+
+from Part12 import Person, person_fields
+from school_store import DELETED, RELOADED, get_field
+
+MAX_BLOCK_SIZE = 200   # blocks bigger than this (e.g. a very common name) are skipped
+
+Match = namedtuple("Match", "score first second reasons")
+Match.__doc__ = """A candidate duplicate pair with its similarity score and the fields that agree."""
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"),
+                         ("l", "4"), ("mn", "5"), ("r", "6")):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _digit
+_NON_LETTERS = re.compile(r"[^a-z ]+")
+
+
+def normalize_email(email):
+    local, _, domain = str(email).strip().lower().partition("@")
+    return local.split("+", 1)[0] + "@" + domain
+
+
+def normalize_name(name):
+    return " ".join(_NON_LETTERS.sub(" ", str(name).lower()).split())
+
+
+def soundex(word):
+    """
+    Classic 4-character Soundex code ("Robert" -> "r163").
+    """
+    word = "".join(ch for ch in word.lower() if ch.isalpha())
+    if not word:
+        return ""
+    code = word[0]
+    last = _SOUNDEX_CODES.get(word[0], "")
+    for ch in word[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if ch not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+def jaro_winkler(first, second):
+    """
+    Jaro-Winkler similarity of two strings, between 0 and 1.
+    """
+    if first == second:
+        return 1.0
+    len1, len2 = len(first), len(second)
+    if not len1 or not len2:
+        return 0.0
+    window = max(len1, len2) // 2 - 1
+    matched1 = [False] * len1
+    matched2 = [False] * len2
+    matches = 0
+    for i, ch in enumerate(first):
+        for j in range(max(0, i - window), min(len2, i + window + 1)):
+            if not matched2[j] and second[j] == ch:
+                matched1[i] = matched2[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    transpositions = 0
+    j = 0
+    for i in range(len1):
+        if matched1[i]:
+            while not matched2[j]:
+                j += 1
+            if first[i] != second[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / len1 + matches / len2 + (matches - transpositions / 2) / matches) / 3
+    prefix = 0
+    for ch1, ch2 in zip(first[:4], second[:4]):
+        if ch1 != ch2:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def blocking_keys(record):
+    fields = person_fields(record)
+    keys = set()
+    if fields["id"]:
+        keys.add(("id", str(fields["id"]).strip()))
+    if fields["email"]:
+        keys.add(("email", normalize_email(fields["email"])))
+    parts = normalize_name(fields["name"]).split()
+    if parts:
+        first, last = parts[0], parts[-1]
+        keys.add(("name", soundex(last) + first[0]))
+        keys.add(("name", soundex(first) + last[0]))
+    return keys
+
+
+def similarity(first, second):
+    """
+    Scores how likely two records are the same person.
+
+    Returns:
+    --------
+    tuple
+        (score between 0 and 1, list of fields that agree)
+    """
+    a = person_fields(first)
+    b = person_fields(second)
+    reasons = []
+    name_a = normalize_name(a["name"])
+    name_b = normalize_name(b["name"])
+    # Also compare with the words sorted, so "Smith Jane" matches "Jane Smith"
+    name_score = max(jaro_winkler(name_a, name_b),
+                     jaro_winkler(" ".join(sorted(name_a.split())), " ".join(sorted(name_b.split()))))
+    if name_score >= 0.9:
+        reasons.append("name")
+    email_same = bool(a["email"]) and normalize_email(a["email"]) == normalize_email(b["email"])
+    if email_same:
+        reasons.append("email")
+    id_same = bool(a["id"]) and str(a["id"]).strip() == str(b["id"]).strip()
+    if id_same:
+        reasons.append("id")
+    age_same = str(a["age"]) == str(b["age"]) and a["age"] not in (0, "", None)
+    if age_same:
+        reasons.append("age")
+
+    score = 0.5 * name_score + 0.25 * email_same + 0.2 * id_same + 0.05 * age_same
+    # The same email or ID with a similar name is almost certainly one person
+    if (email_same or id_same) and name_score >= 0.8:
+        score = max(score, 0.95)
+    return score, reasons
+
+
+class DedupIndex:
+    """
+    Blocking index over a list of person records.
+
+    Parameters:
+    -----------
+    records : iterable
+        Initial records (Student / Instructor objects or either GUI's dicts).
+    bus : EventBus, optional
+        Change events of `entity` on this bus keep the index current; `records`
+        must then be the live list. After a reload the index is rebuilt the
+        next time it is asked, so loading a file does not pay for it.
+    entity : str, optional
+        "student" or "instructor"; needed with a bus.
+    """
+
+    def __init__(self, records=(), bus=None, entity=None):
+        self.records = records if bus is not None else list(records)
+        self.rebuild()
+        if bus is not None:
+            bus.subscribe(self.on_change, entities=(entity,))
+
+    def __len__(self):
+        self._refresh()
+        return len(self._records)
+
+    def __contains__(self, record):
+        self._refresh()
+        return id(record) in self._records
+
+    def rebuild(self):
+        self._records = {}                 # id(record) -> record
+        self._keys = {}                    # id(record) -> its blocking keys
+        self.blocks = defaultdict(dict)    # key -> {id(record): None}, in insertion order
+        self._stale = False
+        for record in self.records:
+            self.add(record)
+
+    def _refresh(self):
+        if self._stale:
+            self.rebuild()
+
+    def on_change(self, event):
+        if event.kind == RELOADED:
+            self._stale = True
+        elif self._stale:
+            return
+        elif event.kind == DELETED:
+            self.remove(event.record)
+        else:
+            # INSERTED or UPDATED; a record edited in place is re-indexed
+            if event.old_record is not None:
+                self.remove(event.old_record)
+            self.remove(event.record)
+            self.add(event.record)
+
+    def add(self, record):
+        ident = id(record)
+        keys = blocking_keys(record)
+        self._records[ident] = record
+        self._keys[ident] = keys
+        for key in keys:
+            self.blocks[key][ident] = None
+
+    def remove(self, record):
+        ident = id(record)
+        for key in self._keys.pop(ident, ()):
+            members = self.blocks[key]
+            members.pop(ident, None)
+            if not members:
+                del self.blocks[key]
+        self._records.pop(ident, None)
+
+    def with_id(self, record_id):
+        """
+        Records whose ID equals `record_id` (compared as stripped strings).
+        """
+        self._refresh()
+        members = self.blocks.get(("id", str(record_id).strip()), ())
+        return [self._records[ident] for ident in members]
+
+    def candidate_pairs(self):
+        """
+        Returns the set of (first, second) id(record) pairs that share at least
+        one block; `first` is the record that was indexed earlier.
+        """
+        self._refresh()
+        order = {ident: n for n, ident in enumerate(self._records)}
+        pairs = set()
+        for members in self.blocks.values():
+            if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+                continue
+            members = list(members)
+            for n, i in enumerate(members):
+                for j in members[n + 1:]:
+                    pairs.add((i, j) if order[i] < order[j] else (j, i))
+        return pairs
+
+    def matches_for(self, record, threshold=0.85):
+        """
+        Existing records likely to be the same person as `record` (e.g. before adding it).
+        `record` itself is never reported, so it may already be in the index.
+        """
+        self._refresh()
+        seen = {id(record)}
+        found = []
+        for key in blocking_keys(record):
+            for ident in self.blocks.get(key, ()):
+                if ident in seen:
+                    continue
+                seen.add(ident)
+                other = self._records[ident]
+                score, reasons = similarity(record, other)
+                if score >= threshold:
+                    found.append(Match(score, record, other, reasons))
+        return sorted(found, key=lambda match: -match.score)
+
+    def duplicates(self, threshold=0.85):
+        found = []
+        for i, j in self.candidate_pairs():
+            first, second = self._records[i], self._records[j]
+            score, reasons = similarity(first, second)
+            if score >= threshold:
+                found.append(Match(score, first, second, reasons))
+        return sorted(found, key=lambda match: -match.score)
+
+
+def find_duplicates(records, threshold=0.85):
+    return DedupIndex(records).duplicates(threshold)
+
+
+def _courses_field(record):
+    if isinstance(record, Person):
+        return "registered_courses" if hasattr(record, "registered_courses") else "assigned_courses"
+    for key in ("registered_courses", "assigned_courses", "Courses"):
+        if key in record:
+            return key
+    return "Courses" if "ID" in record else "registered_courses"
+
+
+def merge(keep, drop, store, course_store=None):
+    """
+    Folds `drop` into `keep`: course lists are united, `drop` is deleted, and
+    every course roster that listed `drop` (by name or ID) lists `keep` instead.
+    All writes go through the stores as one transaction, so subscribers (sort
+    and query indexes, derived views, the audit log) see the merge like any
+    other edit.
+
+    Parameters:
+    -----------
+    keep, drop : Student, Instructor or dict
+        The surviving record and the duplicate.
+    store : RecordStore
+        The store both records live in (e.g. `student_store`).
+    course_store : RecordStore, optional
+        Store of course dicts or `Course` objects whose rosters should be rewired.
+    """
+    kept = person_fields(keep)
+    dropped = person_fields(drop)
+    merged = list(kept["courses"])
+    for course in dropped["courses"]:
+        if course not in merged:
+            merged.append(course)
+
+    old_refs = {dropped["name"], dropped["id"]}
+    with store.bus.transaction():
+        store.update(keep, **{_courses_field(keep): merged})
+        for course in (course_store or ()):
+            roster = get_field(course, "enrolled_students")
+            if roster is None:
+                continue
+            rewired = []
+            for entry in roster:
+                if entry is drop or entry in old_refs:
+                    entry = keep if not isinstance(entry, str) else (
+                        kept["name"] if entry == dropped["name"] else kept["id"])
+                if entry not in rewired:
+                    rewired.append(entry)
+            if rewired != roster:
+                course_store.update(course, enrolled_students=rewired)
+        store.delete(drop)
+    return keep
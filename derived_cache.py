@@ -0,0 +1,195 @@
+"""
+derived_cache.py
+================
+
+Memoized values derived from records: table row strings, search summaries,
+per-course enrollment lists and roster counts.
+
+Every record and every course has a version number. A cached value is stored
+with the version it was computed from and is only served while that version
+is current. Versions are bumped from the change events of a `school_store`
+bus, so exactly the affected entries go stale:
+
+- a student or instructor change invalidates that record's own values,
+- adding, removing or re-registering a student invalidates the enrollment
+  values of the courses it joined or left (and of all its courses when its
+  name or ID changes, since rosters list those),
+- a course change invalidates that course's values.
+
+The cache is bounded; the least recently used entries are evicted first.
+
+Classes:
+--------
+- DerivedCache
+"""
+
+from collections import OrderedDict
+
+from Part12 import person_fields, record_id
+from school_store import INSERTED, DELETED, RELOADED
+
+COURSE_FIELDS = ("registered_courses", "assigned_courses", "Courses")
+# Fields course rosters refer to a student by, in both GUIs' layouts
+NAME_ID_FIELDS = ("name", "n_entry", "Name", "student_id", "ID", "id")
+
+
+def _course_refs(record):
+    if isinstance(record, dict):
+        refs = {record.get(key) for key in ("course_name", "id", "ID", "Name")}
+    else:
+        refs = {getattr(record, "course_name", None), getattr(record, "course_id", None)}
+    refs.discard(None)
+    return refs
+
+
+class DerivedCache:
+    """
+    LRU cache of derived values with version-based invalidation.
+
+    Parameters:
+    -----------
+    bus : EventBus, optional
+        Change events of this bus invalidate entries. Without a bus, call
+        `invalidate` / `invalidate_course` after changing records.
+    max_entries : int
+        Number of cached values kept before the least recently used go.
+
+    Attributes:
+    -----------
+    hits, misses, evictions, invalidations : int
+        Counters, also returned by `stats()`.
+    """
+
+    def __init__(self, bus=None, max_entries=20000):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (name, entity, key, identity) -> (version, value)
+        self._versions = {}             # (entity, key) -> int
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if bus is not None:
+            bus.subscribe(self.on_change)
+
+    def version(self, entity, key):
+        return self._versions.get((entity, key), 0)
+
+    def get(self, name, entity, key, compute, identity=None):
+        """
+        Returns the cached value `name` of (entity, key), computing it with
+        `compute()` on a miss.
+
+        Parameters:
+        -----------
+        name : str
+            Which derived value (e.g. "row", "enrollment").
+        entity : str
+            "student", "instructor" or "course".
+        key : str
+            Record ID, or course name / ID for course values.
+        compute : callable
+            Builds the value from the current data.
+        identity : int, optional
+            `id(record)`, so two records that share an ID do not share values.
+        """
+        cache_key = (name, entity, key, identity)
+        current = self.version(entity, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] == current:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        self._entries[cache_key] = (current, value)
+        self._entries.move_to_end(cache_key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def for_record(self, name, entity, record, compute):
+        """
+        `get` for a value derived from one record; `compute(record)` builds it.
+        """
+        return self.get(name, entity, record_id(record), lambda: compute(record), id(record))
+
+    def invalidate(self, entity, key):
+        self._versions[(entity, key)] = self.version(entity, key) + 1
+        self.invalidations += 1
+
+    def invalidate_course(self, ref):
+        self.invalidate("course", ref)
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+    # --- derived values shared by both GUIs ---
+
+    def enrollment(self, course_ref, students):
+        """
+        Students registered for a course (matched by the names or IDs stored in
+        their course lists).
+        """
+        return self.get("enrollment", "course", course_ref, lambda: [
+            student for student in students if course_ref in person_fields(student)["courses"]])
+
+    def roster_count(self, course_ref, students):
+        return self.get("roster_count", "course", course_ref,
+                        lambda: len(self.enrollment(course_ref, students)))
+
+    # --- invalidation from change events ---
+
+    def on_change(self, event):
+        if event.kind == RELOADED:
+            self.clear()
+            return
+        records = [event.record]
+        if event.old_record is not None:
+            records.append(event.old_record)
+
+        if event.entity == "course":
+            for record in records:
+                self.invalidate("course", record_id(record))
+                for ref in _course_refs(record):
+                    self.invalidate_course(ref)
+            return
+
+        keys = {record_id(record) for record in records}
+        for field in ("id", "ID", "student_id", "instructor_id"):
+            if field in event.changes:
+                keys.update(value for value in event.changes[field] if value is not None)
+        for key in keys:
+            self.invalidate(event.entity, key)
+
+        if event.entity != "student":
+            return
+        if event.kind in (INSERTED, DELETED):
+            touched = set(person_fields(event.record)["courses"])
+        elif event.old_record is not None or not set(event.changes).isdisjoint(NAME_ID_FIELDS):
+            # Name or ID changed, or another object took the record's place:
+            # every roster listing this student is stale
+            touched = set()
+            for record in records:
+                touched.update(person_fields(record)["courses"])
+            for field in COURSE_FIELDS:
+                if field in event.changes:
+                    old, new = event.changes[field]
+                    touched.update(old or (), new or ())
+        else:
+            touched = set()
+            for field in COURSE_FIELDS:
+                if field in event.changes:
+                    old, new = event.changes[field]
+                    touched.update(set(old or ()) ^ set(new or ()))
+        for ref in touched:
+            self.invalidate_course(ref)
@@ -0,0 +1,284 @@
+"""
+grades.py
+=========
+
+Grades and student performance.
+
+Each course defines weighted assessments; each student gets one score per
+assessment. Every insert or change updates the affected aggregates right
+away (the student's course percentage, the course average and the student's
+GPA) by applying the difference, so nothing is ever recomputed over all
+grade rows.
+
+Ranks and percentiles come from Fenwick trees over quantized values
+(GPA in 0.01 steps, course percentages in 0.01% steps), so a rank query costs
+O(log buckets) no matter how many grade rows exist.
+
+Classes:
+--------
+- Assessment
+- GradeBook
+
+Functions:
+----------
+- grade_points
+"""
+
+import json
+from collections import namedtuple
+
+Assessment = namedtuple("Assessment", "course_id name weight max_score")
+
+# (minimum percentage, grade points) on a 4.0 scale
+GRADE_SCALE = ((93, 4.0), (90, 3.7), (87, 3.3), (83, 3.0), (80, 2.7), (77, 2.3),
+               (73, 2.0), (70, 1.7), (67, 1.3), (63, 1.0), (60, 0.7), (0, 0.0))
+
+GPA_BUCKETS = 401          # 0.00 .. 4.00
+PERCENT_BUCKETS = 10001    # 0.00 .. 100.00
+
+
+def grade_points(percentage):
+    """
+    Converts a course percentage to grade points using `GRADE_SCALE`.
+    """
+    for minimum, points in GRADE_SCALE:
+        if percentage >= minimum:
+            return points
+    return 0.0
+
+
+class _Fenwick:
+    # Counts per bucket with O(log n) prefix sums
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.total = 0
+
+    def add(self, bucket, delta):
+        self.total += delta
+        index = bucket + 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def count_up_to(self, bucket):
+        # Number of values in buckets 0..bucket
+        result = 0
+        index = bucket + 1
+        while index > 0:
+            result += self.tree[index]
+            index -= index & -index
+        return result
+
+
+class _Ranking:
+    # A Fenwick tree plus the members of each bucket, for ranks and top-N lists
+    def __init__(self, size, scale):
+        self.counts = _Fenwick(size)
+        self.scale = scale
+        self.members = {}
+        self.bucket_of = {}
+
+    def set(self, key, value):
+        self.discard(key)
+        bucket = min(self.counts.size - 1, max(0, round(value * self.scale)))
+        self.bucket_of[key] = bucket
+        self.members.setdefault(bucket, set()).add(key)
+        self.counts.add(bucket, 1)
+
+    def discard(self, key):
+        bucket = self.bucket_of.pop(key, None)
+        if bucket is not None:
+            self.members[bucket].discard(key)
+            self.counts.add(bucket, -1)
+
+    def rank(self, key):
+        # 1 = best; ties share a rank
+        bucket = self.bucket_of.get(key)
+        if bucket is None:
+            return None
+        return self.counts.total - self.counts.count_up_to(bucket) + 1
+
+    def percentile(self, key):
+        # Share of entries at or below this one, in percent
+        bucket = self.bucket_of.get(key)
+        if bucket is None:
+            return None
+        return 100.0 * self.counts.count_up_to(bucket) / self.counts.total
+
+    def top(self, count):
+        result = []
+        for bucket in range(self.counts.size - 1, -1, -1):
+            if bucket in self.members:
+                for key in sorted(self.members[bucket]):
+                    result.append((key, bucket / self.scale))
+                    if len(result) == count:
+                        return result
+        return result
+
+
+class GradeBook:
+    """
+    Assessments, scores and incrementally maintained aggregates.
+
+    Attributes:
+    -----------
+    assessments : dict
+        (course_id, name) -> Assessment.
+    scores : dict
+        (student_id, course_id, assessment name) -> score.
+    credits : dict
+        course_id -> credit hours used for GPA weighting (default 3). Change
+        it with `set_credits`, which re-weights the GPAs already computed.
+    """
+
+    def __init__(self):
+        self.assessments = {}
+        self.scores = {}
+        self.credits = {}
+        self._course_parts = {}    # (student, course) -> [weighted sum, weight]
+        self._course_totals = {}   # course -> [sum of percentages, students]
+        self._gpa_parts = {}       # student -> [sum of points * credits, credits]
+        self._gpa_rank = _Ranking(GPA_BUCKETS, 100)
+        self._course_rank = {}     # course -> _Ranking of percentages
+
+    def add_assessment(self, course_id, name, weight, max_score=100, credits=None):
+        if weight <= 0 or max_score <= 0:
+            raise ValueError("Weight and maximum score must be positive")
+        if credits is not None and credits < 0:
+            raise ValueError("Credits cannot be negative")
+        key = (course_id, name)
+        if key in self.assessments:
+            raise ValueError(f"Assessment {name} already exists for {course_id}")
+        self.assessments[key] = Assessment(course_id, name, weight, max_score)
+        if credits is not None:
+            self.set_credits(course_id, credits)
+
+    def set_credits(self, course_id, credits):
+        """
+        Changes a course's credit hours. The GPA of every student already
+        graded in the course is re-weighted from the old credits to the new.
+        Courses with 0 credits (e.g. pass/fail) do not count towards the GPA.
+        """
+        if credits < 0:
+            raise ValueError("Credits cannot be negative")
+        old_credits = self.credits.get(course_id, 3)
+        self.credits[course_id] = credits
+        if credits == old_credits or course_id not in self._course_rank:
+            return
+        for student_id in list(self._course_rank[course_id].bucket_of):
+            points = grade_points(self.course_percentage(student_id, course_id))
+            gpa = self._gpa_parts[student_id]
+            gpa[0] += points * (credits - old_credits)
+            gpa[1] += credits - old_credits
+            self._rank_gpa(student_id)
+
+    def record_score(self, student_id, course_id, assessment_name, score):
+        """
+        Inserts or replaces one score and updates every aggregate it touches.
+        """
+        assessment = self.assessments.get((course_id, assessment_name))
+        if assessment is None:
+            raise ValueError(f"Unknown assessment {assessment_name} for {course_id}")
+        if not 0 <= score <= assessment.max_score:
+            raise ValueError(f"Score must be between 0 and {assessment.max_score}")
+
+        key = (student_id, course_id, assessment_name)
+        old_score = self.scores.get(key)
+        self.scores[key] = score
+
+        pair = (student_id, course_id)
+        old_percentage = self.course_percentage(student_id, course_id)
+        parts = self._course_parts.setdefault(pair, [0.0, 0.0])
+        if old_score is not None:
+            parts[0] -= assessment.weight * old_score / assessment.max_score
+            parts[1] -= assessment.weight
+        parts[0] += assessment.weight * score / assessment.max_score
+        parts[1] += assessment.weight
+        self._percentage_changed(student_id, course_id, old_percentage,
+                                 self.course_percentage(student_id, course_id))
+
+    def _percentage_changed(self, student_id, course_id, old, new):
+        totals = self._course_totals.setdefault(course_id, [0.0, 0])
+        gpa = self._gpa_parts.setdefault(student_id, [0.0, 0])
+        credits = self.credits.get(course_id, 3)
+        if old is not None:
+            totals[0] -= old
+            totals[1] -= 1
+            gpa[0] -= grade_points(old) * credits
+            gpa[1] -= credits
+        totals[0] += new
+        totals[1] += 1
+        gpa[0] += grade_points(new) * credits
+        gpa[1] += credits
+        if course_id not in self._course_rank:
+            self._course_rank[course_id] = _Ranking(PERCENT_BUCKETS, 100)
+        self._course_rank[course_id].set(student_id, new)
+        self._rank_gpa(student_id)
+
+    def _rank_gpa(self, student_id):
+        # A student graded only in 0-credit courses has no GPA and no GPA rank
+        gpa = self.gpa(student_id)
+        if gpa is None:
+            self._gpa_rank.discard(student_id)
+        else:
+            self._gpa_rank.set(student_id, gpa)
+
+    def course_percentage(self, student_id, course_id):
+        """
+        Weighted percentage of the assessments graded so far, or None.
+        """
+        parts = self._course_parts.get((student_id, course_id))
+        if not parts or parts[1] <= 0:
+            return None
+        return 100.0 * parts[0] / parts[1]
+
+    def course_average(self, course_id):
+        totals = self._course_totals.get(course_id)
+        if not totals or totals[1] == 0:
+            return None
+        return totals[0] / totals[1]
+
+    def gpa(self, student_id):
+        parts = self._gpa_parts.get(student_id)
+        if not parts or parts[1] == 0:
+            return None
+        return parts[0] / parts[1]
+
+    def rank(self, student_id, course_id=None):
+        """
+        Rank of a student by GPA, or by percentage within one course (1 = best).
+        """
+        ranking = self._gpa_rank if course_id is None else self._course_rank.get(course_id)
+        return ranking.rank(student_id) if ranking else None
+
+    def percentile(self, student_id, course_id=None):
+        ranking = self._gpa_rank if course_id is None else self._course_rank.get(course_id)
+        return ranking.percentile(student_id) if ranking else None
+
+    def top_students(self, count=10, course_id=None):
+        """
+        Returns [(student_id, value)] for the best students by GPA or course percentage.
+        """
+        ranking = self._gpa_rank if course_id is None else self._course_rank.get(course_id)
+        return ranking.top(count) if ranking else []
+
+    def save(self, file_name="grades.json"):
+        with open(file_name, "w") as file_handler:
+            json.dump({
+                "assessments": [list(a) for a in self.assessments.values()],
+                "credits": self.credits,
+                "scores": [[s, c, a, score] for (s, c, a), score in self.scores.items()]
+            }, file_handler)
+
+    @classmethod
+    def load(cls, file_name="grades.json"):
+        with open(file_name, "r") as file_handler:
+            data = json.load(file_handler)
+        book = cls()
+        book.credits = data.get("credits", {})
+        for course_id, name, weight, max_score in data.get("assessments", []):
+            book.add_assessment(course_id, name, weight, max_score)
+        for student_id, course_id, name, score in data.get("scores", []):
+            book.record_score(student_id, course_id, name, score)
+        return book
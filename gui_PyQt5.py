@@ -1,16 +1,57 @@
+import os
 import sys
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QTableWidget, QTableWidgetItem, QMessageBox, QComboBox, QFileDialog, QInputDialog
+    QTableWidget, QTableWidgetItem, QMessageBox, QComboBox, QFileDialog, QInputDialog,
+    QProgressDialog, QAbstractItemView
 )
 import csv
-import json  # For saving and loading data in JSON format
+from itertools import chain
+from audit import AuditLog, describe
+from history import History, HISTORY_FILE, parse_time
+from notifications import Outbox, registration_message, DEFAULT_SENDER
+from validation import Validator
+from dedup import DedupIndex, merge
+from query import QueryIndex
+from registration import RegistrationDesk, ENROLLED, WAITLISTED, DROPPED
+from scheduling import parse_meetings, time_clashes, booking_clashes
+from derived_cache import DerivedCache
+from paging import students_collection, instructors_collection, courses_collection, iter_all
+from reports import generate_reports
+from schema import iter_records, write_records, student_record, instructor_record, course_record, \
+    record_to_pyqt
+from sort_index import TableSorter, STUDENT_SORT_KEYS, INSTRUCTOR_SORT_KEYS, COURSE_SORT_KEYS
+from school_store import EventBus, RecordStore, INSERTED, UPDATED, DELETED, RELOADED
 
 # Global lists to store students, instructors, and courses
 students = []
 instructors = []
 courses = []
 
+# Table column -> sort key, for the clickable headers
+STUDENT_SORT_COLUMNS = {0: "id", 1: "name", 2: "email"}
+INSTRUCTOR_SORT_COLUMNS = {0: "id", 1: "name", 2: "email"}
+COURSE_SORT_COLUMNS = {0: "id", 1: "course_name"}
+
+# Most recent audit entries "Student History" shows
+HISTORY_LINES = 30
+# Seconds closing the window waits for queued confirmation emails
+OUTBOX_CLOSE_TIMEOUT = 10
+# Invalid records listed when loading a file
+LOAD_PROBLEMS_SHOWN = 20
+# Likely duplicate pairs "Find Duplicates" asks about at most
+DUPLICATE_PROMPTS = 20
+
+# Fields "Edit Selected" can set on several records at once
+BULK_FIELDS = {"student": ["Name", "Email"], "instructor": ["Name", "Email"],
+               "course": ["Name", "Capacity"]}
+
+# Record field -> sort key, to tell whether an edit can move a row
+SORTED_FIELDS = {"ID": "id", "Name": "name", "Email": "email"}
+COURSE_SORTED_FIELDS = {"ID": "id", "Name": "course_name"}
+_UNSORTED = object()     # sort key of the fields missing from the maps above
+
 class SchoolManagementSystem(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -62,13 +103,25 @@ class SchoolManagementSystem(QMainWindow):
 
         # Course form
         course_form = QHBoxLayout()
-        global course_id_input, course_name_input
+        global course_id_input, course_name_input, course_capacity_input
+        global course_meetings_input, course_room_input
         course_id_input = QLineEdit()
         course_name_input = QLineEdit()
+        course_capacity_input = QLineEdit()
+        course_capacity_input.setPlaceholderText("unlimited")
+        course_meetings_input = QLineEdit()
+        course_meetings_input.setPlaceholderText("Mon 09:00-10:15, Wed 09:00-10:15")
+        course_room_input = QLineEdit()
         course_form.addWidget(QLabel("Course ID"))
         course_form.addWidget(course_id_input)
         course_form.addWidget(QLabel("Course Name"))
         course_form.addWidget(course_name_input)
+        course_form.addWidget(QLabel("Capacity"))
+        course_form.addWidget(course_capacity_input)
+        course_form.addWidget(QLabel("Meetings"))
+        course_form.addWidget(course_meetings_input)
+        course_form.addWidget(QLabel("Room"))
+        course_form.addWidget(course_room_input)
         add_course_button = QPushButton("Add Course")
         add_course_button.clicked.connect(self.add_course)
         course_form.addWidget(add_course_button)
@@ -94,10 +147,22 @@ class SchoolManagementSystem(QMainWindow):
         # Buttons for registration and assignment
         register_button = QPushButton("Register Student for Course")
         register_button.clicked.connect(self.register_student_for_course)
+        drop_button = QPushButton("Drop Student from Course")
+        drop_button.clicked.connect(self.drop_student_from_course)
         assign_button = QPushButton("Assign Instructor to Course")
         assign_button.clicked.connect(self.assign_instructor_to_course)
         dropdown_layout.addWidget(register_button)
+        dropdown_layout.addWidget(drop_button)
         dropdown_layout.addWidget(assign_button)
+        history_button = QPushButton("Student History")
+        history_button.clicked.connect(self.show_student_history)
+        dropdown_layout.addWidget(history_button)
+        as_of_button = QPushButton("Student As Of")
+        as_of_button.clicked.connect(self.show_student_as_of)
+        dropdown_layout.addWidget(as_of_button)
+        duplicates_button = QPushButton("Find Duplicates")
+        duplicates_button.clicked.connect(self.find_duplicates)
+        dropdown_layout.addWidget(duplicates_button)
 
         # Search layout
         search_layout = QHBoxLayout()
@@ -120,6 +185,83 @@ class SchoolManagementSystem(QMainWindow):
         courses_table = QTableWidget(0, 2)
         courses_table.setHorizontalHeaderLabels(["Course ID", "Course Name"])
 
+        # Whole rows are selected; Ctrl/Shift-click selects several for the bulk actions
+        for table in (students_table, instructors_table, courses_table):
+            table.setSelectionBehavior(QAbstractItemView.SelectRows)
+            table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+
+        # Bulk actions on the selected rows, each one transaction
+        bulk_layout = QHBoxLayout()
+        bulk_delete_button = QPushButton("Delete Selected")
+        bulk_delete_button.clicked.connect(self.delete_selected)
+        bulk_register_button = QPushButton("Register Selected Students for Course")
+        bulk_register_button.clicked.connect(self.register_selected_students)
+        bulk_assign_button = QPushButton("Assign Instructor to Selected Courses")
+        bulk_assign_button.clicked.connect(self.assign_instructor_to_selected_courses)
+        bulk_edit_button = QPushButton("Edit Selected")
+        bulk_edit_button.clicked.connect(self.edit_selected)
+        bulk_layout.addWidget(QLabel("Selected rows"))
+        bulk_layout.addWidget(bulk_delete_button)
+        bulk_layout.addWidget(bulk_register_button)
+        bulk_layout.addWidget(bulk_assign_button)
+        bulk_layout.addWidget(bulk_edit_button)
+
+        # Presorted indexes behind the clickable column headers
+        self.student_sorter = TableSorter(STUDENT_SORT_KEYS)
+        self.instructor_sorter = TableSorter(INSTRUCTOR_SORT_KEYS)
+        self.course_sorter = TableSorter(COURSE_SORT_KEYS)
+        self.student_sorter.rebuild(students)
+        self.instructor_sorter.rebuild(instructors)
+        self.course_sorter.rebuild(courses)
+        students_table.horizontalHeader().sectionClicked.connect(
+            lambda column: self.sort_table(self.student_sorter, STUDENT_SORT_COLUMNS, column))
+        instructors_table.horizontalHeader().sectionClicked.connect(
+            lambda column: self.sort_table(self.instructor_sorter, INSTRUCTOR_SORT_COLUMNS, column))
+        courses_table.horizontalHeader().sectionClicked.connect(
+            lambda column: self.sort_table(self.course_sorter, COURSE_SORT_COLUMNS, column))
+
+        # All writes go through the stores; the subscribers below update only
+        # the sort index, table row and dropdown that a change touches
+        self.bus = EventBus()
+        # Row strings and search summaries, invalidated per record (subscribed first)
+        self.derived = DerivedCache(self.bus)
+        self.stores = {
+            "student": RecordStore("student", students, self.bus),
+            "instructor": RecordStore("instructor", instructors, self.bus),
+            "course": RecordStore("course", courses, self.bus),
+        }
+        self.sorters = {"student": self.student_sorter, "instructor": self.instructor_sorter,
+                        "course": self.course_sorter}
+        # Keyset-paged views of the records (see paging.py); exports walk these
+        self.pages = {"student": students_collection(students, self.bus),
+                      "instructor": instructors_collection(instructors, self.bus),
+                      "course": courses_collection(courses, self.bus)}
+        # ID / email / course / age indexes behind the search box (see query.py)
+        self.queries = {entity: QueryIndex(entity, store.records, self.bus)
+                        for entity, store in self.stores.items()}
+        # Blocking indexes behind the duplicate checks and "Find Duplicates" (see dedup.py)
+        self.dedup = {entity: DedupIndex(self.stores[entity].records, self.bus, entity)
+                      for entity in ("student", "instructor")}
+        self.bus.subscribe(self.update_sort_indexes)
+        self.bus.subscribe(self.apply_change_to_table, batch=True)
+        self.bus.subscribe(self.update_dropdown, kinds=(INSERTED, DELETED, RELOADED), batch=True)
+        # Seats and waitlists per course ID; re-read from the records after a load.
+        # Students moved off a waitlist get a confirmation email.
+        self.desk = RegistrationDesk(on_promote=lambda course_id, student_id: self.send_confirmation(
+            student_id, course_id, ENROLLED, promoted=True))
+        # Confirmation emails are sent by the outbox's threads (see notifications.py),
+        # only with SMS_SMTP_HOST set; SMS_SMTP_PORT and SMS_SMTP_FROM complete it
+        smtp_host = os.environ.get("SMS_SMTP_HOST")
+        self.outbox = Outbox(smtp_host, int(os.environ.get("SMS_SMTP_PORT", "25")),
+                             os.environ.get("SMS_SMTP_FROM", DEFAULT_SENDER)) if smtp_host else None
+        self.bus.subscribe(lambda event: self.desk.clear(), kinds=(RELOADED,))
+        # Who changed what and when (see audit.py); SMS_AUDIT_DIR picks the folder
+        self.audit = AuditLog(os.environ.get("SMS_AUDIT_DIR", "audit"))
+        self.audit.attach(self.bus)
+        # Every version of every record, for as-of queries (see history.py)
+        self.history = History(os.environ.get("SMS_HISTORY_FILE", HISTORY_FILE))
+        self.history.attach(self.bus, self.stores)
+
         # Save, Load, Export buttons
         save_button = QPushButton("Save Data")
         save_button.clicked.connect(self.save_data)
@@ -127,6 +269,8 @@ class SchoolManagementSystem(QMainWindow):
         load_button.clicked.connect(self.load_data)
         export_button = QPushButton("Export to CSV")
         export_button.clicked.connect(self.export_to_csv)
+        reports_button = QPushButton("Generate Reports")
+        reports_button.clicked.connect(self.generate_report_files)
 
         # Edit and Delete buttons
         edit_button = QPushButton("Edit Record")
@@ -138,31 +282,76 @@ class SchoolManagementSystem(QMainWindow):
         main_layout.addLayout(form_layout)
         main_layout.addLayout(dropdown_layout)
         main_layout.addLayout(search_layout)
+        main_layout.addLayout(bulk_layout)
         main_layout.addWidget(students_table)
         main_layout.addWidget(instructors_table)
         main_layout.addWidget(courses_table)
         main_layout.addWidget(save_button)
         main_layout.addWidget(load_button)
         main_layout.addWidget(export_button)
+        main_layout.addWidget(reports_button)
         main_layout.addWidget(edit_button)
         main_layout.addWidget(delete_button)
 
         widget.setLayout(main_layout)
 
-        # Initial update of dropdowns
+        # Fill the tables and dropdowns only once the window is on screen
+        QTimer.singleShot(0, self.refresh_all)
+
+    def refresh_all(self):
+        self.update_display()
         self.update_dropdowns()
 
     def update_dropdowns(self):
-        student_dropdown.clear()
-        instructor_dropdown.clear()
-        course_dropdown.clear()
-
-        for student in students:
-            student_dropdown.addItem(student['ID'])
-        for instructor in instructors:
-            instructor_dropdown.addItem(instructor['ID'])
-        for course in courses:
-            course_dropdown.addItem(course['ID'])
+        for entity in ("student", "instructor", "course"):
+            self.fill_dropdown(entity)
+
+    def fill_dropdown(self, entity):
+        dropdown = {"student": student_dropdown, "instructor": instructor_dropdown,
+                    "course": course_dropdown}[entity]
+        dropdown.clear()
+        for record in self.stores[entity]:
+            dropdown.addItem(record['ID'])
+
+    def update_dropdown(self, events):
+        # Only a record added or removed changes the IDs a dropdown lists;
+        # each dropdown is refilled once per transaction
+        for entity in {event.entity for event in events}:
+            self.fill_dropdown(entity)
+
+    def update_sort_indexes(self, event):
+        sorter = self.sorters[event.entity]
+        if event.kind == RELOADED:
+            sorter.rebuild(self.stores[event.entity].records)
+        elif event.kind == INSERTED:
+            sorter.insert(event.record)
+        elif event.kind == DELETED:
+            sorter.remove(event.record)
+        else:
+            sorter.replace(event.old_record or event.record, event.record)
+
+    def apply_change_to_table(self, events):
+        # An edit that cannot move the row rewrites just that row; anything
+        # else redraws the table of the changed entity, once per transaction
+        redraw = set()
+        for event in events:
+            if event.entity in redraw:
+                continue
+            table = {"student": students_table, "instructor": instructors_table,
+                     "course": courses_table}[event.entity]
+            sorter = self.sorters[event.entity]
+            sorted_fields = COURSE_SORTED_FIELDS if event.entity == "course" else SORTED_FIELDS
+            moves_row = sorter.column is not None and any(
+                sorted_fields.get(field, _UNSORTED) == sorter.column for field in event.changes)
+            if event.kind == UPDATED and "ID" not in event.changes and not moves_row:
+                rows = [item.row() for item in table.findItems(event.record['ID'], Qt.MatchExactly)
+                        if item.column() == 0]
+                if rows:
+                    self.fill_row(table, rows[0], event.entity, event.record)
+                    continue
+            redraw.add(event.entity)
+        for entity in redraw:
+            self.fill_table(entity)
 
     def add_student(self):
         global students
@@ -170,65 +359,240 @@ class SchoolManagementSystem(QMainWindow):
         student_name = student_name_input.text().strip()
         student_email = student_email_input.text().strip()
 
-        if student_id == "" or student_name == "" or student_email == "":
-            QMessageBox.warning(self, "Input Error", "All student fields are required.")
+        student = {"ID": student_id, "Name": student_name, "Email": student_email, "Courses": []}
+        if not self.is_valid(student_record(student), students):
             return
-
-        students.append({"ID": student_id, "Name": student_name, "Email": student_email, "Courses": []})
+        if not self.confirm_not_duplicate(student, "student"):
+            return
+        self.stores["student"].insert(student)
         student_id_input.clear()
         student_name_input.clear()
         student_email_input.clear()
-        self.update_display()
-        self.update_dropdowns()
         QMessageBox.information(self, "Success", "Student added successfully!")
 
+    def is_valid(self, record, records, current_id=None):
+        # Checks a canonical record with the shared rules (see validation.py)
+        # against the existing `records` of its type; shows every problem at once
+        validator = Validator(ids={record["type"]: (other['ID'] for other in records)})
+        issues = validator.validate(record, current_id)
+        if issues:
+            QMessageBox.warning(self, "Input Error", "\n".join(issue.message for issue in issues))
+        return not issues
+
+    def confirm_not_duplicate(self, new_record, entity):
+        # Refuse a taken ID, ask before adding a likely duplicate person
+        index = self.dedup[entity]
+        if index.with_id(new_record['ID']):
+            QMessageBox.warning(self, "Duplicate", f"ID {new_record['ID']} is already in use.")
+            return False
+        matches = index.matches_for(new_record)
+        if matches:
+            existing = matches[0].second
+            answer = QMessageBox.question(
+                self, "Possible duplicate",
+                f"This looks like {existing['Name']} ({existing['Email']}, ID {existing['ID']}). Add anyway?")
+            return answer == QMessageBox.Yes
+        return True
+
     def add_instructor(self):
         global instructors
         instructor_id = instructor_id_input.text().strip()
         instructor_name = instructor_name_input.text().strip()
         instructor_email = instructor_email_input.text().strip()
 
-        if instructor_id == "" or instructor_name == "" or instructor_email == "":
-            QMessageBox.warning(self, "Input Error", "All instructor fields are required.")
+        instructor = {"ID": instructor_id, "Name": instructor_name, "Email": instructor_email, "Courses": []}
+        if not self.is_valid(instructor_record(instructor), instructors):
             return
-
-        instructors.append({"ID": instructor_id, "Name": instructor_name, "Email": instructor_email, "Courses": []})
+        if not self.confirm_not_duplicate(instructor, "instructor"):
+            return
+        self.stores["instructor"].insert(instructor)
         instructor_id_input.clear()
         instructor_name_input.clear()
         instructor_email_input.clear()
-        self.update_display()
-        self.update_dropdowns()
         QMessageBox.information(self, "Success", "Instructor added successfully!")
 
     def add_course(self):
         global courses
         course_id = course_id_input.text().strip()
         course_name = course_name_input.text().strip()
+        capacity = course_capacity_input.text().strip()
+        room = course_room_input.text().strip()
 
-        if course_id == "" or course_name == "":
-            QMessageBox.warning(self, "Input Error", "All course fields are required.")
+        if not self.is_valid({"type": "course", "id": course_id, "name": course_name, "capacity": capacity},
+                             courses):
+            return
+        try:
+            meetings = [str(meeting) for meeting in parse_meetings(course_meetings_input.text())]
+        except ValueError as error:
+            QMessageBox.warning(self, "Invalid Meetings", str(error))
             return
 
-        courses.append({"ID": course_id, "Name": course_name})
+        course = {"ID": course_id, "Name": course_name}
+        if capacity:
+            course["Capacity"] = int(capacity)
+        if meetings:
+            course["Meetings"] = meetings
+        if room:
+            course["Room"] = room
+        clashes = booking_clashes(course, courses)
+        if clashes:
+            QMessageBox.warning(self, "Time Clash", "\n".join(
+                f"The {kind} is booked by course {other} at that time" for kind, other in clashes))
+            return
+        self.stores["course"].insert(course)
         course_id_input.clear()
         course_name_input.clear()
-        self.update_display()
-        self.update_dropdowns()
+        course_capacity_input.clear()
+        course_meetings_input.clear()
+        course_room_input.clear()
         QMessageBox.information(self, "Success", "Course added successfully!")
 
+    def course_seats(self, course_id):
+        # Gives the desk the course's capacity and current students on first use
+        if not self.desk.is_open(course_id):
+            self.open_seats(course_id)
+        return course_id
+
+    def open_seats(self, course_id):
+        # (Re)reads a course's capacity and students into the desk, keeping its
+        # waitlist; returns the IDs of students who got a freed seat
+        course = next((c for c in courses if c['ID'] == course_id), {})
+        enrolled = [student['ID'] for student in self.derived.enrollment(course_id, students)]
+        return self.desk.open(course_id, course.get('Capacity'), enrolled)
+
+    def timetable_clashes(self, person, course_id):
+        # IDs of the student's or instructor's courses meeting at the same
+        # time as `course_id`
+        by_id = {course['ID']: course for course in courses}
+        if course_id not in by_id:
+            return []
+        return time_clashes(by_id[course_id], [by_id[ref] for ref in person['Courses'] if ref in by_id])
+
+    def set_enrollment(self, student_id, course_id, enrolled, student=None):
+        # `student` may be passed when the caller already has the record
+        if student is None:
+            student = next((record for record in students if record['ID'] == student_id), None)
+            if student is None:
+                return
+        registered = list(student['Courses'])
+        if enrolled and course_id not in registered:
+            student['Courses'].append(course_id)
+        elif not enrolled:
+            student['Courses'][:] = [ref for ref in registered if ref != course_id]
+        if student['Courses'] != registered:
+            self.stores["student"].touch(student, 'Courses', registered)
+
+    def send_confirmation(self, student_id, course_id, status, position=None, promoted=False):
+        # Queues the email for an ENROLLED or WAITLISTED outcome; the UI never waits for SMTP
+        if self.outbox is None or status not in (ENROLLED, WAITLISTED):
+            return
+        student = next((record for record in students if record['ID'] == student_id), None)
+        course = next((record for record in courses if record['ID'] == course_id), None)
+        if student is not None:
+            self.outbox.send(registration_message(student['Name'], student['Email'],
+                                                  course['Name'] if course else course_id,
+                                                  status, position, promoted))
+
+    def release_seats(self, student):
+        # Frees a student's seats for the next students on the waitlists;
+        # returns the IDs of the promoted students
+        for course_id in student['Courses']:
+            self.course_seats(course_id)
+        promoted = []
+        for outcome in self.desk.withdraw(student['ID']):
+            if outcome.promoted is not None:
+                self.set_enrollment(outcome.promoted, outcome.course, True)
+                promoted.append(outcome.promoted)
+        return promoted
+
+    def merge_students(self, keep, drop):
+        # Folds `drop` into `keep` (see dedup.merge); `keep` holds the seats of
+        # both, `drop` leaves any waitlist, and a seat freed because both were
+        # enrolled goes to the waitlist. Returns the IDs of promoted students.
+        affected = [course_id for course_id in drop['Courses'] if self.desk.is_open(course_id)]
+        merge(keep, drop, self.stores["student"], self.stores["course"])
+        promoted = []
+        for course_id in affected:
+            for student_id in self.open_seats(course_id):
+                self.set_enrollment(student_id, course_id, True)
+                promoted.append(student_id)
+        if drop['ID'] != keep['ID']:
+            # Only waitlist places are left for `drop` on the desk
+            for outcome in self.desk.withdraw(drop['ID']):
+                if outcome.promoted is not None:
+                    self.set_enrollment(outcome.promoted, outcome.course, True)
+                    promoted.append(outcome.promoted)
+        return promoted
+
+    def find_duplicates(self):
+        # Lists likely duplicate students, most certain first, and offers to
+        # merge each pair into the first of the two
+        matches = self.dedup["student"].duplicates()
+        if not matches:
+            QMessageBox.information(self, "Find Duplicates", "No likely duplicate students found.")
+            return
+        merged, promoted = 0, []
+        for match in matches[:DUPLICATE_PROMPTS]:
+            keep, drop = match.first, match.second
+            if keep not in self.dedup["student"] or drop not in self.dedup["student"]:
+                continue   # one of them was merged away by an earlier answer
+            answer = QMessageBox.question(
+                self, "Find Duplicates",
+                f"Merge {drop['Name']} (ID {drop['ID']}, {drop['Email']}) into "
+                f"{keep['Name']} (ID {keep['ID']}, {keep['Email']})?\n"
+                f"Same {', '.join(match.reasons) or 'nothing'}; score {match.score:.2f}")
+            if answer == QMessageBox.Yes:
+                promoted.extend(self.merge_students(keep, drop))
+                merged += 1
+        message = f"{merged} of {len(matches)} likely duplicates merged."
+        if promoted:
+            message += f"\nMoved off waitlists: {', '.join(promoted)}"
+        QMessageBox.information(self, "Find Duplicates", message)
+
     def register_student_for_course(self):
         global students
         student_id = student_dropdown.currentText()
         course_id = course_dropdown.currentText()
 
-        for student in students:
-            if student['ID'] == student_id:
-                student['Courses'].append(course_id)
-                self.update_display()
-                QMessageBox.information(self, "Success", f"Student {student_id} registered for course {course_id}!")
-                return
+        student = next((record for record in students if record['ID'] == student_id), None)
+        if student is None or not course_id:
+            QMessageBox.warning(self, "Error", "Student not found.")
+            return
+        clashes = self.timetable_clashes(student, course_id)
+        if clashes:
+            QMessageBox.warning(self, "Time Clash", f"Course {course_id} meets at the same time as "
+                                                    f"course {', '.join(clashes)} of student {student_id}.")
+            return
+
+        # The desk decides, under the course's lock, whether a seat is free
+        outcome = self.desk.register(student_id, self.course_seats(course_id))
+        self.send_confirmation(student_id, course_id, outcome.status, outcome.position)
+        if outcome.status == ENROLLED:
+            self.set_enrollment(student_id, course_id, True)
+            QMessageBox.information(self, "Success", f"Student {student_id} registered for course {course_id}!")
+        elif outcome.status == WAITLISTED:
+            QMessageBox.information(self, "Course Full", f"Course {course_id} is full; student {student_id} "
+                                                         f"is number {outcome.position} on the waitlist.")
+        else:
+            QMessageBox.information(self, "Registration", f"Student {student_id} is {outcome.status} "
+                                                          f"for course {course_id}.")
 
-        QMessageBox.warning(self, "Error", "Student not found.")
+    def drop_student_from_course(self):
+        student_id = student_dropdown.currentText()
+        course_id = course_dropdown.currentText()
+        if not student_id or not course_id:
+            return
+
+        outcome = self.desk.drop(student_id, self.course_seats(course_id))
+        if outcome.status == DROPPED:
+            with self.bus.transaction():
+                self.set_enrollment(student_id, course_id, False)
+                if outcome.promoted is not None:
+                    self.set_enrollment(outcome.promoted, course_id, True)
+        message = f"Student {student_id}: {outcome.status} (course {course_id})."
+        if outcome.promoted is not None:
+            message += f"\nStudent {outcome.promoted} moved off the waitlist."
+        QMessageBox.information(self, "Drop Course", message)
 
     def assign_instructor_to_course(self):
         global instructors
@@ -237,8 +601,15 @@ class SchoolManagementSystem(QMainWindow):
 
         for instructor in instructors:
             if instructor['ID'] == instructor_id:
+                clashes = self.timetable_clashes(instructor, course_id)
+                if clashes:
+                    QMessageBox.warning(self, "Time Clash", f"Course {course_id} meets at the same time as "
+                                                            f"course {', '.join(clashes)} of instructor "
+                                                            f"{instructor_id}.")
+                    return
+                assigned = list(instructor['Courses'])
                 instructor['Courses'].append(course_id)
-                self.update_display()
+                self.stores["instructor"].touch(instructor, 'Courses', assigned)
                 QMessageBox.information(self, "Success", f"Instructor {instructor_id} assigned to course {course_id}!")
                 return
 
@@ -247,26 +618,38 @@ class SchoolManagementSystem(QMainWindow):
     def save_data(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Data", "", "JSON Files (*.json)")
         if file_path:
-            data = {
-                "students": students,
-                "instructors": instructors,
-                "courses": courses
-            }
-            with open(file_path, 'w') as json_file:
-                json.dump(data, json_file)
+            write_records(file_path, chain(
+                (student_record(student) for student in students),
+                (instructor_record(instructor) for instructor in instructors),
+                (course_record(course) for course in courses)))
             QMessageBox.information(self, "Success", "Data saved successfully!")
 
     def load_data(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Load Data", "", "JSON Files (*.json)")
         if file_path:
-            with open(file_path, 'r') as json_file:
-                data = json.load(json_file)
-                global students, instructors, courses
-                students = data.get("students", [])
-                instructors = data.get("instructors", [])
-                courses = data.get("courses", [])
-            self.update_display()
-            self.update_dropdowns()
+            # Files saved before the schema header existed are upgraded while reading
+            loaded = {"student": [], "instructor": [], "course": []}
+            try:
+                records = list(iter_records(file_path))
+            except ValueError as error:
+                QMessageBox.warning(self, "Load Error", str(error))
+                return
+            # One pass over the whole file: every problem of every record
+            problems = Validator(courses=()).validate_batch(records)
+            if problems:
+                lines = [f"{records[row]['type'].title()} {records[row]['id']}: "
+                         + "; ".join(issue.message for issue in issues)
+                         for row, issues in sorted(problems.items())[:LOAD_PROBLEMS_SHOWN]]
+                answer = QMessageBox.question(
+                    self, "Invalid records",
+                    f"{len(problems)} records have problems:\n" + "\n".join(lines) + "\n\nLoad anyway?")
+                if answer != QMessageBox.Yes:
+                    return
+            for record in records:
+                loaded[record["type"]].append(record_to_pyqt(record))
+            with self.bus.transaction():
+                for entity, records in loaded.items():
+                    self.stores[entity].load(records)
             QMessageBox.information(self, "Success", "Data loaded successfully!")
 
     def export_to_csv(self):
@@ -274,40 +657,73 @@ class SchoolManagementSystem(QMainWindow):
         if file_path:
             with open(file_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerow(["Students"])
-                writer.writerow(["ID", "Name", "Email", "Courses"])
-                for student in students:
-                    writer.writerow([student['ID'], student['Name'], student['Email'], ', '.join(student['Courses'])])
-                writer.writerow([])
-                writer.writerow(["Instructors"])
-                writer.writerow(["ID", "Name", "Email", "Courses"])
-                for instructor in instructors:
-                    writer.writerow([instructor['ID'], instructor['Name'], instructor['Email'], ', '.join(instructor['Courses'])])
-                writer.writerow([])
-                writer.writerow(["Courses"])
-                writer.writerow(["ID", "Name"])
-                for course in courses:
-                    writer.writerow([course['ID'], course['Name']])
+                # Page by page in ID order, so no copy of a whole list is made
+                for entity, title, header in (
+                        ("student", "Students", ["ID", "Name", "Email", "Courses"]),
+                        ("instructor", "Instructors", ["ID", "Name", "Email", "Courses"]),
+                        ("course", "Courses", ["ID", "Name"])):
+                    if entity != "student":
+                        writer.writerow([])
+                    writer.writerow([title])
+                    writer.writerow(header)
+                    for record in iter_all(self.pages[entity]):
+                        writer.writerow(self.row_values(entity, record))
             QMessageBox.information(self, "Success", "Data exported successfully!")
 
+    def generate_report_files(self):
+        # One schedule per student and one roster per course, rendered by worker processes
+        out_dir = QFileDialog.getExistingDirectory(self, "Folder for the reports")
+        if not out_dir:
+            return
+        dialog = QProgressDialog("Generating reports...", "Cancel", 0, 1, self)
+        dialog.setMinimumDuration(0)
+
+        def show_progress(done, total):
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+            QApplication.processEvents()
+            return not dialog.wasCanceled()
+
+        written = generate_reports(students, courses, out_dir, progress=show_progress)
+        dialog.close()
+        QMessageBox.information(self, "Success", f"{written} reports written to {out_dir}")
+
     def search_records(self):
+        # A name, an ID or a query such as "age>=20 and course:PHYS102"; a query is
+        # run on every entity that has the fields it uses
         search_text = search_input.text().strip()
+        if not search_text:
+            return
         results = []
-        for student in students:
-            if search_text.lower() in student['ID'].lower() or search_text.lower() in student['Name'].lower():
-                results.append(f"Student ID: {student['ID']}, Name: {student['Name']}, Email: {student['Email']}, Courses: {', '.join(student['Courses'])}")
-        for instructor in instructors:
-            if search_text.lower() in instructor['ID'].lower() or search_text.lower() in instructor['Name'].lower():
-                results.append(f"Instructor ID: {instructor['ID']}, Name: {instructor['Name']}, Email: {instructor['Email']}, Courses: {', '.join(instructor['Courses'])}")
-        for course in courses:
-            if search_text.lower() in course['ID'].lower() or search_text.lower() in course['Name'].lower():
-                results.append(f"Course ID: {course['ID']}, Name: {course['Name']}")
-
-        if results:
+        error = None
+        searched = False
+        for entity in ("student", "instructor", "course"):
+            try:
+                found = self.queries[entity].search(search_text)
+            except ValueError as exc:
+                error = exc
+                continue
+            searched = True
+            results.extend(self.search_summary(entity, record)
+                           for record in self.sorters[entity].ordered(
+                               self.stores[entity].records, {id(record) for record in found}))
+
+        if not searched:
+            QMessageBox.warning(self, "Search Error", str(error))
+        elif results:
             QMessageBox.information(self, "Search Results", "\n".join(results))
         else:
             QMessageBox.information(self, "Search Results", "No matching records found.")
 
+    def search_summary(self, entity, record):
+        # Cached one-line description of a record for the search results
+        def summary(rec):
+            values = self.row_values(entity, rec)
+            if entity == "course":
+                return f"Course ID: {values[0]}, Name: {values[1]}"
+            return f"{entity.title()} ID: {values[0]}, Name: {values[1]}, Email: {values[2]}, Courses: {values[3]}"
+        return self.derived.for_record("summary", entity, record, summary)
+
     def edit_record(self):
         selected_student_id = student_dropdown.currentText()
         selected_instructor_id = instructor_dropdown.currentText()
@@ -316,26 +732,32 @@ class SchoolManagementSystem(QMainWindow):
         # Edit Student
         for student in students:
             if student['ID'] == selected_student_id:
+                changes = {}
                 new_name, ok = QInputDialog.getText(self, "Edit Student", "Enter new student name:")
                 if ok:
-                    student['Name'] = new_name
+                    changes['Name'] = new_name
                 new_email, ok = QInputDialog.getText(self, "Edit Student", "Enter new student email:")
                 if ok:
-                    student['Email'] = new_email
-                self.update_display()
+                    changes['Email'] = new_email
+                if not self.is_valid(student_record(dict(student, **changes)), students, student['ID']):
+                    return
+                self.stores["student"].update(student, **changes)
                 QMessageBox.information(self, "Success", "Student record updated successfully!")
                 return
 
         # Edit Instructor
         for instructor in instructors:
             if instructor['ID'] == selected_instructor_id:
+                changes = {}
                 new_name, ok = QInputDialog.getText(self, "Edit Instructor", "Enter new instructor name:")
                 if ok:
-                    instructor['Name'] = new_name
+                    changes['Name'] = new_name
                 new_email, ok = QInputDialog.getText(self, "Edit Instructor", "Enter new instructor email:")
                 if ok:
-                    instructor['Email'] = new_email
-                self.update_display()
+                    changes['Email'] = new_email
+                if not self.is_valid(instructor_record(dict(instructor, **changes)), instructors, instructor['ID']):
+                    return
+                self.stores["instructor"].update(instructor, **changes)
                 QMessageBox.information(self, "Success", "Instructor record updated successfully!")
                 return
 
@@ -344,8 +766,9 @@ class SchoolManagementSystem(QMainWindow):
             if course['ID'] == selected_course_id:
                 new_name, ok = QInputDialog.getText(self, "Edit Course", "Enter new course name:")
                 if ok:
-                    course['Name'] = new_name
-                self.update_display()
+                    if not self.is_valid(course_record(dict(course, Name=new_name)), courses, course['ID']):
+                        return
+                    self.stores["course"].update(course, Name=new_name)
                 QMessageBox.information(self, "Success", "Course record updated successfully!")
                 return
 
@@ -354,55 +777,215 @@ class SchoolManagementSystem(QMainWindow):
         selected_instructor_id = instructor_dropdown.currentText()
         selected_course_id = course_dropdown.currentText()
 
-        global students, instructors, courses
-
         # Delete Student
         for student in students:
             if student['ID'] == selected_student_id:
-                students.remove(student)
-                self.update_display()
-                self.update_dropdowns()
+                with self.bus.transaction():
+                    self.release_seats(student)
+                    self.stores["student"].delete(student)
                 QMessageBox.information(self, "Success", "Student record deleted successfully!")
                 return
 
         # Delete Instructor
         for instructor in instructors:
             if instructor['ID'] == selected_instructor_id:
-                instructors.remove(instructor)
-                self.update_display()
-                self.update_dropdowns()
+                self.stores["instructor"].delete(instructor)
                 QMessageBox.information(self, "Success", "Instructor record deleted successfully!")
                 return
 
         # Delete Course
         for course in courses:
             if course['ID'] == selected_course_id:
-                courses.remove(course)
-                self.update_display()
-                self.update_dropdowns()
+                self.stores["course"].delete(course)
+                self.desk.close(selected_course_id)
                 QMessageBox.information(self, "Success", "Course record deleted successfully!")
                 return
 
+    def selected_records(self, entity):
+        # Records of the rows selected in an entity's table (column 0 holds the ID)
+        table = {"student": students_table, "instructor": instructors_table,
+                 "course": courses_table}[entity]
+        selected_ids = {table.item(index.row(), 0).text() for index in table.selectionModel().selectedRows()
+                        if table.item(index.row(), 0) is not None}
+        return [record for record in self.stores[entity] if record['ID'] in selected_ids]
+
+    def delete_selected(self):
+        selected = {entity: self.selected_records(entity) for entity in ("student", "instructor", "course")}
+        total = sum(len(records) for records in selected.values())
+        if not total:
+            QMessageBox.warning(self, "Delete Selected", "Select rows in a table first.")
+            return
+        answer = QMessageBox.question(self, "Delete Selected", f"Delete {total} selected records?")
+        if answer != QMessageBox.Yes:
+            return
+        promoted = []
+        with self.bus.transaction():
+            for student in selected["student"]:
+                promoted.extend(self.release_seats(student))
+            for entity, records in selected.items():
+                self.stores[entity].delete_many(records)
+        for course in selected["course"]:
+            self.desk.close(course['ID'])
+        message = f"{total} records deleted."
+        if promoted:
+            message += f"\nMoved off waitlists: {', '.join(promoted)}"
+        QMessageBox.information(self, "Delete Selected", message)
+
+    def register_selected_students(self):
+        course_id = course_dropdown.currentText()
+        selected = self.selected_records("student")
+        if not selected or not course_id:
+            QMessageBox.warning(self, "Error", "Select students in the table and a course first.")
+            return
+
+        by_id = {student['ID']: student for student in selected
+                 if not self.timetable_clashes(student, course_id)}
+        outcomes = self.desk.register_many(list(by_id), self.course_seats(course_id))
+        with self.bus.transaction():
+            for outcome in outcomes:
+                if outcome.status == ENROLLED:
+                    self.set_enrollment(outcome.student, course_id, True, by_id[outcome.student])
+        counts = {}
+        for outcome in outcomes:
+            self.send_confirmation(outcome.student, course_id, outcome.status, outcome.position)
+            counts[outcome.status] = counts.get(outcome.status, 0) + 1
+        clashing = len({student['ID'] for student in selected}) - len(by_id)
+        if clashing:
+            counts["skipped (time clash)"] = clashing
+        QMessageBox.information(self, "Registration", f"Course {course_id}: " + ", ".join(
+            f"{count} {status}" for status, count in counts.items()))
+
+    def assign_instructor_to_selected_courses(self):
+        instructor_id = instructor_dropdown.currentText()
+        instructor = next((record for record in instructors if record['ID'] == instructor_id), None)
+        selected = self.selected_records("course")
+        if instructor is None or not selected:
+            QMessageBox.warning(self, "Error", "Select courses in the table and an instructor first.")
+            return
+        # A course meeting when the instructor already teaches is skipped
+        assigned = list(instructor['Courses'])
+        skipped = 0
+        for course in selected:
+            if course['ID'] in instructor['Courses']:
+                continue
+            if self.timetable_clashes(instructor, course['ID']):
+                skipped += 1
+            else:
+                instructor['Courses'].append(course['ID'])
+        if instructor['Courses'] != assigned:
+            self.stores["instructor"].touch(instructor, 'Courses', assigned)
+        message = (f"Instructor {instructor_id} assigned to "
+                   f"{len(instructor['Courses']) - len(assigned)} more courses.")
+        if skipped:
+            message += f"\n{skipped} skipped: they meet when the instructor already teaches."
+        QMessageBox.information(self, "Success", message)
+
+    def edit_selected(self):
+        # Sets one field to the same value on every selected row of the first
+        # table that has a selection
+        entity, records = next(((entity, records) for entity, records in (
+            (entity, self.selected_records(entity)) for entity in ("student", "instructor", "course"))
+            if records), (None, []))
+        if entity is None:
+            QMessageBox.warning(self, "Edit Selected", "Select rows in a table first.")
+            return
+        field, ok = QInputDialog.getItem(self, "Edit Selected", f"Field to set for {len(records)} {entity}s:",
+                                         BULK_FIELDS[entity], 0, False)
+        if not ok:
+            return
+        value, ok = QInputDialog.getText(self, "Edit Selected", f"New {field.lower()}:")
+        if not ok:
+            return
+        value = value.strip()
+        problems = Validator().validate_field(entity, field.lower(), value)
+        if problems:
+            QMessageBox.warning(self, "Input Error", "\n".join(problems))
+            return
+        if field == "Capacity":
+            value = int(value) if value else None
+        with self.bus.transaction():
+            changed = self.stores[entity].update_many(records, **{field: value})
+            if field == "Capacity":
+                # Courses the desk already tracks take the new capacity at once
+                for course in changed:
+                    if self.desk.is_open(course['ID']):
+                        for student_id in self.desk.set_capacity(course['ID'], value):
+                            self.set_enrollment(student_id, course['ID'], True)
+        QMessageBox.information(self, "Edit Selected", f"{field} changed for {len(changed)} {entity}s.")
+
+    def show_student_history(self):
+        # The audit entries of the selected student, also those from before an ID change
+        student_id = student_dropdown.currentText()
+        if not student_id:
+            QMessageBox.warning(self, "Student History", "Select a student first.")
+            return
+        entries = self.audit.query("student", student_id)
+        lines = [describe(entry) for entry in entries[-HISTORY_LINES:]]
+        if len(entries) > HISTORY_LINES:
+            lines.insert(0, f"(last {HISTORY_LINES} of {len(entries)} changes)")
+        QMessageBox.information(self, f"History of {student_id}", "\n".join(lines) or "No recorded changes.")
+
+    def show_student_as_of(self):
+        # The selected student as it was on a date, with its courses then
+        student_id = student_dropdown.currentText()
+        if not student_id:
+            QMessageBox.warning(self, "Student As Of", "Select a student first.")
+            return
+        text, ok = QInputDialog.getText(self, "Student As Of", "Date (YYYY-MM-DD or YYYY-MM-DD HH:MM):")
+        if not ok or not text:
+            return
+        try:
+            when = parse_time(text)
+        except ValueError:
+            QMessageBox.warning(self, "Student As Of", f"Not a date: {text}")
+            return
+        state = self.history.as_of("student", student_id, when)
+        if state is None:
+            QMessageBox.information(self, f"{student_id} as of {text}", "Not a student then.")
+            return
+        QMessageBox.information(self, f"{student_id} as of {text}", "\n".join([
+            f"Name: {state['name']}", f"Email: {state['email']}",
+            f"Courses: {', '.join(map(str, state['courses'])) or '(none)'}"]))
+
+    def closeEvent(self, event):
+        # Compresses the audit journal into its segment and sends the queued
+        # emails before the window closes
+        self.audit.close()
+        self.history.close()
+        if self.outbox is not None:
+            self.outbox.close(OUTBOX_CLOSE_TIMEOUT)
+        super().closeEvent(event)
+
     def update_display(self):
-        students_table.setRowCount(len(students))
-        instructors_table.setRowCount(len(instructors))
-        courses_table.setRowCount(len(courses))
-
-        for row, student in enumerate(students):
-            students_table.setItem(row, 0, QTableWidgetItem(student['ID']))
-            students_table.setItem(row, 1, QTableWidgetItem(student['Name']))
-            students_table.setItem(row, 2, QTableWidgetItem(student['Email']))
-            students_table.setItem(row, 3, QTableWidgetItem(', '.join(student['Courses'])))
-
-        for row, instructor in enumerate(instructors):
-            instructors_table.setItem(row, 0, QTableWidgetItem(instructor['ID']))
-            instructors_table.setItem(row, 1, QTableWidgetItem(instructor['Name']))
-            instructors_table.setItem(row, 2, QTableWidgetItem(instructor['Email']))
-            instructors_table.setItem(row, 3, QTableWidgetItem(', '.join(instructor['Courses'])))
-
-        for row, course in enumerate(courses):
-            courses_table.setItem(row, 0, QTableWidgetItem(course['ID']))
-            courses_table.setItem(row, 1, QTableWidgetItem(course['Name']))
+        for entity in ("student", "instructor", "course"):
+            self.fill_table(entity)
+
+    def fill_table(self, entity):
+        table = {"student": students_table, "instructor": instructors_table,
+                 "course": courses_table}[entity]
+        records = self.stores[entity].records
+        table.setRowCount(len(records))
+        for row, record in enumerate(self.sorters[entity].ordered(records)):
+            self.fill_row(table, row, entity, record)
+
+    def fill_row(self, table, row, entity, record):
+        for column, text in enumerate(self.row_values(entity, record)):
+            table.setItem(row, column, QTableWidgetItem(text))
+
+    def row_values(self, entity, record):
+        # Cached display strings of one record, as shown in its table and the CSV export
+        return self.derived.for_record("row", entity, record, lambda rec: (
+            (rec['ID'], rec['Name'], rec['Email'], ', '.join(rec['Courses'])) if 'Email' in rec
+            else (rec['ID'], rec['Name'])))
+
+    def sort_table(self, sorter, sort_columns, column):
+        # Header click: walk the presorted index instead of re-sorting the list
+        if column not in sort_columns:
+            return
+        sorter.toggle(sort_columns[column])
+        entity = next(name for name, other in self.sorters.items() if other is sorter)
+        self.fill_table(entity)
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,433 @@
+"""
+history.py
+==========
+
+Bitemporal history of students, instructors and courses, for questions like
+"which courses was this student enrolled in on census date?".
+
+Every version of a record has two times:
+
+- valid time    : from when the change holds at the school. By default this
+  is when it was made; inside `History.effective(when)` changes are
+  recorded as holding from `when` instead (a late registration that counts
+  from the start of term, a correction of an earlier mistake).
+- recorded time : when the change was recorded here.
+
+`History.as_of(entity, id, valid_at, known_at)` returns the record as it
+was at `valid_at`, as far as it was known at `known_at` (default: what is
+known now, including later corrections). `between` lists the versions
+that took effect in a time range.
+
+Versions are appended to one JSON Lines file as compact deltas: an insert
+stores the whole record; an update stores only the changed fields, and only
+the added and removed entries of a list field (the course and student lists
+are the enrollments). A delete stores nothing. Records are kept in the
+canonical layout of schema.py, whichever GUI changed them.
+
+The live records are not touched, so reading the current state costs what
+it always did. The file is only read on the first query, or on the first
+change after the data was reloaded. At that point the reloaded records are
+compared with the history, and any difference (e.g. a file edited by hand)
+is recorded as of the reload. Records missing from a reload are not taken
+as deleted, as in campus mode only one shard is loaded.
+
+Usage:
+------
+    python history.py HISTORY_FILE ENTITY ID [YYYY-MM-DD[THH:MM]]
+
+Classes:
+--------
+- Version
+- History
+
+Functions:
+----------
+- parse_time
+"""
+
+import bisect
+import datetime
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from Part12 import person_fields
+from schema import student_record, instructor_record, course_record
+from school_store import INSERTED, UPDATED, DELETED, RELOADED
+
+HISTORY_FILE = "history.jsonl"
+CHECKPOINT_EVERY = 16    # versions between cached states of a record
+
+Version = namedtuple("Version", "valid recorded kind delta")
+Version.__doc__ = """One version of a record: valid and recorded time (seconds since the
+epoch), kind ("insert", "update" or "delete") and the delta (whole record,
+changed fields or None)."""
+
+_CANONICAL = {"student": student_record, "instructor": instructor_record, "course": course_record}
+
+# Field names of the GUIs' records -> canonical field names
+FIELD_NAMES = {
+    "name": "name", "n_entry": "name", "Name": "name", "course_name": "name",
+    "age": "age", "Age": "age",
+    "_email": "email", "email": "email", "Email": "email",
+    "student_id": "id", "instructor_id": "id", "id": "id", "ID": "id",
+    "registered_courses": "courses", "assigned_courses": "courses", "Courses": "courses",
+    "enrolled_students": "students", "instructor_name": "instructor",
+    "capacity": "capacity", "Capacity": "capacity", "campus": "campus",
+}
+
+
+def parse_time(text):
+    """
+    Seconds since the epoch for "YYYY-MM-DD" (the end of that day, so the
+    day's own changes count) or "YYYY-MM-DD HH:MM[:SS]" in local time.
+    """
+    text = text.strip()
+    if len(text) == 10:
+        day = datetime.date.fromisoformat(text)
+        return datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).timestamp() - 1e-6
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def canonical(entity, record):
+    """
+    A record of either GUI in the canonical layout, without its "type".
+    """
+    fields = _CANONICAL[entity](record)
+    del fields["type"]
+    return fields
+
+
+def _items(entries):
+    # List entries are names or IDs; tkinter2 courses may list Student objects
+    if all(isinstance(entry, (str, int)) for entry in entries):
+        return entries
+    return [entry if isinstance(entry, (str, int)) else person_fields(entry)["name"] for entry in entries]
+
+
+def _list_delta(old, new):
+    old, new = _items(old), _items(new)
+    old_set, new_set = set(old), set(new)
+    delta = {}
+    added = [item for item in new if item not in old_set]
+    removed = [item for item in old if item not in new_set]
+    if added:
+        delta["+"] = added
+    if removed:
+        delta["-"] = removed
+    return delta
+
+
+def _add_change(delta, field, old, new):
+    # A list field only gets its added and removed entries; a new order alone is no change
+    if isinstance(old, list) and isinstance(new, list):
+        new = _list_delta(old, new)
+        if not new:
+            return
+    delta[field] = new
+
+
+def _apply(state, version):
+    # The state after `version`; states are never changed in place
+    if version.kind == "insert":
+        return dict(version.delta)
+    if version.kind == "delete" or state is None:
+        return None
+    state = dict(state)
+    for field, value in version.delta.items():
+        if isinstance(value, dict):
+            removed = set(value.get("-", ()))
+            current = [item for item in state.get(field, []) if item not in removed]
+            state[field] = current + [item for item in value.get("+", ()) if item not in current]
+        else:
+            state[field] = value
+    return state
+
+
+class _Chain:
+    # Versions of one record in (valid, recorded) order, with cached states
+    __slots__ = ("versions", "checkpoints", "renamed_from")
+
+    def __init__(self):
+        self.versions = []
+        self.checkpoints = {}     # index -> state after versions[:index + 1]
+        self.renamed_from = []    # (valid time, previous ID)
+
+    def add(self, version):
+        if not self.versions or self.versions[-1][:2] <= version[:2]:
+            position = len(self.versions)    # the usual case: the latest change
+        else:
+            position = bisect.bisect_right(self.versions, version[:2], key=lambda item: item[:2])
+        self.versions.insert(position, version)
+        # Cached states after the new version no longer hold
+        for index in [index for index in self.checkpoints if index >= position]:
+            del self.checkpoints[index]
+
+    def state(self, valid_at, known_at):
+        end = bisect.bisect_right(self.versions, valid_at, key=lambda item: item.valid)
+        if known_at is not None:
+            # Not the current knowledge: replay the versions known then
+            state = None
+            for version in self.versions[:end]:
+                if version.recorded <= known_at:
+                    state = _apply(state, version)
+            return state
+        start, state = 0, None
+        for index in range(end - 1, -1, -1):
+            if index in self.checkpoints:
+                start, state = index + 1, self.checkpoints[index]
+                break
+        for index in range(start, end):
+            state = _apply(state, self.versions[index])
+            if index % CHECKPOINT_EVERY == CHECKPOINT_EVERY - 1:
+                self.checkpoints[index] = state
+        return state
+
+
+class History:
+    """
+    Bitemporal version store in one JSON Lines file.
+
+    Parameters:
+    -----------
+    path : str
+        The history file; created on the first change.
+    clock : callable
+        Returns the current time in seconds.
+    """
+
+    def __init__(self, path=HISTORY_FILE, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._chains = None       # (entity, ID) -> _Chain, once the file is read
+        self._stores = {}
+        self._reloads = {}        # entity -> time of a reload not compared yet
+        self._valid_from = None
+        self._file = None
+
+    # --- recording ---
+
+    def attach(self, bus, stores):
+        """
+        Records every change published on `bus`. `stores` maps each entity
+        to its `RecordStore`, whose records are compared with the history
+        after a reload. Returns the subscription handle.
+        """
+        self._stores = dict(stores)
+        return bus.subscribe(self.record_events, batch=True)
+
+    @contextmanager
+    def effective(self, valid_from):
+        """
+        Changes made inside the block hold from `valid_from` (seconds since
+        the epoch) instead of from the moment they are made.
+        """
+        previous, self._valid_from = self._valid_from, valid_from
+        try:
+            yield self
+        finally:
+            self._valid_from = previous
+
+    def record_events(self, events):
+        """
+        Appends a version for each change of a batch of `ChangeEvent`s
+        (the subscriber `attach` installs).
+        """
+        now = self.clock()
+        valid = now if self._valid_from is None else self._valid_from
+        lines = []
+        for position, event in enumerate(events):
+            if event.kind == RELOADED:
+                if event.entity in self._stores:
+                    self._reloads[event.entity] = now
+                continue
+            if self._reloads:
+                self._reconcile(events[position:])
+            record_id = str(event.record_id)
+            if event.kind == INSERTED:
+                lines.append(self._add(event.entity, record_id, Version(
+                    valid, now, "insert", canonical(event.entity, event.record))))
+            elif event.kind == DELETED:
+                lines.append(self._add(event.entity, record_id, Version(valid, now, "delete", None)))
+            elif event.kind == UPDATED:
+                lines.extend(self._update(event, record_id, valid, now))
+        self._write(lines)
+
+    def _write(self, lines):
+        if lines:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write("".join(lines))
+            self._file.flush()
+
+    def _update(self, event, record_id, valid, now):
+        delta = {}
+        old_id = None
+        for field, (old, new) in event.changes.items():
+            name = FIELD_NAMES.get(field, field)
+            if name == "id":
+                old_id = str(old)
+            elif old != new:
+                _add_change(delta, name, old, new)
+        if old_id is not None and old_id != record_id:
+            # A new ID starts a new chain, linked to the old one
+            return [self._add(event.entity, old_id, Version(valid, now, "delete", None)),
+                    self._add(event.entity, record_id, Version(
+                        valid, now, "insert", canonical(event.entity, event.record)), renamed_from=old_id)]
+        if not delta:
+            return []
+        return [self._add(event.entity, record_id, Version(valid, now, "update", delta))]
+
+    def _add(self, entity, record_id, version, renamed_from=None):
+        # Adds a version (if the file has been read) and returns its file line
+        if self._chains is not None:
+            chain = self._chains.setdefault((entity, record_id), _Chain())
+            chain.add(version)
+            if renamed_from is not None:
+                chain.renamed_from.append((version.valid, renamed_from))
+        entry = {"e": entity, "id": record_id, "v": version.valid, "k": version.kind[0], "d": version.delta}
+        if version.recorded != version.valid:
+            entry["t"] = version.recorded
+        if renamed_from is not None:
+            entry["from"] = renamed_from
+        return json.dumps(entry, separators=(",", ":")) + "\n"
+
+    def _load(self):
+        if self._chains is not None:
+            return
+        self._chains = {}
+        if not os.path.exists(self.path):
+            return
+        kinds = {"i": "insert", "u": "update", "d": "delete"}
+        with open(self.path, "r") as file_handler:
+            # One parse for the whole file is much faster than one per line
+            entries = json.loads("[" + ",".join(line for line in file_handler if line.strip()) + "]")
+        for entry in entries:
+            chain = self._chains.setdefault((entry["e"], entry["id"]), _Chain())
+            chain.versions.append(Version(entry["v"], entry.get("t", entry["v"]), kinds[entry["k"]], entry["d"]))
+            if "from" in entry:
+                chain.renamed_from.append((entry["v"], entry["from"]))
+        for chain in self._chains.values():
+            chain.versions.sort(key=lambda item: (item.valid, item.recorded))
+
+    def _reloaded_states(self, entity, pending):
+        # Canonical records as reloaded: the store's records with the changes
+        # made since then (`pending` events, not recorded yet) undone
+        states = {}
+        for record in self._stores[entity].records:
+            fields = canonical(entity, record)
+            states[str(fields["id"])] = fields
+        for event in reversed(pending):
+            if event.entity != entity:
+                continue
+            record_id = str(event.record_id)
+            if event.kind == INSERTED:
+                states.pop(record_id, None)
+            elif event.kind == UPDATED and record_id in states:
+                fields = states.pop(record_id)
+                for field, (old, new) in event.changes.items():
+                    name = FIELD_NAMES.get(field, field)
+                    fields[name] = list(_items(old)) if isinstance(old, list) else old
+                fields["id"] = str(fields["id"])
+                states[fields["id"]] = fields
+        return states
+
+    def _reconcile(self, pending=()):
+        # Records what a reload brought in that the history does not have yet
+        self._load()
+        reloads, self._reloads = self._reloads, {}
+        lines = []
+        for entity, reloaded_at in reloads.items():
+            for record_id, fields in self._reloaded_states(entity, pending).items():
+                chain = self._chains.get((entity, record_id))
+                known = chain.state(float("inf"), None) if chain is not None else None
+                if known is None:
+                    lines.append(self._add(entity, record_id, Version(reloaded_at, reloaded_at, "insert", fields)))
+                    continue
+                delta = {}
+                for field, value in fields.items():
+                    if known.get(field) != value:
+                        _add_change(delta, field, known.get(field), value)
+                if delta:
+                    lines.append(self._add(entity, record_id, Version(reloaded_at, reloaded_at, "update", delta)))
+        self._write(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # --- queries ---
+
+    def _ready(self):
+        self._load()
+        if self._reloads:
+            self._reconcile()
+
+    def as_of(self, entity, record_id, valid_at=None, known_at=None):
+        """
+        The canonical record (a dict) as it was at `valid_at`, as known at
+        `known_at`; None if it did not exist then. Both times default to now.
+        A record whose ID was changed is found under its old ID before then.
+        """
+        self._ready()
+        valid_at = self.clock() if valid_at is None else valid_at
+        record_id = str(record_id)
+        chain = self._chains.get((entity, record_id))
+        if chain is None:
+            return None
+        state = chain.state(valid_at, known_at)
+        if state is None:
+            for renamed_at, old_id in reversed(chain.renamed_from):
+                if renamed_at > valid_at:
+                    return self.as_of(entity, old_id, valid_at, known_at)
+        return state
+
+    def snapshot(self, entity, valid_at=None, known_at=None):
+        """
+        Every record of `entity` that existed at `valid_at`, as known at `known_at`.
+        """
+        self._ready()
+        valid_at = self.clock() if valid_at is None else valid_at
+        states = (chain.state(valid_at, known_at) for (kind, _), chain in self._chains.items() if kind == entity)
+        return [state for state in states if state is not None]
+
+    def between(self, entity, record_id=None, start=None, end=None):
+        """
+        (record ID, `Version`) of the versions that took effect in
+        [start, end), in valid-time order; for one record or all of `entity`.
+        """
+        self._ready()
+        found = []
+        keys = [(entity, str(record_id))] if record_id is not None else \
+            [key for key in self._chains if key[0] == entity]
+        for key in keys:
+            chain = self._chains.get(key)
+            if chain is None:
+                continue
+            for version in chain.versions:
+                if (start is None or version.valid >= start) and (end is None or version.valid < end):
+                    found.append((key[1], version))
+        found.sort(key=lambda item: (item[1].valid, item[1].recorded))
+        return found
+
+
+def main(args):
+    if len(args) < 3:
+        print("Usage: python history.py HISTORY_FILE ENTITY ID [YYYY-MM-DD[THH:MM]]")
+        return 1
+    history = History(args[0])
+    valid_at = parse_time(args[3].replace("T", " ")) if len(args) > 3 else None
+    state = history.as_of(args[1], args[2], valid_at)
+    print(json.dumps(state, indent=2) if state is not None else f"No {args[1]} {args[2]} at that time")
+    for record_id, version in history.between(args[1], args[2]):
+        when = datetime.datetime.fromtimestamp(version.valid).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{when} {version.kind} {json.dumps(version.delta)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
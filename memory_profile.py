@@ -0,0 +1,255 @@
+"""
+memory_profile.py
+=================
+
+Where the memory goes: bytes per student, instructor, course, enrollment
+entry and table row, and the code that allocates them.
+
+A dataset of the requested size is written as a version-2 data file and
+loaded the way tkinter2 loads it (records -> `Student` objects), then the
+change-event machinery and indexes are built, searches are run and every
+table row is rendered. Two measurements are taken:
+
+- deep sizing : `deep_sizeof` follows containers, `__dict__` and `__slots__`
+  and counts each object once, giving the resident bytes per entity
+- tracemalloc : the live bytes per allocating line after each phase (load,
+  indexes, search, refresh) are compared with those after the previous one,
+  giving the bytes each phase added and its top allocation sites
+
+Table rows are measured on the Python side (the cached row tuples the
+Treeview and QTableWidget are filled from); memory Tk or Qt keep for their
+own items is not visible to tracemalloc.
+
+Usage:
+------
+    python memory_profile.py [students [top]]
+
+Functions:
+----------
+- deep_sizeof
+- build_dataset
+- profile
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from types import ModuleType
+
+from Part12 import Instructor
+from derived_cache import DerivedCache
+from query import QueryIndex
+from schema import iter_records, write_records, record_to_student
+from school_store import EventBus, RecordStore
+from sort_index import TableSorter, STUDENT_SORT_KEYS, INSTRUCTOR_SORT_KEYS, COURSE_SORT_KEYS
+
+DEFAULT_STUDENTS = 20000
+DEFAULT_TOP = 8
+COURSES_PER_STUDENT = 4
+STUDENTS_PER_INSTRUCTOR = 20
+STUDENTS_PER_COURSE = 10
+SEARCHES = ("age>=20 and course:'Course 7'", "email:*@uni.edu and age<19", "Student 12", "id:1001*")
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Bytes used by `obj` and everything it references, each object counted
+    once per `seen` set. Pass the same `seen` to size several objects without
+    counting what they share twice. Classes and modules are not followed.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (type, ModuleType)):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        for slot in getattr(type(current), "__slots__", ()):
+            if hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return total
+
+
+def build_dataset(path, student_count):
+    """
+    Writes a data file with `student_count` students and matching courses
+    and instructors.
+    """
+    course_count = max(1, student_count // STUDENTS_PER_COURSE)
+    instructor_count = max(1, student_count // STUDENTS_PER_INSTRUCTOR)
+
+    def records():
+        for n in range(student_count):
+            yield {"type": "student", "id": str(100000 + n), "name": f"Student {n}", "age": 17 + n % 10,
+                   "email": f"student{n}@{'uni.edu' if n % 3 else 'example.com'}",
+                   "courses": [f"Course {(n * 7 + k) % course_count}" for k in range(COURSES_PER_STUDENT)]}
+        for n in range(instructor_count):
+            yield {"type": "instructor", "id": str(900000 + n), "name": f"Instructor {n}", "age": 30 + n % 30,
+                   "email": f"instructor{n}@uni.edu", "courses": [f"Course {n % course_count}"]}
+        for n in range(course_count):
+            yield {"type": "course", "id": f"C{n}", "name": f"Course {n}",
+                   "instructor": f"Instructor {n % instructor_count}", "students": []}
+
+    write_records(path, records())
+
+
+def _load(path):
+    # As tkinter2 keeps them: Student objects, instructor and course dicts
+    students, instructors, courses = [], [], []
+    for record in iter_records(path):
+        if record["type"] == "student":
+            students.append(record_to_student(record))
+        elif record["type"] == "instructor":
+            instructors.append(Instructor(record["name"], record["age"], record["email"], record["id"],
+                                          list(record["courses"])))
+        else:
+            courses.append({"course_name": record["name"], "id": record["id"],
+                            "instructor_name": record["instructor"], "enrolled_students": []})
+    course_by_name = {course["course_name"]: course for course in courses}
+    for student in students:
+        for course_name in student.registered_courses:
+            course_by_name[course_name]["enrolled_students"].append(student.name)
+    return students, instructors, courses
+
+
+def _row_values(entity, record):
+    if entity == "course":
+        return (record["course_name"], record["id"], record["instructor_name"])
+    return (record.name, record.age, record._email,
+            getattr(record, "student_id", None) or getattr(record, "instructor_id", ""))
+
+
+def _sites():
+    # Live bytes and blocks per allocating source line. Only these totals are
+    # kept: a snapshot held across phases would be counted as allocations itself.
+    snapshot = tracemalloc.take_snapshot()
+    return {(stat.traceback[0].filename, stat.traceback[0].lineno): (stat.size, stat.count)
+            for stat in snapshot.statistics("lineno")
+            if stat.traceback[0].filename != tracemalloc.__file__}
+
+
+def _growth(sites, previous):
+    # (size diff, count diff, file, line) per site, largest growth first
+    growth = []
+    for site, (size, count) in sites.items():
+        old_size, old_count = previous.get(site, (0, 0))
+        if size != old_size:
+            growth.append((size - old_size, count - old_count) + site)
+    for site, (old_size, old_count) in previous.items():
+        if site not in sites:
+            growth.append((-old_size, -old_count) + site)
+    growth.sort(reverse=True)
+    return growth
+
+
+def profile(student_count=DEFAULT_STUDENTS, top=DEFAULT_TOP):
+    """
+    Runs the phases and returns a report dict (see `print_report`).
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "school_data.json")
+        build_dataset(path, student_count)
+
+        tracemalloc.start()
+        phases = []
+        previous = _sites()
+
+        def phase(name):
+            nonlocal previous
+            sites = _sites()
+            growth = _growth(sites, previous)
+            phases.append((name, sum(item[0] for item in growth),
+                           [item for item in growth[:top] if item[0] > 0]))
+            previous = sites
+
+        students, instructors, courses = _load(path)
+        phase("load")
+
+        bus = EventBus()
+        stores = {"student": RecordStore("student", students, bus),
+                  "instructor": RecordStore("instructor", instructors, bus),
+                  "course": RecordStore("course", courses, bus)}
+        derived = DerivedCache(bus, max_entries=4 * (len(students) + len(instructors) + len(courses)))
+        sorters = {"student": TableSorter(STUDENT_SORT_KEYS), "instructor": TableSorter(INSTRUCTOR_SORT_KEYS),
+                   "course": TableSorter(COURSE_SORT_KEYS)}
+        for entity, sorter in sorters.items():
+            sorter.rebuild(stores[entity].records)
+        queries = {entity: QueryIndex(entity, store.records, bus) for entity, store in stores.items()}
+        phase("indexes")
+
+        found = [len(queries["student"].search(text)) for text in SEARCHES]
+        phase("search")
+
+        rows = {entity: [derived.for_record("row", entity, record, lambda rec, e=entity: _row_values(e, rec))
+                         for record in sorters[entity].ordered(stores[entity].records)]
+                for entity in stores}
+        phase("refresh")
+        tracemalloc.stop()
+
+    # Deep sizes. Objects shared between entities are charged to the first one
+    # sized, so the records are sized without their enrollment lists, which
+    # are then sized on their own (names they share stay with the students).
+    enrollment_lists = [student.registered_courses for student in students] + \
+                       [course["enrolled_students"] for course in courses]
+    enrollment_entries = sum(len(entries) for entries in enrollment_lists)
+    seen = {id(entries) for entries in enrollment_lists}
+    student_bytes = deep_sizeof(students, seen) - sys.getsizeof(students)
+    instructor_bytes = deep_sizeof(instructors, seen) - sys.getsizeof(instructors)
+    course_bytes = deep_sizeof(courses, seen) - sys.getsizeof(courses)
+    seen.difference_update(id(entries) for entries in enrollment_lists)
+    enrollment_bytes = deep_sizeof(enrollment_lists, seen) - sys.getsizeof(enrollment_lists)
+    row_count = sum(len(entity_rows) for entity_rows in rows.values())
+    row_lists = list(rows.values())
+    row_bytes = deep_sizeof(row_lists, seen) - sys.getsizeof(row_lists)
+
+    index_bytes = {name: deep_sizeof(obj, set(seen)) for name, obj in
+                   (("sort indexes", sorters), ("query indexes", queries), ("derived cache", derived))}
+
+    return {
+        "students": len(students), "instructors": len(instructors), "courses": len(courses),
+        "enrollment_entries": enrollment_entries, "rows": row_count,
+        "per_entity": [
+            ("Student", student_bytes, len(students)),
+            ("Instructor", instructor_bytes, len(instructors)),
+            ("Course", course_bytes, len(courses)),
+            ("enrollment entry", enrollment_bytes, enrollment_entries),
+            ("table row", row_bytes, row_count),
+        ],
+        "indexes": index_bytes,
+        "phases": phases,
+        "search_matches": found,
+    }
+
+
+def print_report(report):
+    print(f"{report['students']} students, {report['instructors']} instructors, {report['courses']} courses, "
+          f"{report['enrollment_entries']} enrollment entries, {report['rows']} table rows")
+    print(f"{'entity':>18} {'count':>9} {'total KiB':>11} {'bytes each':>11}")
+    for name, size, count in report["per_entity"]:
+        print(f"{name:>18} {count:>9} {size / 1024:>11.1f} {size / count if count else 0:>11.1f}")
+    for name, size in report["indexes"].items():
+        print(f"{name:>18} {'':>9} {size / 1024:>11.1f} {size / report['students']:>11.1f}  (per student)")
+    for name, added, sites in report["phases"]:
+        print(f"\n{name}: +{added / 1024:.1f} KiB allocated and still held")
+        for size, count, file_name, line in sites:
+            print(f"  {size / 1024:>9.1f} KiB {count:>8} blocks  {os.path.basename(file_name)}:{line}")
+
+
+def main(args):
+    print_report(profile(*[int(arg) for arg in args[:2]]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
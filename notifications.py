@@ -0,0 +1,464 @@
+"""
+notifications.py
+================
+
+Registration confirmation emails, sent off the UI thread.
+
+An `Outbox` queues `Mail` tuples (recipient, subject and text) and hands
+them to a small pool of sender threads, which build the MIME messages, so
+queueing costs the UI thread next to nothing. Each sender keeps its own SMTP connection open and sends whatever
+has queued up (up to `batch_size` messages) over it in one go, so a bulk
+registration of hundreds of students costs a couple of connections instead
+of hundreds. A connection left idle for `idle_timeout` seconds is closed.
+
+A message that fails is retried or given up:
+
+- temporary failures (a 4xx reply, a refused, dropped or timed-out
+  connection) are retried on a fresh connection after an exponential
+  backoff, up to `max_attempts` attempts in all
+- permanent failures (a 5xx reply, every recipient refused) and messages
+  that cannot be built or sent at all (e.g. an address with a line break)
+  are given up at once
+
+Given-up messages are kept in `Outbox.failed` with the reason.
+
+`LocalSMTPServer` is a small SMTP stand-in that keeps what it receives and
+can fail on purpose, for trying the outbox without a mail server and for
+the benchmark below.
+
+Usage:
+------
+    python notifications.py [messages [connections [batch]]]
+
+sends `messages` confirmations to a `LocalSMTPServer`, once with a new
+connection per message and once through an `Outbox`, and prints the
+messages per second of both.
+
+Classes:
+--------
+- Mail
+- Outbox
+- LocalSMTPServer
+
+Functions:
+----------
+- registration_message
+"""
+
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+from collections import namedtuple
+from email.mime.text import MIMEText
+
+from registration import ENROLLED, WAITLISTED
+
+DEFAULT_SENDER = "registrar@localhost"
+BATCH_SIZE = 50
+CONNECTIONS = 2
+IDLE_TIMEOUT = 5.0       # seconds before an unused connection is closed
+MAX_ATTEMPTS = 5
+BACKOFF = 0.5            # first retry delay in seconds, doubled for each further one
+MAX_BACKOFF = 30.0
+SMTP_TIMEOUT = 10.0
+
+Mail = namedtuple("Mail", "to subject body")
+Mail.__doc__ = """An email to send: recipient address, subject and plain-text body."""
+
+
+def registration_message(student_name, email, course_name, status, position=None, promoted=False):
+    """
+    The confirmation `Mail` for a registration outcome.
+
+    Parameters:
+    -----------
+    status : str
+        ENROLLED or WAITLISTED (see registration.py).
+    position : int, optional
+        Waitlist position, for WAITLISTED.
+    promoted : bool
+        The student got the seat by moving off the waitlist.
+
+    Raises:
+    -------
+    ValueError
+        For any other status.
+    """
+    if status == ENROLLED:
+        subject = f"Registered for {course_name}"
+        reason = "A seat became free and you" if promoted else "You"
+        text = f"{reason} are now registered for {course_name}."
+    elif status == WAITLISTED:
+        subject = f"Waitlisted for {course_name}"
+        text = (f"{course_name} is full. You are number {position} on its waitlist and will be "
+                f"registered automatically when a seat becomes free.")
+    else:
+        raise ValueError(f"No confirmation for a registration that is {status}")
+    return Mail(email, subject, f"Dear {student_name},\n\n{text}\n\nThe Registrar\n")
+
+
+def _mime(mail, sender):
+    # MIMEText builds and flattens several times faster than EmailMessage;
+    # an ASCII body stays readable as 7bit
+    message = MIMEText(mail.body, "plain", "us-ascii" if mail.body.isascii() else "utf-8")
+    message["From"] = sender
+    message["To"] = mail.to
+    message["Subject"] = mail.subject
+    return message
+
+
+def _is_temporary(error):
+    # Worth another attempt later, as opposed to a permanent refusal
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class Outbox:
+    """
+    Background sender of emails over pooled SMTP connections.
+
+    Parameters:
+    -----------
+    host, port :
+        The SMTP server.
+    sender : str
+        From address of the messages.
+    connections : int
+        Sender threads, each with at most one open connection.
+    batch_size : int
+        Messages a sender takes from the queue at a time.
+    max_attempts : int
+        Attempts per message before a temporary failure is given up.
+    backoff : float
+        Delay before the first retry, doubled for each further one.
+    idle_timeout : float
+        Seconds after which an unused connection is closed.
+    smtp_factory : callable
+        smtp_factory(host, port, timeout=...) -> a connected `smtplib.SMTP`.
+    """
+
+    def __init__(self, host, port=25, sender=DEFAULT_SENDER, connections=CONNECTIONS,
+                 batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF,
+                 idle_timeout=IDLE_TIMEOUT, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.connections = connections
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.smtp_factory = smtp_factory
+        self.failed = []          # (mail, reason) of given-up mails
+
+        self._queue = []
+        self._cond = threading.Condition()
+        self._outstanding = 0     # queued or being sent
+        self._closing = False
+        self._threads = []
+        self._stats = {"sent": 0, "failed": 0, "retries": 0, "connections": 0, "batches": 0}
+
+    def send(self, mail):
+        """
+        Queues a `Mail` and returns at once. Sender threads are started on
+        first use.
+        """
+        with self._cond:
+            if self._closing:
+                raise ValueError("The outbox is closed")
+            self._queue.append(mail)
+            self._outstanding += 1
+            # A sender that died is replaced, so the queue never stalls
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if len(self._threads) < self.connections and len(self._threads) < self._outstanding:
+                thread = threading.Thread(target=self._run, name=f"outbox-{len(self._threads) + 1}",
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued message is sent or given up. Returns False
+        if `timeout` seconds passed first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def close(self, timeout=None):
+        """
+        Sends what is queued (waiting at most `timeout` seconds) and stops the
+        sender threads. Returns the number of messages left unsent.
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            left = self._outstanding
+            self._cond.notify_all()
+        return left
+
+    def pending(self):
+        with self._cond:
+            return self._outstanding
+
+    def stats(self):
+        """
+        Messages sent and given up, retries, connections opened and batches sent.
+        """
+        with self._cond:
+            return dict(self._stats, pending=self._outstanding)
+
+    # --- sender threads ---
+
+    def _take_batch(self):
+        # Up to `batch_size` messages, waiting at most `idle_timeout` for the first;
+        # None once the outbox is closed
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closing, self.idle_timeout)
+            if self._closing:
+                return None
+            batch = self._queue[:self.batch_size]
+            del self._queue[:self.batch_size]
+            return batch
+
+    def _finish(self, key, count=1):
+        with self._cond:
+            self._stats[key] += count
+            self._outstanding -= count
+            if self._outstanding == 0:
+                self._cond.notify_all()
+
+    def _run(self):
+        connection = None
+        while True:
+            batch = self._take_batch()
+            if batch is None or not batch:
+                # Closed, or idle for a while: let the server have its connection back
+                if connection is not None:
+                    self._quit(connection)
+                    connection = None
+                if batch is None:
+                    return
+                continue
+            with self._cond:
+                self._stats["batches"] += 1
+            for mail in batch:
+                try:
+                    connection = self._deliver(connection, mail)
+                except Exception as error:
+                    # Whatever went wrong, the mail is accounted for and the thread goes on
+                    self._give_up(mail, error)
+                    if connection is not None:
+                        connection.close()
+                        connection = None
+
+    def _connect(self):
+        connection = self.smtp_factory(self.host, self.port, timeout=SMTP_TIMEOUT)
+        with self._cond:
+            self._stats["connections"] += 1
+        return connection
+
+    def _quit(self, connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def _reset(self, connection):
+        try:
+            connection.rset()
+            return connection
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+            return None
+
+    def _give_up(self, mail, error):
+        self.failed.append((mail, f"{type(error).__name__}: {error}"))
+        self._finish("failed")
+
+    def _deliver(self, connection, mail):
+        # Sends one mail, retrying temporary failures; returns the
+        # connection to use for the next one (None if it was lost)
+        message = None
+        delay = self.backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if message is None:
+                    message = _mime(mail, self.sender)
+                if connection is None:
+                    connection = self._connect()
+                connection.send_message(message)
+                self._finish("sent")
+                return connection
+            except (smtplib.SMTPException, OSError) as error:
+                if isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # Refused by a server that is still there: the connection stays usable
+                    connection = self._reset(connection)
+                elif connection is not None:
+                    connection.close()
+                    connection = None
+                if not _is_temporary(error) or attempt == self.max_attempts:
+                    self._give_up(mail, error)
+                    return connection
+            except Exception as error:
+                # Not a delivery problem (e.g. a malformed address that cannot be a
+                # header): retrying will not help
+                if connection is not None:
+                    connection = self._reset(connection)
+                self._give_up(mail, error)
+                return connection
+            with self._cond:
+                self._stats["retries"] += 1
+                # A closing outbox still retries, but does not keep its caller waiting long
+                if self._cond.wait_for(lambda: self._closing, delay):
+                    delay = 0
+            delay = min(delay * 2, MAX_BACKOFF)
+        return connection
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    # One SMTP session; just enough of RFC 5321 for smtplib
+
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        sender, recipients = None, []
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            command = line[:4].upper()
+            if command in ("HELO", "EHLO"):
+                self.reply("250 localhost")
+            elif command == "MAIL":
+                sender, recipients = line[10:].strip(" <>"), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = line[8:].strip(" <>")
+                if address in server.reject:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                if not recipients:
+                    self.reply("503 Need RCPT first")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for data in self.rfile:
+                    data = data.decode(errors="replace").rstrip("\r\n")
+                    if data == ".":
+                        break
+                    lines.append(data[1:] if data.startswith("..") else data)
+                with server.lock:
+                    server.data_commands += 1
+                    failing = server.fail_every and server.data_commands % server.fail_every == 0
+                    if not failing:
+                        server.messages.append((sender, recipients, "\n".join(lines)))
+                self.reply("451 Try again later" if failing else "250 Queued")
+                sender, recipients = None, []
+            elif command == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP stand-in on a background thread.
+
+    Parameters:
+    -----------
+    port : int
+        0 picks a free port; see `address`.
+    fail_every : int
+        Every n-th message is answered with a temporary 451 failure (0: never).
+    reject : iterable of str
+        Recipients refused with a permanent 550.
+    latency : float
+        Seconds to wait before each reply, like a server across a network.
+
+    Attributes:
+    -----------
+    messages : list
+        (sender, recipients, text) of every accepted message.
+    connections : int
+        Connections opened so far.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, fail_every=0, reject=(), latency=0.0):
+        super().__init__(("127.0.0.1", port), _SMTPHandler)
+        self.fail_every = fail_every
+        self.reject = set(reject)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.data_commands = 0
+        threading.Thread(target=self.serve_forever, name="smtp-stand-in", daemon=True).start()
+
+    @property
+    def address(self):
+        return self.server_address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(args):
+    count, connections, batch_size = ([int(arg) for arg in args[:3]] + [2000, CONNECTIONS, BATCH_SIZE][len(args[:3]):])
+    mails = [registration_message(f"Student {n}", f"student{n}@uni.edu", f"Course {n % 40}", ENROLLED)
+                for n in range(count)]
+    # A millisecond per reply stands in for the round trips to a real server
+    server = LocalSMTPServer(latency=0.001)
+    host, port = server.address
+    try:
+        started = time.perf_counter()
+        for mail in mails[:max(1, count // 10)]:
+            message = _mime(mail, DEFAULT_SENDER)
+            with smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT) as connection:
+                connection.send_message(message)
+        naive = max(1, count // 10) / (time.perf_counter() - started)
+
+        outbox = Outbox(host, port, connections=connections, batch_size=batch_size)
+        started = time.perf_counter()
+        for mail in mails:
+            outbox.send(mail)
+        queued = time.perf_counter() - started
+        outbox.flush()
+        pooled = count / (time.perf_counter() - started)
+        outbox.close()
+        stats = outbox.stats()
+    finally:
+        server.stop()
+
+    print(f"one connection per message: {naive:>8.0f} messages/s ({max(1, count // 10)} sent)")
+    print(f"outbox ({connections} connections, batches of {batch_size}): {pooled:>8.0f} messages/s, "
+          f"{stats['connections']} connections, {stats['batches']} batches, {stats['failed']} failed")
+    print(f"queueing {count} messages took {queued * 1000:.1f} ms on the calling thread")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
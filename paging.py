@@ -0,0 +1,218 @@
+"""
+paging.py
+=========
+
+Cursor-based (keyset) pagination over students, instructors and courses.
+
+A `PagedCollection` keeps one sorted index per sort key of (key, record ID,
+duplicate number) entries. A page request binary-searches the position right
+after the cursor and walks forward until it has `page_size` matching rows, so
+a caller only touches the rows it actually shows or exports.
+
+Cursors are opaque strings that encode the sort key name, the direction and
+the last (key, ID) returned. They stay valid while records are added or
+removed: the next page simply resumes after the last key that was seen.
+
+Given a `school_store` bus, a collection follows the change events of its
+entity, so the indexes stay current with the live record list.
+
+Classes:
+--------
+- Page
+- PagedCollection
+
+Functions:
+----------
+- students_collection
+- instructors_collection
+- courses_collection
+- iter_all
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+from Part12 import person_fields
+from school_store import DELETED, RELOADED
+from sort_index import STUDENT_SORT_KEYS, INSTRUCTOR_SORT_KEYS, COURSE_SORT_KEYS
+
+Page = namedtuple("Page", "rows next_cursor")
+Page.__doc__ = """One page of records; next_cursor is None on the last page."""
+
+
+def person_id(record):
+    return str(person_fields(record)["id"])
+
+
+def course_id(record):
+    return str(record.get("id", record.get("ID", "")))
+
+
+def _encode_cursor(sort, reverse, entry):
+    payload = json.dumps([sort, reverse, list(entry)]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        sort, reverse, entry = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort, reverse, tuple(entry)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page cursor") from None
+
+
+class PagedCollection:
+    """
+    Records with keyset indexes for paging.
+
+    Parameters:
+    -----------
+    records : iterable
+        Initial records (Student objects or either GUI's dicts).
+    id_of : callable
+        Returns the record ID used to break ties between equal keys.
+    sort_keys : dict
+        Sort key name -> key function. "id" is always available.
+    bus : EventBus, optional
+        Change events of `entity` on this bus keep the indexes current;
+        `records` must then be the live list, which a reload re-reads.
+        Without a bus, call `add` / `remove` / `update` after changes.
+    entity : str, optional
+        "student", "instructor" or "course"; needed with a bus.
+    """
+
+    def __init__(self, records, id_of, sort_keys, bus=None, entity=None):
+        self.id_of = id_of
+        self.sort_keys = dict(sort_keys)
+        self.sort_keys.setdefault("id", lambda rec: id_of(rec))
+        self.records = records
+        self.rebuild()
+        if bus is not None:
+            bus.subscribe(self.on_change, entities=(entity,))
+
+    def __len__(self):
+        return len(self._records)
+
+    def rebuild(self):
+        self._indexes = {name: [] for name in self.sort_keys}
+        self._records = {}        # (record ID, duplicate number) -> record
+        self._entries = {}        # id(record) -> {sort name: entry}
+        for record in self.records:
+            self.add(record)
+
+    def on_change(self, event):
+        if event.kind == RELOADED:
+            self.rebuild()
+        elif event.kind == DELETED:
+            self.remove(event.record)
+        else:
+            # INSERTED or UPDATED; a record edited in place is re-indexed
+            if event.old_record is not None:
+                self.remove(event.old_record)
+            self.update(event.record)
+
+    def add(self, record):
+        record_id = self.id_of(record)
+        duplicate = 0
+        while (record_id, duplicate) in self._records:
+            duplicate += 1
+        self._records[(record_id, duplicate)] = record
+        entries = {}
+        for name, key in self.sort_keys.items():
+            entry = (key(record), record_id, duplicate)
+            insort(self._indexes[name], entry)
+            entries[name] = entry
+        self._entries[id(record)] = entries
+
+    def remove(self, record):
+        entries = self._entries.pop(id(record), None)
+        if entries is None:
+            return
+        for name, entry in entries.items():
+            index = self._indexes[name]
+            del index[bisect_left(index, entry)]
+        _, record_id, duplicate = next(iter(entries.values()))
+        del self._records[(record_id, duplicate)]
+
+    def update(self, record):
+        """
+        Re-indexes a record after it was edited in place (or adds it).
+        """
+        self.remove(record)
+        self.add(record)
+
+    def page(self, sort="id", cursor=None, page_size=50, predicate=None, reverse=False):
+        """
+        Returns the next `Page` of records.
+
+        Parameters:
+        -----------
+        sort : str
+            Sort key name. Ignored when a cursor is given (the cursor's sort wins).
+        cursor : str, optional
+            `next_cursor` of the previous page; None starts from the beginning.
+        page_size : int
+            Maximum rows per page.
+        predicate : callable, optional
+            Only records for which predicate(record) is true are returned.
+        reverse : bool
+            Descending order. Ignored when a cursor is given.
+        """
+        if page_size <= 0:
+            raise ValueError("Page size must be positive")
+        if cursor is not None:
+            sort, reverse, after = _decode_cursor(cursor)
+        if sort not in self._indexes:
+            raise KeyError(f"Unknown sort key: {sort}")
+        index = self._indexes[sort]
+
+        if reverse:
+            position = len(index) - 1 if cursor is None else bisect_left(index, after) - 1
+            step = -1
+        else:
+            position = 0 if cursor is None else bisect_right(index, after)
+            step = 1
+
+        rows = []
+        last = None
+        while 0 <= position < len(index):
+            entry = index[position]
+            position += step
+            record = self._records[entry[1:]]
+            if predicate is not None and not predicate(record):
+                continue
+            rows.append(record)
+            last = entry
+            if len(rows) == page_size:
+                break
+
+        has_more = 0 <= position < len(index)
+        next_cursor = _encode_cursor(sort, reverse, last) if has_more and last is not None else None
+        return Page(rows, next_cursor)
+
+
+def iter_all(collection, page_size=500, **page_options):
+    """
+    Yields every matching record page by page, e.g. for a streaming export.
+    """
+    cursor = None
+    while True:
+        page = collection.page(cursor=cursor, page_size=page_size, **page_options)
+        yield from page.rows
+        if page.next_cursor is None:
+            return
+        cursor = page.next_cursor
+
+
+def students_collection(records, bus=None):
+    return PagedCollection(records, person_id, STUDENT_SORT_KEYS, bus, "student")
+
+
+def instructors_collection(records, bus=None):
+    return PagedCollection(records, person_id, INSTRUCTOR_SORT_KEYS, bus, "instructor")
+
+
+def courses_collection(records, bus=None):
+    return PagedCollection(records, course_id, COURSE_SORT_KEYS, bus, "course")
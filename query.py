@@ -0,0 +1,823 @@
+"""
+query.py
+========
+
+A small query language for students, instructors and courses, compiled to
+predicate functions and run through an index-aware planner.
+
+Syntax:
+-------
+    age>=20 and email:*@uni.edu and course:PHYS102
+    (course:MATH101 or course:PHYS102) and not campus:north
+    john                      (a bare word: name contains it, or ID equals it)
+
+- `field:value` matches case-insensitively; `*` and `?` are wildcards and
+  the whole value must match. For list fields (a student's courses, a
+  course's students) one matching element is enough.
+- `=`, `!=`, `<`, `<=`, `>`, `>=` compare; age compares as a number.
+- `and`, `or`, `not` and parentheses combine terms; terms written next to
+  each other are joined with `and`. Values with spaces go in quotes.
+
+Fields:
+-------
+- students / instructors : id, name, email, age, course, campus
+- courses : id, name, instructor, student, campus
+
+Planning:
+---------
+A `QueryIndex` keeps hash indexes on ID, email, email domain and course (or,
+for courses, ID, instructor and student) plus a sorted age index, all updated
+from the change events of a `school_store` bus. For a query it estimates the
+rows each usable index would return, looks up the most selective one and
+checks the remaining conditions on those rows only; without a usable index it
+scans. `explain` shows the chosen plan, the alternatives and their row
+estimates.
+
+Result cache:
+-------------
+Results of searches that examine at least RESULT_CACHE_MIN_ROWS rows (a
+scan, or an index lookup that finds many) are kept in a `ResultCache`,
+keyed by the normalized query ("AGE>=20  and john" and "john and age >= 20"
+share an entry), the entity and the index's generation, which every change
+of the records advances. A result from an earlier generation is checked
+against the records changed since: if none of them was in it or matches it
+now, it is still the answer and is served, else it is dropped. Editing one
+student therefore only evicts the searches that student shows up in, or now
+would.
+
+Classes:
+--------
+- Query
+- Plan
+- ResultCache
+- QueryIndex
+
+Functions:
+----------
+- compile_query
+- normalize
+"""
+
+import fnmatch
+import re
+import sys
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from itertools import islice
+
+from Part12 import person_fields, course_fields
+from school_store import INSERTED, DELETED, RELOADED
+
+Query = namedtuple("Query", "text entity tree predicate")
+Query.__doc__ = """A compiled query: its syntax tree and predicate(record) -> bool."""
+
+Plan = namedtuple("Plan", "access estimate total filters considered")
+Plan.__doc__ = """How a query runs: the index lookups used (none for a scan), the
+estimated candidate rows out of `total`, the conditions checked on each
+candidate and every access path that was considered with its estimate."""
+
+_Access = namedtuple("_Access", "description estimate lookup")
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<paren>[()])
+  | (?P<op>>=|<=|!=|[<>=:])
+  | "(?P<dquoted>[^"]*)"
+  | '(?P<squoted>[^']*)'
+  | (?P<word>(?:[^\s()<>=!:"]|!(?!=))+)
+)""", re.VERBOSE)
+_KEYWORDS = ("and", "or", "not")
+# Cached search results per index; searches that examine fewer candidate
+# rows are cheaper to run again than to keep current
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE_MIN_ROWS = 64
+
+# Field name -> kind ("text", "number" or "list") per entity
+FIELDS = {
+    "student": {"id": "text", "name": "text", "email": "text", "age": "number",
+                "course": "list", "campus": "text"},
+    "course": {"id": "text", "name": "text", "instructor": "text", "student": "list",
+               "campus": "text"},
+}
+FIELDS["instructor"] = FIELDS["student"]
+_ALIASES = {"courses": "course", "students": "student", "mail": "email"}
+
+
+def _campus(record):
+    if isinstance(record, dict):
+        return record.get("campus") or ""
+    return getattr(record, "campus", "") or ""
+
+
+def _person_values(record):
+    fields = person_fields(record)
+    return {"id": str(fields["id"]), "name": fields["name"], "email": fields["email"],
+            "age": fields["age"], "course": fields["courses"], "campus": _campus(record)}
+
+
+def _course_values(record):
+    fields = course_fields(record)
+    students = [entry if isinstance(entry, str) else person_fields(entry)["name"]
+                for entry in fields["students"]]
+    return {"id": str(fields["id"]), "name": fields["name"], "instructor": fields["instructor"],
+            "student": students, "campus": _campus(record)}
+
+
+_VALUES_OF = {"student": _person_values, "instructor": _person_values, "course": _course_values}
+
+
+def _number(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _has_wildcard(value):
+    return "*" in value or "?" in value
+
+
+# --- parsing ---
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character {text[position]!r} in query")
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("dquoted", "squoted"):
+            tokens.append(("value", match.group(kind)))
+        elif kind == "word" and match.group(kind).lower() in _KEYWORDS:
+            tokens.append(("keyword", match.group(kind).lower()))
+        else:
+            tokens.append((kind if kind != "word" else "value", match.group(kind)))
+    return tokens
+
+
+class _Parser:
+    # Recursive descent: or_expr := and_expr ("or" and_expr)*, and so on
+    def __init__(self, tokens, fields):
+        self.tokens = tokens
+        self.pos = 0
+        self.fields = fields
+
+    def peek(self, offset=0):
+        position = self.pos + offset
+        return self.tokens[position] if position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty query")
+        tree = self.or_expr()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in query")
+        return tree
+
+    def or_expr(self):
+        children = [self.and_expr()]
+        while self.peek() == ("keyword", "or"):
+            self.take()
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def and_expr(self):
+        children = [self.not_expr()]
+        while True:
+            token = self.peek()
+            if token == ("keyword", "and"):
+                self.take()
+            elif token[0] not in ("value", "keyword") and token != ("paren", "("):
+                break
+            elif token == ("keyword", "or"):
+                break
+            children.append(self.not_expr())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def not_expr(self):
+        if self.peek() == ("keyword", "not"):
+            self.take()
+            return ("not", self.not_expr())
+        return self.atom()
+
+    def atom(self):
+        kind, value = self.take()
+        if (kind, value) == ("paren", "("):
+            tree = self.or_expr()
+            if self.take() != ("paren", ")"):
+                raise ValueError("Missing ')' in query")
+            return tree
+        if kind != "value":
+            raise ValueError(f"Unexpected {value!r} in query" if value else "Query ends too early")
+        if self.peek()[0] != "op":
+            return ("text", value)
+
+        field = _ALIASES.get(value.lower(), value.lower())
+        if field not in self.fields:
+            raise ValueError(f"Unknown field {value!r}; use one of {', '.join(self.fields)}")
+        _, op = self.take()
+        operand_kind, operand = self.take()
+        if operand_kind != "value":
+            raise ValueError(f"Missing value after {value}{op}")
+        kind = self.fields[field]
+        if kind == "number" and _number(operand) is None:
+            raise ValueError(f"{field} needs a number, not {operand!r}")
+        if kind == "list" and op not in (":", "=", "!="):
+            raise ValueError(f"{field} can only be matched with ':', '=' or '!='")
+        return ("cond", field, op, operand)
+
+
+# --- compiling ---
+
+def _text_test(op, operand):
+    expected = operand.lower()
+    if op in (":", "=", "!="):
+        if op == ":" and _has_wildcard(expected):
+            pattern = re.compile(fnmatch.translate(expected))
+            matches = lambda value: pattern.match(str(value).lower()) is not None
+        else:
+            matches = lambda value: str(value).lower() == expected
+        return (lambda value: not matches(value)) if op == "!=" else matches
+    compare = {"<": str.__lt__, "<=": str.__le__, ">": str.__gt__, ">=": str.__ge__}[op]
+    return lambda value: compare(str(value).lower(), expected)
+
+
+def _number_test(op, operand):
+    expected = int(operand)
+    compare = {":": int.__eq__, "=": int.__eq__, "!=": int.__ne__, "<": int.__lt__,
+               "<=": int.__le__, ">": int.__gt__, ">=": int.__ge__}[op]
+
+    def test(value):
+        number = _number(value)
+        return number is not None and compare(number, expected)
+    return test
+
+
+def _compile(tree, fields):
+    kind = tree[0]
+    if kind == "and":
+        tests = [_compile(child, fields) for child in tree[1]]
+        return lambda values: all(test(values) for test in tests)
+    if kind == "or":
+        tests = [_compile(child, fields) for child in tree[1]]
+        return lambda values: any(test(values) for test in tests)
+    if kind == "not":
+        test = _compile(tree[1], fields)
+        return lambda values: not test(values)
+    if kind == "text":
+        # The old search box: name contains the word, or the ID equals it
+        word = tree[1]
+        lowered = word.lower()
+        return lambda values: lowered in values["name"].lower() or values["id"] == word
+
+    _, field, op, operand = tree
+    if fields[field] == "number":
+        test = _number_test(op, operand)
+        return lambda values: test(values[field])
+    if fields[field] == "list":
+        test = _text_test(":" if op == "!=" else op, operand)
+        if op == "!=":
+            return lambda values: not any(test(item) for item in values[field])
+        return lambda values: any(test(item) for item in values[field])
+    test = _text_test(op, operand)
+    return lambda values: test(values[field])
+
+
+@lru_cache(maxsize=256)
+def compile_query(text, entity="student"):
+    """
+    Parses a query and compiles it into a predicate.
+
+    Parameters:
+    -----------
+    text : str
+        The query, e.g. "age>=20 and course:PHYS102".
+    entity : str
+        "student", "instructor" or "course"; decides the valid fields.
+
+    Raises:
+    -------
+    ValueError
+        If the query is malformed or uses a field the entity does not have.
+    """
+    if entity not in FIELDS:
+        raise ValueError(f"Unknown entity: {entity}")
+    fields = FIELDS[entity]
+    tree = _Parser(_tokenize(text), fields).parse()
+    test = _compile(tree, fields)
+    values_of = _VALUES_OF[entity]
+    return Query(text, entity, tree, lambda record: test(values_of(record)))
+
+
+def normalize(query):
+    """
+    A hashable key for a compiled `Query` that is the same for queries that
+    only differ in spacing, quoting, keyword or field case, field aliases and
+    the order of `and` / `or` terms. Values compared case-insensitively are
+    lower-cased; a bare word keeps its case, as it may be an ID.
+    """
+    return (query.entity, _normal_tree(query.tree, FIELDS[query.entity]))
+
+
+@lru_cache(maxsize=256)
+def _normalized_text(text, entity):
+    return normalize(compile_query(text, entity))
+
+
+def _normal_tree(tree, fields):
+    kind = tree[0]
+    if kind in ("and", "or"):
+        return (kind, tuple(sorted((_normal_tree(child, fields) for child in tree[1]), key=repr)))
+    if kind == "not":
+        return (kind, _normal_tree(tree[1], fields))
+    if kind == "text":
+        return tree
+    _, field, op, operand = tree
+    if fields[field] == "number":
+        return (kind, field, "=" if op == ":" else op, int(operand))
+    return (kind, field, op, operand.lower())
+
+
+def _describe(tree):
+    kind = tree[0]
+    if kind == "cond":
+        return f"{tree[1]} {tree[2]} {tree[3]!r}"
+    if kind == "text":
+        return f"name contains {tree[1]!r} or id = {tree[1]!r}"
+    if kind == "not":
+        return f"not ({_describe(tree[1])})"
+    joined = f" {kind} ".join(_describe(child) for child in tree[1])
+    return f"({joined})"
+
+
+# --- result cache ---
+
+class _Result:
+    # A cached search result and what is needed to check it against a change
+    __slots__ = ("generation", "records", "identities", "test")
+
+    def __init__(self, generation, records, test):
+        self.generation = generation
+        self.records = records
+        self.identities = {id(record) for record in records}
+        self.test = test
+
+
+class ResultCache:
+    """
+    LRU cache of search results for one `QueryIndex`.
+
+    An entry is served at the generation it was stored at. Later changes are
+    kept in a short log (only while there are entries); when an older entry
+    is asked for, the changes since are replayed against it, and it is
+    served if none of them touched its result, else dropped. Changes thus
+    cost nothing but the log entry, and only results that are asked for
+    again are checked.
+
+    Parameters:
+    -----------
+    max_entries : int
+        Number of cached results kept before the least recently used go.
+    max_changes : int
+        Changes kept for catching up; older entries are dropped.
+
+    Attributes:
+    -----------
+    hits, misses, evictions, invalidations, kept : int
+        Counters, also returned by `stats()`; `kept` counts results served
+        after changes that could not affect them.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, max_changes=1024):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.max_changes = max_changes
+        self._entries = OrderedDict()   # normalized query -> _Result
+        self._changes = []              # (previous, generation, before, after, values), oldest first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.kept = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, generation):
+        """
+        The cached records for `key` at `generation`, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation != generation:
+            if self._catch_up(entry, generation):
+                self.kept += 1
+            else:
+                del self._entries[key]
+                self.invalidations += 1
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.records
+
+    def is_current(self, key, generation):
+        # Like `get` without counting or reordering, for `explain`
+        entry = self._entries.get(key)
+        return entry is not None and (entry.generation == generation or self._catch_up(entry, generation))
+
+    def put(self, key, generation, records, test):
+        """
+        Caches `records`, found at `generation`; `test(values)` tells whether
+        a record (given as its query values) matches the query.
+        """
+        self._entries[key] = _Result(generation, records, test)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_change(self, previous, generation, before, after, values):
+        """
+        Logs the change of one record that moved the index from generation
+        `previous` to `generation`.
+
+        Parameters:
+        -----------
+        before : list
+            Identities the record had before the change (none for an insert).
+        after : object or None
+            The record after the change (None for a delete).
+        values : dict or None
+            Query values of `after`.
+        """
+        self._changes.append((previous, generation, before, after, values))
+        if len(self._changes) > 2 * self.max_changes:
+            del self._changes[:-self.max_changes]
+
+    def _catch_up(self, entry, generation):
+        # Moves the entry to `generation` if the logged changes since its own
+        # cover every step and none of them touches its result
+        changes = self._changes
+        position = bisect_left(changes, entry.generation, key=lambda change: change[0])
+        current = entry.generation
+        identities = entry.identities
+        for previous, after_generation, before, after, values in islice(changes, position, None):
+            if previous != current:
+                return False     # a change that was not logged
+            was_found = any(identity in identities for identity in before)
+            matches = after is not None and entry.test(values)
+            # Still found, and the same object: the result is unchanged
+            if was_found != matches or matches and id(after) not in identities:
+                return False
+            current = after_generation
+        if current != generation:
+            return False
+        entry.generation = generation
+        return True
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._changes.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "evictions": self.evictions,
+                "invalidations": self.invalidations, "kept": self.kept}
+
+
+# --- indexes and planning ---
+
+def _hash_keys(entity):
+    # Index name -> function(values) returning the lower-cased keys of a record
+    if entity == "course":
+        return {"id": lambda values: (values["id"].lower(),),
+                "instructor": lambda values: (str(values["instructor"]).lower(),),
+                "student": lambda values: {str(name).lower() for name in values["student"]}}
+    return {"id": lambda values: (values["id"].lower(),),
+            "email": lambda values: (str(values["email"]).lower(),),
+            "domain": lambda values: (str(values["email"]).lower().rpartition("@")[2],),
+            "course": lambda values: {str(ref).lower() for ref in values["course"]}}
+
+
+class QueryIndex:
+    """
+    Indexes over one record list, kept current from change events, and the
+    planner that uses them.
+
+    Parameters:
+    -----------
+    entity : str
+        "student", "instructor" or "course".
+    records : list
+        The live record list (Student objects or either GUI's dicts).
+    bus : EventBus, optional
+        Change events of `entity` on this bus keep the indexes current.
+        Without a bus, call `add` / `remove` / `rebuild` after changes.
+    cache_size : int
+        Number of search results kept in the `ResultCache`.
+
+    Attributes:
+    -----------
+    generation : int
+        Advanced by every change of the indexed records.
+    results : ResultCache
+        Cached search results; `results.stats()` has the hit rate.
+    """
+
+    def __init__(self, entity, records, bus=None, cache_size=RESULT_CACHE_SIZE):
+        if entity not in FIELDS:
+            raise ValueError(f"Unknown entity: {entity}")
+        self.entity = entity
+        self.records = records
+        self._values_of = _VALUES_OF[entity]
+        self._key_functions = _hash_keys(entity)
+        self._pending_snapshot = None
+        self.generation = 0
+        self.results = ResultCache(cache_size)
+        self.rebuild()
+        if bus is not None:
+            bus.subscribe(self.on_change, entities=(entity,))
+
+    def __len__(self):
+        return len(self._records)
+
+    # --- maintenance ---
+
+    def rebuild(self, records=None):
+        if records is not None:
+            self.records = records
+        self.generation += 1
+        self.results.clear()
+        self._records = {}       # identity -> record
+        self._keys = {}          # identity -> ({index: keys}, age key or None)
+        self._hash = {name: {} for name in self._key_functions}
+        self._ages = []          # sorted (age, identity)
+        for record in self.records:
+            self.add(record)
+
+    def add(self, record):
+        """
+        Indexes a record (again, if it already is); returns its query values.
+        """
+        ident = id(record)
+        if ident in self._records:
+            self.remove(record)
+        self.generation += 1
+        values = self._values_of(record)
+        keys = {name: tuple(function(values)) for name, function in self._key_functions.items()}
+        for name, index_keys in keys.items():
+            for key in index_keys:
+                self._hash[name].setdefault(key, set()).add(ident)
+        age = _number(values["age"]) if "age" in values else None
+        if age is not None:
+            insort(self._ages, (age, ident))
+        self._records[ident] = record
+        self._keys[ident] = (keys, age)
+        return values
+
+    def remove(self, record):
+        # Uses the keys the record was indexed under, so it works after an in-place edit
+        ident = id(record)
+        if ident not in self._records:
+            return
+        self.generation += 1
+        keys, age = self._keys.pop(ident)
+        del self._records[ident]
+        for name, index_keys in keys.items():
+            for key in index_keys:
+                bucket = self._hash[name].get(key)
+                if bucket is not None:
+                    bucket.discard(ident)
+                    if not bucket:
+                        del self._hash[name][key]
+        if age is not None:
+            del self._ages[bisect_left(self._ages, (age, ident))]
+
+    def snapshot(self, records=None):
+        """
+        The indexes with positions in `records` (default: the indexed list)
+        instead of record identities, to `restore` in another session (see
+        session_cache.py).
+        """
+        records = self.records if records is None else records
+        position_of = {id(record): position for position, record in enumerate(records)}
+        return {
+            "hash": {name: {key: [position_of[ident] for ident in bucket] for key, bucket in index.items()}
+                     for name, index in self._hash.items()},
+            "keys": [self._keys[id(record)] for record in records],
+            "ages": [(age, position_of[ident]) for age, ident in self._ages],
+        }
+
+    def restore(self, snapshot, records=None):
+        """
+        Like `rebuild`, from a `snapshot` of the same records in the same
+        order, without reading any record. Raises ValueError if the snapshot
+        does not fit.
+        """
+        if records is not None:
+            self.records = records
+        idents = [id(record) for record in self.records]
+        if len(snapshot["keys"]) != len(idents) or set(snapshot["hash"]) != set(self._key_functions):
+            raise ValueError("Query index snapshot does not match the records")
+        self.generation += 1
+        self.results.clear()
+        self._records = dict(zip(idents, self.records))
+        self._keys = dict(zip(idents, snapshot["keys"]))
+        self._hash = {name: {key: {idents[position] for position in positions}
+                             for key, positions in index.items()}
+                      for name, index in snapshot["hash"].items()}
+        # Ties were ordered by the identities of the previous session
+        self._ages = sorted((age, idents[position]) for age, position in snapshot["ages"])
+
+    def restore_on_reload(self, snapshot):
+        """
+        Makes the next RELOADED event restore `snapshot` instead of rebuilding
+        the indexes, for a reload with the records the snapshot was taken of.
+        """
+        self._pending_snapshot = snapshot
+
+    def on_change(self, event):
+        previous = self.generation
+        if event.kind == RELOADED:
+            snapshot, self._pending_snapshot = self._pending_snapshot, None
+            if snapshot is not None:
+                try:
+                    self.restore(snapshot)
+                    return
+                except ValueError:
+                    pass
+            self.rebuild()
+        elif event.kind == DELETED:
+            self.remove(event.record)
+            if self.results:
+                self.results.record_change(previous, self.generation, [id(event.record)], None, None)
+        else:
+            # INSERTED or UPDATED; `add` re-indexes a record edited in place
+            if event.old_record is not None:
+                self.remove(event.old_record)
+            values = self.add(event.record)
+            if self.results:
+                before = [] if event.kind == INSERTED else [id(event.record)]
+                if event.old_record is not None:
+                    before.append(id(event.old_record))
+                self.results.record_change(previous, self.generation, before, event.record, values)
+
+    # --- planning ---
+
+    def _hash_access(self, name, key, description):
+        bucket = self._hash[name].get(key, ())
+        return _Access(description, len(bucket), lambda: bucket)
+
+    def _age_access(self, op, operand):
+        number = int(operand)
+        low, high = 0, len(self._ages)
+        if op in (":", "=", ">="):
+            low = bisect_left(self._ages, (number,))
+        elif op == ">":
+            low = bisect_left(self._ages, (number + 1,))
+        if op in (":", "=", "<="):
+            high = bisect_left(self._ages, (number + 1,))
+        elif op == "<":
+            high = bisect_left(self._ages, (number,))
+        high = max(low, high)
+        return _Access(f"age index: age {op} {number}", high - low,
+                       lambda: {ident for _, ident in self._ages[low:high]})
+
+    def _access_paths(self, tree):
+        # Index lookups that return a superset of the rows matching `tree`
+        kind = tree[0]
+        if kind == "text":
+            return []
+        if kind == "and":
+            paths = []
+            for child in tree[1]:
+                paths.extend(self._access_paths(child))
+            return paths
+        if kind == "or":
+            parts = []
+            for child in tree[1]:
+                child_paths = self._access_paths(child)
+                if not child_paths:
+                    return []
+                parts.append(min(child_paths, key=lambda path: path.estimate))
+            lookups = [part.lookup for part in parts]
+            return [_Access("union of (" + "; ".join(part.description for part in parts) + ")",
+                            min(len(self._records), sum(part.estimate for part in parts)),
+                            lambda: set().union(*(lookup() for lookup in lookups)))]
+        if kind != "cond":
+            return []
+
+        _, field, op, operand = tree
+        lowered = operand.lower()
+        if field == "age" and op != "!=" and self.entity != "course":
+            return [self._age_access(op, operand)]
+        if op not in (":", "="):
+            return []
+        if field == "email" and op == ":" and re.fullmatch(r"\*@[^*?]+", lowered):
+            domain = lowered[2:]
+            return [self._hash_access("domain", domain, f"domain index: domain = {domain!r}")]
+        if field in self._hash and not (op == ":" and _has_wildcard(lowered)):
+            return [self._hash_access(field, lowered, f"{field} index: {field} = {lowered!r}")]
+        return []
+
+    def plan(self, query):
+        """
+        Chooses how to run a query (text or compiled `Query`) and returns a `Plan`.
+        """
+        if isinstance(query, str):
+            query = compile_query(query, self.entity)
+        total = len(self._records)
+        tree = query.tree
+        paths = self._access_paths(tree)
+        considered = [(path.description, path.estimate) for path in paths]
+        considered.append(("full scan", total))
+
+        best = min(paths, key=lambda path: path.estimate) if paths else None
+        if best is None or best.estimate >= total:
+            return Plan([], total, total, [_describe(tree)], considered)
+        if tree[0] == "and":
+            filters = [_describe(child) for child in tree[1]]
+        else:
+            filters = [_describe(tree)]
+        return Plan([best], best.estimate, total, filters, considered)
+
+    def search(self, query):
+        """
+        Returns the records matching a query (text or compiled `Query`).
+        Rows found through an index come in no particular order; the GUIs
+        apply their own sort order. Repeated searches are answered from the
+        `ResultCache` until a change could alter their result.
+        """
+        if isinstance(query, str):
+            key = _normalized_text(query, self.entity)
+            query = compile_query(query, self.entity)
+        else:
+            key = normalize(query)
+        found = self.results.get(key, self.generation)
+        if found is None:
+            plan = self.plan(query)
+            if plan.access:
+                records = self._records
+                candidates = [records[ident] for ident in plan.access[0].lookup()]
+            else:
+                candidates = self.records
+            found = [record for record in candidates if query.predicate(record)]
+            if plan.estimate >= RESULT_CACHE_MIN_ROWS:
+                self.results.put(key, self.generation, found, _compile(query.tree, FIELDS[self.entity]))
+        return list(found)
+
+    def explain(self, query):
+        """
+        Describes the plan of a query: the chosen access path, the estimated
+        rows, the filters, every alternative that was considered and whether
+        the result is cached.
+        """
+        if isinstance(query, str):
+            query = compile_query(query, self.entity)
+        plan = self.plan(query)
+        chosen = plan.access[0].description if plan.access else "full scan"
+        lines = [f"Query: {query.text}",
+                 f"Plan: {chosen} (~{plan.estimate} of {plan.total} {self.entity} rows)",
+                 "Filter: " + " and ".join(plan.filters),
+                 "Considered:"]
+        width = max(len(description) for description, _ in plan.considered)
+        for description, estimate in sorted(plan.considered, key=lambda item: item[1]):
+            lines.append(f"  {description.ljust(width)}  {estimate} rows")
+        stats = self.results.stats()
+        cached = self.results.is_current(normalize(query), self.generation)
+        lines.append(f"Result cache: {'cached' if cached else 'not cached'}, "
+                     f"{stats['hit_rate']:.0%} hits over {stats['hits'] + stats['misses']} searches")
+        return "\n".join(lines)
+
+
+def _main(path, text, entity="student"):
+    from schema import iter_records, record_to_student
+    if entity == "course":
+        records = [{"id": record["id"], "course_name": record["name"],
+                    "instructor_name": record["instructor"], "enrolled_students": record["students"]}
+                   for record in iter_records(path, ("course",))]
+    else:
+        records = [record_to_student(record) for record in iter_records(path, (entity,))]
+    index = QueryIndex(entity, records)
+    print(index.explain(text))
+    print(f"Rows: {len(index.search(text))}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python query.py DATA_FILE QUERY [student|instructor|course]")
+    else:
+        _main(*sys.argv[1:4])
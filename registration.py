@@ -0,0 +1,278 @@
+"""
+registration.py
+===============
+
+Seat allocation for course registration: capacities, FIFO waitlists and
+automatic promotion when a seat frees up.
+
+A `RegistrationDesk` keeps, per course, the enrolled students, the capacity
+and the waitlist. Every course has its own lock and each check-then-take of a
+seat runs under it, so however many threads register at once a seat is never
+given twice and nobody is enrolled twice, while registrations for different
+courses never wait for each other.
+
+Students and courses are identified by the keys the caller already uses
+(names in tkinter2, IDs in gui_PyQt5). The desk only decides who gets a seat;
+the caller then writes the outcome to its records.
+
+Classes:
+--------
+- Outcome
+- RegistrationDesk
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+ENROLLED = "enrolled"
+WAITLISTED = "waitlisted"
+ALREADY_ENROLLED = "already enrolled"
+ALREADY_WAITLISTED = "already waitlisted"
+DROPPED = "dropped"
+LEFT_WAITLIST = "left waitlist"
+NOT_REGISTERED = "not registered"
+
+Outcome = namedtuple("Outcome", "status course student position promoted")
+Outcome.__doc__ = """Result of a registration or drop: `position` is the 1-based waitlist
+position (WAITLISTED only); `promoted` is the student who got the freed seat, if any."""
+
+
+class _Seats:
+    # State of one course; only touched while holding `lock`
+    __slots__ = ("lock", "capacity", "enrolled", "waitlist", "waiting", "ticket",
+                 "registrations", "promotions", "contended", "wait_time")
+
+    def __init__(self, capacity):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.enrolled = {}         # student -> None, in enrollment order
+        self.waitlist = deque()    # FIFO of (ticket, student); may hold stale tickets
+        self.waiting = {}          # student -> current ticket, for those on the waitlist
+        self.ticket = 0
+        self.registrations = 0
+        self.promotions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+
+    def has_room(self):
+        return self.capacity is None or len(self.enrolled) < self.capacity
+
+    def take(self, student, course):
+        # A seat if one is free and nobody is waiting for it, else a waitlist place
+        if student in self.enrolled:
+            return Outcome(ALREADY_ENROLLED, course, student, None, None)
+        if student in self.waiting:
+            return Outcome(ALREADY_WAITLISTED, course, student, None, None)
+        if self.has_room() and not self.waiting:
+            self.enrolled[student] = None
+            self.registrations += 1
+            return Outcome(ENROLLED, course, student, None, None)
+        self.ticket += 1
+        self.waitlist.append((self.ticket, student))
+        self.waiting[student] = self.ticket
+        return Outcome(WAITLISTED, course, student, len(self.waiting), None)
+
+    def promote(self):
+        # Moves waitlisted students into free seats; returns them in order
+        promoted = []
+        while self.waiting and self.has_room():
+            ticket, student = self.waitlist.popleft()
+            if self.waiting.get(student) != ticket:
+                continue           # left the waitlist after taking this ticket
+            del self.waiting[student]
+            self.enrolled[student] = None
+            self.promotions += 1
+            promoted.append(student)
+        return promoted
+
+
+class RegistrationDesk:
+    """
+    Thread-safe seat allocation for any number of courses.
+
+    Parameters:
+    -----------
+    default_capacity : int, optional
+        Capacity of courses opened without one (default: unlimited).
+    on_promote : callable, optional
+        Called as on_promote(course, student) for every waitlisted student who
+        gets a seat, after the course lock has been released.
+    """
+
+    def __init__(self, default_capacity=None, on_promote=None):
+        self.default_capacity = default_capacity
+        self.on_promote = on_promote
+        self._courses = {}
+        self._guard = threading.Lock()   # only for adding or removing courses
+
+    def _seats(self, course):
+        seats = self._courses.get(course)
+        if seats is None:
+            with self._guard:
+                seats = self._courses.get(course)
+                if seats is None:
+                    seats = self._courses[course] = _Seats(self.default_capacity)
+        return seats
+
+    @contextmanager
+    def _hold(self, seats):
+        # Takes the course lock, counting the times another thread held it
+        if not seats.lock.acquire(blocking=False):
+            started = time.perf_counter()
+            seats.lock.acquire()
+            seats.contended += 1
+            seats.wait_time += time.perf_counter() - started
+        try:
+            yield seats
+        finally:
+            seats.lock.release()
+
+    def _notify(self, course, promoted):
+        if self.on_promote is not None:
+            for student in promoted:
+                self.on_promote(course, student)
+
+    # --- courses ---
+
+    def is_open(self, course):
+        return course in self._courses
+
+    def open(self, course, capacity=None, enrolled=()):
+        """
+        Sets a course's capacity and enrolled students from the records, e.g.
+        the first time it is used. A waitlist the course already has is kept.
+        Students beyond the capacity stay enrolled; nobody is promoted until
+        enough of them drop.
+
+        Returns:
+        --------
+        list
+            Waitlisted students who got a seat.
+        """
+        if capacity is not None and capacity < 0:
+            raise ValueError("Capacity cannot be negative")
+        seats = self._seats(course)
+        with self._hold(seats):
+            seats.capacity = capacity if capacity is not None else self.default_capacity
+            seats.enrolled = dict.fromkeys(enrolled)
+            for student in seats.enrolled:
+                seats.waiting.pop(student, None)
+            promoted = seats.promote()
+        self._notify(course, promoted)
+        return promoted
+
+    def set_capacity(self, course, capacity):
+        """
+        Changes a course's capacity; raising it promotes waitlisted students.
+        Returns the promoted students.
+        """
+        if capacity is not None and capacity < 0:
+            raise ValueError("Capacity cannot be negative")
+        seats = self._seats(course)
+        with self._hold(seats):
+            seats.capacity = capacity
+            promoted = seats.promote()
+        self._notify(course, promoted)
+        return promoted
+
+    def close(self, course):
+        with self._guard:
+            self._courses.pop(course, None)
+
+    def clear(self):
+        with self._guard:
+            self._courses.clear()
+
+    # --- registration ---
+
+    def register(self, student, course):
+        """
+        Gives `student` a seat in `course`, or a place at the end of its
+        waitlist when the course is full. Returns an `Outcome`.
+        """
+        seats = self._seats(course)
+        with self._hold(seats):
+            return seats.take(student, course)
+
+    def register_many(self, students, course):
+        """
+        Registers several students for one course, in the given order, taking
+        the course lock once. Returns one `Outcome` per student.
+        """
+        seats = self._seats(course)
+        with self._hold(seats):
+            return [seats.take(student, course) for student in students]
+
+    def drop(self, student, course):
+        """
+        Removes `student` from a course or its waitlist. A freed seat goes to
+        the first student on the waitlist. Returns an `Outcome`.
+        """
+        seats = self._seats(course)
+        with self._hold(seats):
+            if student in seats.waiting:
+                del seats.waiting[student]
+                if len(seats.waitlist) > 2 * len(seats.waiting) + 16:
+                    seats.waitlist = deque(entry for entry in seats.waitlist
+                                           if seats.waiting.get(entry[1]) == entry[0])
+                return Outcome(LEFT_WAITLIST, course, student, None, None)
+            if student not in seats.enrolled:
+                return Outcome(NOT_REGISTERED, course, student, None, None)
+            del seats.enrolled[student]
+            promoted = seats.promote()
+        self._notify(course, promoted)
+        return Outcome(DROPPED, course, student, None, promoted[0] if promoted else None)
+
+    def withdraw(self, student):
+        """
+        Drops a student (e.g. one being deleted) from every course and waitlist
+        the desk knows. Returns the `Outcome` of each course the student was in.
+        """
+        with self._guard:
+            course_keys = list(self._courses)
+        outcomes = [self.drop(student, course) for course in course_keys]
+        return [outcome for outcome in outcomes if outcome.status != NOT_REGISTERED]
+
+    # --- reading ---
+
+    def enrolled(self, course):
+        seats = self._seats(course)
+        with self._hold(seats):
+            return list(seats.enrolled)
+
+    def waitlist(self, course):
+        seats = self._seats(course)
+        with self._hold(seats):
+            return [student for ticket, student in seats.waitlist
+                    if seats.waiting.get(student) == ticket]
+
+    def seats_left(self, course):
+        """
+        Free seats of a course, or None if it has no capacity limit.
+        """
+        seats = self._seats(course)
+        with self._hold(seats):
+            if seats.capacity is None:
+                return None
+            return max(0, seats.capacity - len(seats.enrolled))
+
+    def stats(self):
+        """
+        Totals over all courses: registrations, promotions, waitlisted
+        students, lock contention (times a thread had to wait) and the
+        seconds spent waiting.
+        """
+        with self._guard:
+            courses = list(self._courses.values())
+        totals = {"courses": len(courses), "registrations": 0, "promotions": 0,
+                  "waitlisted": 0, "contended": 0, "wait_time": 0.0}
+        for seats in courses:
+            with seats.lock:
+                totals["registrations"] += seats.registrations
+                totals["promotions"] += seats.promotions
+                totals["waitlisted"] += len(seats.waiting)
+                totals["contended"] += seats.contended
+                totals["wait_time"] += seats.wait_time
+        return totals
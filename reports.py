@@ -0,0 +1,308 @@
+"""
+reports.py
+==========
+
+Start-of-term reports: one schedule ("transcript") per student and one roster
+per course, as HTML and/or CSV files.
+
+The reports are built from `Student.registered_courses` and
+`Course.enrolled_students` (or the equivalent dict keys of either GUI). The
+records are first reduced to small picklable job tuples, split into chunks
+and rendered by a process pool. Each worker compiles its templates once and
+writes every report to disk as soon as it is rendered; the parent appends
+each finished chunk to `index.csv` and reports progress, so memory use does
+not grow with the number of reports.
+
+Output layout:
+--------------
+    <out_dir>/transcripts/<student id>.html|.csv
+    <out_dir>/rosters/<course id>.html|.csv
+    <out_dir>/index.csv
+
+Functions:
+----------
+- build_jobs
+- render_transcript
+- render_roster
+- generate_reports
+"""
+
+import csv
+import html
+import io
+import os
+import re
+import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from Part12 import person_fields, course_fields
+
+FORMATS = ("html", "csv")
+DEFAULT_CHUNK_SIZE = 250
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+_TEMPLATES = {
+    ("transcript", "page"): """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Schedule - $name</title></head>
+<body>
+<h1>$name</h1>
+<p>Student ID: $id<br>Email: $email</p>
+<table border="1">
+<tr><th>Course ID</th><th>Course</th><th>Instructor</th></tr>
+$rows</table>
+<p>$count course(s)</p>
+</body></html>
+""",
+    ("transcript", "row"): "<tr><td>$id</td><td>$name</td><td>$instructor</td></tr>\n",
+    ("roster", "page"): """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Roster - $name</title></head>
+<body>
+<h1>$name ($id)</h1>
+<p>Instructor: $instructor</p>
+<table border="1">
+<tr><th>Student ID</th><th>Name</th><th>Email</th></tr>
+$rows</table>
+<p>$count student(s)</p>
+</body></html>
+""",
+    ("roster", "row"): "<tr><td>$id</td><td>$name</td><td>$email</td></tr>\n",
+}
+
+
+@lru_cache(maxsize=None)
+def _template(kind, part, template_dir=None):
+    # Compiled once per process; a file <kind>_<part>.html in template_dir overrides the default
+    text = _TEMPLATES[(kind, part)]
+    if template_dir:
+        path = os.path.join(template_dir, f"{kind}_{part}.html")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file_handler:
+                text = file_handler.read()
+    return string.Template(text)
+
+
+def _escaped(values):
+    return {key: html.escape(str(value)) for key, value in values.items()}
+
+
+def _file_stem(value, used):
+    stem = _UNSAFE.sub("_", str(value)).strip("._") or "unnamed"
+    candidate = stem
+    number = 2
+    while candidate in used:
+        candidate = f"{stem}-{number}"
+        number += 1
+    used.add(candidate)
+    return candidate
+
+
+def build_jobs(students, courses):
+    """
+    Reduces the records to picklable jobs.
+
+    Courses are matched by ID or name; rosters combine each course's
+    `enrolled_students` (names, IDs or Student objects) with the students whose
+    course list names the course.
+
+    Returns:
+    --------
+    tuple
+        (transcript jobs, roster jobs). A transcript job is
+        (file stem, student ID, name, email, [(course ID, course name, instructor)]);
+        a roster job is (file stem, course ID, name, instructor, [(student ID, name, email)]).
+    """
+    course_info = [course_fields(course) for course in courses]
+    course_by_ref = {}
+    for info in course_info:
+        course_by_ref.setdefault(info["name"], info)
+        course_by_ref.setdefault(info["id"], info)
+
+    people = [person_fields(student) for student in students]
+    person_by_ref = {}
+    for person in people:
+        person_by_ref.setdefault(person["name"], person)
+        person_by_ref.setdefault(person["id"], person)
+
+    registered = {}      # course ID -> [person]
+    transcripts = []
+    used = set()
+    for person in people:
+        rows = []
+        for ref in person["courses"]:
+            info = course_by_ref.get(ref)
+            if info is None:
+                rows.append((ref, ref, ""))
+                continue
+            rows.append((info["id"], info["name"], info["instructor"]))
+            registered.setdefault(info["id"], []).append(person)
+        transcripts.append((_file_stem(person["id"], used), person["id"], person["name"],
+                            person["email"], rows))
+
+    rosters = []
+    used = set()
+    for info in course_info:
+        seen = set()
+        rows = []
+        listed = [person_fields(entry) if not isinstance(entry, str) else person_by_ref.get(entry)
+                  for entry in info["students"]]
+        for person in listed + registered.get(info["id"], []):
+            if person is None or (person["id"], person["name"]) in seen:
+                continue
+            seen.add((person["id"], person["name"]))
+            rows.append((person["id"], person["name"], person["email"]))
+        rosters.append((_file_stem(info["id"], used), info["id"], info["name"],
+                        info["instructor"], rows))
+    return transcripts, rosters
+
+
+def render_transcript(job, fmt, template_dir=None):
+    _, student_id, name, email, rows = job
+    if fmt == "csv":
+        return _csv_text([("Student ID", student_id), ("Name", name), ("Email", email), (),
+                          ("Course ID", "Course", "Instructor")] + rows)
+    row = _template("transcript", "row", template_dir)
+    body = "".join(row.substitute(_escaped({"id": course_id, "name": course_name,
+                                            "instructor": instructor}))
+                   for course_id, course_name, instructor in rows)
+    return _template("transcript", "page", template_dir).substitute(
+        _escaped({"id": student_id, "name": name, "email": email, "count": len(rows)}), rows=body)
+
+
+def render_roster(job, fmt, template_dir=None):
+    _, course_id, name, instructor, rows = job
+    if fmt == "csv":
+        return _csv_text([("Course ID", course_id), ("Course", name), ("Instructor", instructor), (),
+                          ("Student ID", "Name", "Email")] + rows)
+    row = _template("roster", "row", template_dir)
+    body = "".join(row.substitute(_escaped({"id": student_id, "name": student_name,
+                                            "email": student_email}))
+                   for student_id, student_name, student_email in rows)
+    return _template("roster", "page", template_dir).substitute(
+        _escaped({"id": course_id, "name": name, "instructor": instructor, "count": len(rows)}),
+        rows=body)
+
+
+def _csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _render_chunk(kind, jobs, out_dir, formats, template_dir):
+    # Runs in a worker: renders and writes each report right away
+    render = render_transcript if kind == "transcript" else render_roster
+    folder = os.path.join(out_dir, kind + "s")
+    written = []
+    for job in jobs:
+        for fmt in formats:
+            path = os.path.join(folder, f"{job[0]}.{fmt}")
+            with open(path, "w", encoding="utf-8", newline="") as file_handler:
+                file_handler.write(render(job, fmt, template_dir))
+        written.append((kind, job[1], job[2], job[0]))
+    return written
+
+
+def _chunks(kind, jobs, size):
+    for start in range(0, len(jobs), size):
+        yield kind, jobs[start:start + size]
+
+
+def generate_reports(students, courses, out_dir, formats=FORMATS, workers=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, template_dir=None, progress=None,
+                     mp_context=None):
+    """
+    Writes a transcript for every student and a roster for every course.
+
+    Parameters:
+    -----------
+    students, courses : list
+        Records from either GUI (objects or dicts).
+    out_dir : str
+        Output folder; created if needed.
+    formats : tuple
+        Any of "html" and "csv".
+    workers : int, optional
+        Worker processes (default: one per CPU). With 1, reports are rendered
+        in this process.
+    chunk_size : int
+        Reports per work unit sent to a worker.
+    template_dir : str, optional
+        Folder with replacement HTML templates (transcript_page.html, ...).
+    progress : callable, optional
+        Called as progress(done, total) after each chunk. Returning False
+        cancels the chunks that have not started yet.
+    mp_context : multiprocessing context, optional
+        Start method of the pool, e.g. "fork" when the calling script has no
+        `__main__` guard.
+
+    Returns:
+    --------
+    int
+        Number of reports written.
+    """
+    formats = tuple(formats)
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be positive")
+    workers = workers or os.cpu_count() or 1
+
+    transcripts, rosters = build_jobs(students, courses)
+    for kind in ("transcripts", "rosters"):
+        os.makedirs(os.path.join(out_dir, kind), exist_ok=True)
+    chunks = list(_chunks("transcript", transcripts, chunk_size)) + \
+        list(_chunks("roster", rosters, chunk_size))
+    total = len(transcripts) + len(rosters)
+    done = 0
+
+    with open(os.path.join(out_dir, "index.csv"), "w", newline="", encoding="utf-8") as index_file:
+        index = csv.writer(index_file)
+        index.writerow(["kind", "id", "name", "file"])
+
+        def finished(written):
+            nonlocal done
+            done += len(written)
+            index.writerows(written)
+            index_file.flush()
+            return progress is None or progress(done, total) is not False
+
+        if workers == 1:
+            for kind, jobs in chunks:
+                if not finished(_render_chunk(kind, jobs, out_dir, formats, template_dir)):
+                    break
+            return done
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            futures = [pool.submit(_render_chunk, kind, jobs, out_dir, formats, template_dir)
+                       for kind, jobs in chunks]
+            for future in as_completed(futures):
+                if not finished(future.result()):
+                    for pending in futures:
+                        pending.cancel()
+                    break
+    return done
+
+
+def _benchmark(count=50000, courses=2000, workers=None):
+    import tempfile
+    student_rows = [{"n_entry": f"Student {n}", "Age": 18 + n % 10, "email": f"s{n}@example.com",
+                     "id": str(100000 + n),
+                     "registered_courses": [f"C{(n * 7 + k) % courses}" for k in range(4)]}
+                    for n in range(count)]
+    course_rows = [{"course_name": f"Course {n}", "id": f"C{n}", "instructor_name": f"Instructor {n % 300}",
+                    "enrolled_students": []} for n in range(courses)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        started = time.perf_counter()
+        written = generate_reports(student_rows, course_rows, out_dir, workers=workers)
+        elapsed = time.perf_counter() - started
+    print(f"{written} reports ({count} transcripts, {courses} rosters) in {elapsed:.1f}s "
+          f"with {workers or os.cpu_count()} worker(s)")
+
+
+if __name__ == "__main__":
+    _benchmark(*[int(arg) for arg in sys.argv[1:]])
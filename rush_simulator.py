@@ -0,0 +1,319 @@
+"""
+rush_simulator.py
+=================
+
+Replays an opening-day registration rush: thousands of simulated students
+search for courses, register and sometimes drop, from many threads at once.
+
+The school is built headless with the same pieces as tkinter2: `Student`
+objects and course dicts in `RecordStore`s on one `EventBus`, a
+`RegistrationDesk` for seats and `QueryIndex`es for search. A registration
+follows `register_student_for_course`: the desk decides under the course lock,
+then the outcome is written to the student and course records. The stores and
+the indexes they feed are not thread-safe, so record writes and searches share
+one lock, as they share the UI thread in the GUIs.
+
+Course popularity is skewed (a few courses get most requests), so the hot
+courses fill up and build waitlists early, as they do in practice. After the
+rush, an add/drop phase has some students give up one of their courses,
+which promotes students from the waitlists.
+
+Reported:
+---------
+- throughput : operations per second, overall and per kind
+- latency    : p50 / p95 / p99 / max per operation kind, in milliseconds
+- contention : how often a thread had to wait for a course lock or the
+               records lock, and for how long in total
+- invariants : no course over capacity, nobody enrolled twice or both
+               enrolled and waitlisted, desk and records agree, and seats
+               given = registrations + promotions - drops
+
+Usage:
+------
+    python rush_simulator.py [students [threads [courses]]]
+"""
+
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from Part12 import Student
+from query import QueryIndex
+from registration import RegistrationDesk, ENROLLED, DROPPED
+from school_store import EventBus, RecordStore
+
+DEFAULT_STUDENTS = 5000
+DEFAULT_THREADS = 16
+DEFAULT_COURSES = 200
+WISHLIST = 5           # courses each student tries to get
+DROP_RATE = 0.1        # chance a student drops one of its courses afterwards
+
+Session = namedtuple("Session", "student_index wishlist drop_pick")
+Session.__doc__ = """One simulated student's visit: the courses it wants and, if it drops
+one of those it got afterwards, a number in [0, 1) that picks which."""
+
+
+class _CountingLock:
+    # A lock that counts how often, and how long, threads waited for it
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contended = 0
+        self.wait_time = 0.0
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            started = time.perf_counter()
+            self._lock.acquire()
+            self.contended += 1
+            self.wait_time += time.perf_counter() - started
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class RushSchool:
+    """
+    A headless school with the registration, drop and search operations of
+    tkinter2, safe to call from many threads.
+    """
+
+    def __init__(self, student_count, course_count, seed=1):
+        rng = random.Random(seed)
+        self.students = [Student(f"Student {n}", 17 + n % 10, f"student{n}@uni.edu", str(100000 + n))
+                         for n in range(student_count)]
+        # Enough seats overall for most wishes, but not in the popular courses
+        seats = max(10, student_count * WISHLIST // course_count // 2)
+        self.courses = [{"course_name": f"Course {n}", "id": f"C{n}", "instructor_name": "",
+                         "enrolled_students": [], "capacity": rng.randint(seats // 2, seats * 2)}
+                        for n in range(course_count)]
+        self.course_by_name = {course["course_name"]: course for course in self.courses}
+        self.student_by_name = {student.name: student for student in self.students}
+
+        self.bus = EventBus()
+        self.student_store = RecordStore("student", self.students, self.bus)
+        self.course_store = RecordStore("course", self.courses, self.bus)
+        self.student_query = QueryIndex("student", self.students, self.bus)
+        self.course_query = QueryIndex("course", self.courses, self.bus)
+        self.records_lock = _CountingLock()
+
+        self.desk = RegistrationDesk()
+        for course in self.courses:
+            self.desk.open(course["course_name"], course["capacity"])
+        self.counts = {"enrolled": 0, "waitlisted": 0, "dropped": 0, "promoted": 0}
+        self._counts_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._counts_lock:
+            self.counts[key] += 1
+
+    def _set_enrollment(self, student_name, course_name, enrolled):
+        # The record half of tkinter2.set_enrollment, under the records lock
+        student = self.student_by_name[student_name]
+        course = self.course_by_name[course_name]
+        with self.records_lock, self.bus.transaction():
+            registered = list(student.registered_courses)
+            if enrolled and course_name not in registered:
+                student.register_course(course_name)
+            elif not enrolled and course_name in registered:
+                student.registered_courses.remove(course_name)
+            if student.registered_courses != registered:
+                self.student_store.touch(student, "registered_courses", registered)
+
+            members = list(course["enrolled_students"])
+            if enrolled and student_name not in members:
+                course["enrolled_students"].append(student_name)
+            elif not enrolled and student_name in members:
+                course["enrolled_students"].remove(student_name)
+            if course["enrolled_students"] != members:
+                self.course_store.touch(course, "enrolled_students", members)
+
+    def register(self, student_name, course_name):
+        outcome = self.desk.register(student_name, course_name)
+        if outcome.status == ENROLLED:
+            self._set_enrollment(student_name, course_name, True)
+            self._count("enrolled")
+        elif outcome.position is not None:
+            self._count("waitlisted")
+        return outcome
+
+    def drop(self, student_name, course_name):
+        outcome = self.desk.drop(student_name, course_name)
+        if outcome.status == DROPPED:
+            self._set_enrollment(student_name, course_name, False)
+            self._count("dropped")
+            if outcome.promoted is not None:
+                self._set_enrollment(outcome.promoted, course_name, True)
+                self._count("promoted")
+        return outcome
+
+    def search(self, text, entity="course"):
+        index = self.course_query if entity == "course" else self.student_query
+        with self.records_lock:
+            return index.search(text)
+
+    def check_invariants(self):
+        """
+        Returns a list of violated invariants (empty if all hold).
+        """
+        problems = []
+        for course in self.courses:
+            name = course["course_name"]
+            members = course["enrolled_students"]
+            desk_members = self.desk.enrolled(name)
+            waiting = self.desk.waitlist(name)
+            if len(members) > course["capacity"]:
+                problems.append(f"{name}: {len(members)} enrolled, capacity {course['capacity']}")
+            if len(set(members)) != len(members):
+                problems.append(f"{name}: duplicate enrollment")
+            if set(members) != set(desk_members):
+                problems.append(f"{name}: records and desk disagree")
+            if set(members) & set(waiting) or len(set(waiting)) != len(waiting):
+                problems.append(f"{name}: student both enrolled and waitlisted, or waitlisted twice")
+        for student in self.students:
+            courses = student.registered_courses
+            if len(set(courses)) != len(courses):
+                problems.append(f"{student.name}: registered twice for a course")
+            for course_name in courses:
+                if student.name not in self.course_by_name[course_name]["enrolled_students"]:
+                    problems.append(f"{student.name}: {course_name} lists the student's course but not the student")
+        seats = sum(len(course["enrolled_students"]) for course in self.courses)
+        expected = self.counts["enrolled"] + self.counts["promoted"] - self.counts["dropped"]
+        if seats != expected:
+            problems.append(f"{seats} seats taken, expected {expected} from the operation counts")
+        return problems
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_sessions(school, seed=1):
+    """
+    One session per student with a popularity-skewed wishlist.
+    """
+    rng = random.Random(seed)
+    names = [course["course_name"] for course in school.courses]
+    weights = [1.0 / (rank + 1) for rank in range(len(names))]   # Zipf-like
+    sessions = []
+    for index in range(len(school.students)):
+        wishlist = []
+        while len(wishlist) < min(WISHLIST, len(names)):
+            pick = rng.choices(names, weights)[0]
+            if pick not in wishlist:
+                wishlist.append(pick)
+        drop_pick = rng.random() if rng.random() < DROP_RATE else None
+        sessions.append(Session(index, wishlist, drop_pick))
+    rng.shuffle(sessions)
+    return sessions
+
+
+def run_rush(student_count=DEFAULT_STUDENTS, thread_count=DEFAULT_THREADS,
+             course_count=DEFAULT_COURSES, seed=1):
+    """
+    Runs the rush and returns a report dict (see `print_report`).
+    """
+    school = RushSchool(student_count, course_count, seed)
+    sessions = make_sessions(school, seed)
+    latencies = {"search": [], "register": [], "drop": []}
+    latency_lock = threading.Lock()
+    drops = []   # (student name, course name) for the add/drop phase
+
+    def timed(kind, local, operation, *args):
+        started = time.perf_counter()
+        result = operation(*args)
+        local[kind].append(time.perf_counter() - started)
+        return result
+
+    def rush(session, local):
+        name = school.students[session.student_index].name
+        timed("search", local, school.search, f"id:{school.course_by_name[session.wishlist[0]]['id']}")
+        got = [course for course in session.wishlist
+               if timed("register", local, school.register, name, course).status == ENROLLED]
+        if session.drop_pick is not None and got:
+            drops.append((name, got[int(session.drop_pick * len(got))]))
+
+    def add_drop(task, local):
+        timed("drop", local, school.drop, *task)
+
+    def run_phase(tasks, handle):
+        # Every thread takes the next task until none are left
+        next_task = iter(tasks)
+        queue_lock = threading.Lock()
+        start_gate = threading.Barrier(thread_count)
+
+        def worker():
+            local = {kind: [] for kind in latencies}
+            start_gate.wait()
+            while True:
+                with queue_lock:
+                    task = next(next_task, None)
+                if task is None:
+                    break
+                handle(task, local)
+            with latency_lock:
+                for kind, values in local.items():
+                    latencies[kind].extend(values)
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Registration opens, then the add/drop period frees seats for the waitlists
+    started = time.perf_counter()
+    run_phase(sessions, rush)
+    run_phase(list(drops), add_drop)
+    elapsed = time.perf_counter() - started
+
+    desk_stats = school.desk.stats()
+    return {
+        "students": student_count, "threads": thread_count, "courses": course_count,
+        "elapsed": elapsed,
+        "operations": {kind: len(values) for kind, values in latencies.items()},
+        "latency": {kind: sorted(values) for kind, values in latencies.items()},
+        "counts": dict(school.counts),
+        "course_lock": (desk_stats["contended"], desk_stats["wait_time"]),
+        "records_lock": (school.records_lock.contended, school.records_lock.wait_time),
+        "waitlisted_now": desk_stats["waitlisted"],
+        "problems": school.check_invariants(),
+    }
+
+
+def print_report(report):
+    total = sum(report["operations"].values())
+    print(f"{report['students']} students, {report['threads']} threads, {report['courses']} courses: "
+          f"{total} operations in {report['elapsed']:.2f}s = {total / report['elapsed']:.0f} ops/s")
+    print(f"{'operation':>10} {'count':>8} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for kind, ordered in report["latency"].items():
+        print(f"{kind:>10} {len(ordered):>8} {len(ordered) / report['elapsed']:>9.0f} "
+              + " ".join(f"{_percentile(ordered, fraction) * 1000:>8.3f}" for fraction in (0.5, 0.95, 0.99))
+              + f" {(ordered[-1] if ordered else 0) * 1000:>8.3f}")
+    counts = report["counts"]
+    print(f"enrolled {counts['enrolled']}, promoted from waitlists {counts['promoted']}, "
+          f"dropped {counts['dropped']}, still waitlisted {report['waitlisted_now']}")
+    for label, (contended, wait_time) in (("course locks", report["course_lock"]),
+                                          ("records lock", report["records_lock"])):
+        print(f"{label}: waited {contended} times, {wait_time:.3f}s in total")
+    if report["problems"]:
+        print(f"invariants: FAIL ({len(report['problems'])})")
+        for problem in report["problems"][:20]:
+            print(f"  {problem}")
+    else:
+        print("invariants: PASS")
+
+
+def main(args):
+    report = run_rush(*[int(arg) for arg in args[:3]])
+    print_report(report)
+    return 1 if report["problems"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,665 @@
+"""
+scheduling.py
+=============
+
+Meeting times, rooms and conflict-free timetables for courses.
+
+A `Meeting` is one weekly class session (day, start, end). Times are minutes
+since midnight and days are 0 (Monday) to 6 (Sunday), so every meeting maps to
+a half-open interval on a single weekly axis.
+
+Conflicts are found with an `IntervalTree` per resource (instructor, student,
+room). `ScheduleBook` keeps live bookings and releases them again when a
+course is dropped, reassigned or moved to another room; the GUIs check a
+registration against the student's other courses with `time_clashes`.
+`generate_timetable` assigns a timeslot and a room to every section of
+a term with a DSatur-style constraint solver: the section with the fewest
+remaining options is placed first, and every placement immediately blocks the
+overlapping slots of the sections that share an instructor or a student.
+
+Classes:
+--------
+- Meeting
+- IntervalTree
+- ConflictIndex
+- ScheduleBook
+- Section
+- Timetable
+
+Functions:
+----------
+- parse_meeting
+- parse_meetings
+- meetings_of
+- default_timeslots
+- find_conflicts
+- time_clashes
+- booking_clashes
+- generate_timetable
+"""
+
+import heapq
+import random
+import time
+from collections import namedtuple, defaultdict
+
+from Part12 import course_fields
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MINUTES_PER_DAY = 24 * 60
+
+
+class Meeting(namedtuple("Meeting", "day start end")):
+    """
+    One weekly session: `day` 0-6, `start`/`end` in minutes since midnight.
+    """
+    __slots__ = ()
+
+    def interval(self):
+        offset = self.day * MINUTES_PER_DAY
+        return offset + self.start, offset + self.end
+
+    def __str__(self):
+        return (f"{DAYS[self.day]} {self.start // 60:02d}:{self.start % 60:02d}-"
+                f"{self.end // 60:02d}:{self.end % 60:02d}")
+
+
+def parse_meeting(text):
+    """
+    Parses "Mon 09:00-10:15" into a `Meeting`. Raises ValueError on bad input.
+    """
+    try:
+        day_text, span = text.split()
+        start_text, end_text = span.split("-")
+        day = DAYS.index(day_text[:3].title())
+        start_h, start_m = (int(part) for part in start_text.split(":"))
+        end_h, end_m = (int(part) for part in end_text.split(":"))
+    except ValueError:
+        raise ValueError(f"Invalid meeting format: {text!r}") from None
+    meeting = Meeting(day, start_h * 60 + start_m, end_h * 60 + end_m)
+    if meeting.end <= meeting.start:
+        raise ValueError("Meeting must end after it starts")
+    return meeting
+
+
+def parse_meetings(text):
+    """
+    Parses a form entry such as "Mon 09:00-10:15, Wed 09:00-10:15" into a list
+    of `Meeting`; an empty entry gives an empty list. Raises ValueError on bad
+    input or when two of the meetings overlap.
+    """
+    meetings = [parse_meeting(part) for part in text.replace(";", ",").split(",") if part.strip()]
+    tree = IntervalTree()
+    for meeting in meetings:
+        if tree.overlaps(*meeting.interval()):
+            raise ValueError(f"Meeting {meeting} overlaps another meeting of the course")
+        tree.add(*meeting.interval())
+    return meetings
+
+
+def meetings_of(course):
+    """
+    The `Meeting`s of a `Course` object or of either GUI's course dict, which
+    keep them as "Mon 09:00-10:15" strings (see schema.course_record).
+    """
+    return [meeting if isinstance(meeting, Meeting) else parse_meeting(meeting)
+            for meeting in course_fields(course)["meetings"]]
+
+
+# --- INTERVAL TREE ---
+
+class _Node:
+    __slots__ = ("start", "end", "seq", "payload", "priority", "max_end", "left", "right")
+
+    def __init__(self, start, end, seq, payload):
+        self.start = start
+        self.end = end
+        self.seq = seq
+        self.payload = payload
+        self.priority = random.random()
+        self.max_end = end
+        self.left = None
+        self.right = None
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _split(node, key):
+    # Returns (nodes with (start, seq) < key, nodes with (start, seq) >= key)
+    if node is None:
+        return None, None
+    if (node.start, node.seq) < key:
+        node.right, right = _split(node.right, key)
+        _update(node)
+        return node, right
+    left, node.left = _split(node.left, key)
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class IntervalTree:
+    """
+    Dynamic interval tree (a treap ordered by start, augmented with the largest
+    end in each subtree). Intervals are half-open: [start, end).
+
+    `add` and `remove` are O(log n) expected; `overlapping` is O(log n + k).
+    """
+
+    def __init__(self):
+        self._root = None
+        self._seq = 0
+        self._handles = {}
+
+    def __len__(self):
+        return len(self._handles)
+
+    def add(self, start, end, payload=None):
+        """
+        Inserts an interval and returns a handle usable with `remove`.
+        """
+        self._seq += 1
+        node = _Node(start, end, self._seq, payload)
+        left, right = _split(self._root, (start, self._seq))
+        self._root = _merge(_merge(left, node), right)
+        self._handles[self._seq] = node
+        return self._seq
+
+    def remove(self, handle):
+        node = self._handles.pop(handle)
+        left, rest = _split(self._root, (node.start, node.seq))
+        _, right = _split(rest, (node.start, node.seq + 1))
+        self._root = _merge(left, right)
+
+    def overlapping(self, start, end):
+        """
+        Returns the payloads of all stored intervals overlapping [start, end).
+        """
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            stack.append(node.left)
+            if node.start < end:
+                if start < node.end:
+                    found.append(node.payload)
+                stack.append(node.right)
+        return found
+
+    def overlaps(self, start, end):
+        return bool(self.overlapping(start, end))
+
+
+# --- CONFLICT DETECTION ---
+
+class ConflictIndex:
+    """
+    One `IntervalTree` per resource (an instructor ID, a student ID or a room).
+    """
+
+    def __init__(self):
+        self.trees = defaultdict(IntervalTree)
+
+    def add(self, resource, meetings, payload):
+        tree = self.trees[resource]
+        return [tree.add(*meeting.interval(), payload) for meeting in meetings]
+
+    def remove(self, resource, handles):
+        tree = self.trees[resource]
+        for handle in handles:
+            tree.remove(handle)
+
+    def conflicts(self, resource, meetings):
+        """
+        Returns the payloads already booked on `resource` that clash with `meetings`.
+        """
+        if resource not in self.trees:
+            return []
+        tree = self.trees[resource]
+        clashes = []
+        for meeting in meetings:
+            for payload in tree.overlapping(*meeting.interval()):
+                if payload not in clashes:
+                    clashes.append(payload)
+        return clashes
+
+
+def find_conflicts(courses):
+    """
+    Reports every double booking among `Course` objects that carry meetings.
+
+    Parameters:
+    -----------
+    courses : list
+        `Course` objects. `instructor` may be an `Instructor` or an ID/name
+        string; `enrolled_students` may hold `Student` objects or IDs/names.
+
+    Returns:
+    --------
+    list
+        (kind, resource, course_id, other_course_id) tuples where kind is
+        "instructor", "student" or "room".
+    """
+    index = ConflictIndex()
+    found = []
+    for course in courses:
+        if not course.meetings:
+            continue
+        resources = []
+        if course.instructor is not None:
+            resources.append(("instructor", _resource_id(course.instructor)))
+        if course.room:
+            resources.append(("room", course.room))
+        for student in course.enrolled_students:
+            resources.append(("student", _resource_id(student)))
+        for resource in resources:
+            for other in index.conflicts(resource, course.meetings):
+                found.append((resource[0], resource[1], course.course_id, other))
+            index.add(resource, course.meetings, course.course_id)
+    return found
+
+
+def time_clashes(course, others):
+    """
+    IDs of the courses in `others` that meet at the same time as `course`, e.g.
+    the courses a student already takes before registering for `course`.
+    `course` itself is ignored if `others` lists it.
+
+    Parameters:
+    -----------
+    course : Course or dict
+        The course to check; one without meetings clashes with nothing.
+    others : iterable
+        `Course` objects or either GUI's course dicts.
+    """
+    meetings = meetings_of(course)
+    if not meetings:
+        return []
+    course_id = str(course_fields(course)["id"])
+    index = ConflictIndex()
+    for other in others:
+        other_id = str(course_fields(other)["id"])
+        if other_id != course_id:
+            index.add("timetable", meetings_of(other), other_id)
+    return index.conflicts("timetable", meetings)
+
+
+def booking_clashes(course, others):
+    """
+    Double bookings `course` would make: (kind, course ID) pairs of the courses
+    in `others` that have the same instructor ("instructor") or the same room
+    ("room") at an overlapping time.
+    """
+    fields = course_fields(course)
+    found = []
+    for kind in ("instructor", "room"):
+        resource = fields[kind]
+        if resource:
+            sharing = [other for other in others if course_fields(other)[kind] == resource]
+            found.extend((kind, course_id) for course_id in time_clashes(course, sharing))
+    return found
+
+
+def _resource_id(person):
+    for attribute in ("student_id", "instructor_id"):
+        if hasattr(person, attribute):
+            return getattr(person, attribute)
+    return person
+
+
+class ScheduleBook:
+    """
+    Conflict-checked bookings for live edits: assigning an instructor or
+    registering a student raises ValueError instead of double booking.
+
+    Every booking can be released again (`release`, `unassign_instructor`,
+    `drop_student`, `release_course`), and assigning another instructor or
+    room to a course releases the one it had, so no booking outlives the
+    edit that made it.
+    """
+
+    def __init__(self):
+        self.index = ConflictIndex()
+        self._handles = {}    # (kind, resource_id, course_id) -> interval handles
+
+    def _book(self, kind, resource_id, course):
+        key = (kind, resource_id)
+        booking = key + (course.course_id,)
+        if booking in self._handles:
+            return    # booking the same course twice is a no-op
+        clashes = self.index.conflicts(key, course.meetings)
+        if clashes:
+            raise ValueError(f"{kind.title()} {resource_id} already booked at that time "
+                             f"({', '.join(map(str, clashes))})")
+        self._handles[booking] = self.index.add(key, course.meetings, course.course_id)
+
+    def is_booked(self, kind, resource_id, course_id):
+        return (kind, resource_id, course_id) in self._handles
+
+    def release(self, kind, resource_id, course_id):
+        """
+        Frees the slots `resource_id` had booked for a course. Returns False
+        if there was no such booking.
+        """
+        handles = self._handles.pop((kind, resource_id, course_id), None)
+        if handles is None:
+            return False
+        self.index.remove((kind, resource_id), handles)
+        return True
+
+    def release_course(self, course_id):
+        """
+        Frees every booking of a course, e.g. when it is deleted.
+        """
+        for booking in [booking for booking in self._handles if booking[2] == course_id]:
+            self.release(*booking)
+
+    def assign_instructor(self, instructor, course):
+        self._book("instructor", _resource_id(instructor), course)
+        previous = course.instructor
+        if previous is not None and _resource_id(previous) != _resource_id(instructor):
+            self.unassign_instructor(course)
+        if hasattr(instructor, "assign_course") and course not in instructor.assigned_courses:
+            instructor.assign_course(course)
+        course.instructor = instructor
+
+    def unassign_instructor(self, course):
+        instructor = course.instructor
+        if instructor is None:
+            return
+        self.release("instructor", _resource_id(instructor), course.course_id)
+        if course in getattr(instructor, "assigned_courses", ()):
+            instructor.assigned_courses.remove(course)
+        course.instructor = None
+
+    def register_student(self, student, course):
+        if student not in course.enrolled_students and course.is_full():
+            raise ValueError(f"Course {course.course_id} is full ({course.capacity} seats)")
+        self._book("student", _resource_id(student), course)
+        if hasattr(student, "register_course") and course not in student.registered_courses:
+            student.register_course(course)
+        course.add_student(student)
+
+    def drop_student(self, student, course):
+        self.release("student", _resource_id(student), course.course_id)
+        if student in course.enrolled_students:
+            course.enrolled_students.remove(student)
+        if course in getattr(student, "registered_courses", ()):
+            student.registered_courses.remove(course)
+
+    def book_room(self, room, course):
+        self._book("room", room, course)
+        if course.room is not None and course.room != room:
+            self.release("room", course.room, course.course_id)
+        course.room = room
+
+
+# --- TIMETABLE GENERATION ---
+
+Section = namedtuple("Section", "section_id instructor size students")
+Section.__doc__ = """A course section to place: instructor ID, expected size and enrolled student IDs."""
+
+
+class Timetable:
+    """
+    Result of `generate_timetable`.
+
+    Attributes:
+    -----------
+    placements : dict
+        section_id -> (timeslot index, room).
+    unscheduled : list
+        Section IDs no timeslot/room combination could satisfy.
+    timeslots : list
+        The timeslots used; each is a tuple of `Meeting`.
+    seconds : float
+        Solver wall time.
+    """
+
+    def __init__(self, timeslots):
+        self.timeslots = timeslots
+        self.placements = {}
+        self.unscheduled = []
+        self.seconds = 0.0
+
+    def meetings_of(self, section_id):
+        slot, _ = self.placements[section_id]
+        return self.timeslots[slot]
+
+    def apply(self, courses):
+        """
+        Copies meetings and rooms onto `Course` objects whose course_id is a section ID.
+        """
+        for course in courses:
+            if course.course_id in self.placements:
+                slot, room = self.placements[course.course_id]
+                course.meetings = list(self.timeslots[slot])
+                course.room = room
+
+
+def default_timeslots():
+    """
+    A standard week: Mon/Wed/Fri 50-minute slots from 08:00 and Tue/Thu 75-minute
+    slots from 08:00, both until 17:00.
+    """
+    slots = []
+    for start in range(8 * 60, 17 * 60, 60):
+        slots.append(tuple(Meeting(day, start, start + 50) for day in (0, 2, 4)))
+    for start in range(8 * 60, 16 * 60, 90):
+        slots.append(tuple(Meeting(day, start, start + 75) for day in (1, 3)))
+    return slots
+
+
+def _slot_overlaps(timeslots):
+    # For every slot, the set of slots (itself included) sharing any minute with it
+    tree = IntervalTree()
+    for slot, meetings in enumerate(timeslots):
+        for meeting in meetings:
+            tree.add(*meeting.interval(), slot)
+    overlaps = []
+    for meetings in timeslots:
+        clashing = set()
+        for meeting in meetings:
+            clashing.update(tree.overlapping(*meeting.interval()))
+        overlaps.append(frozenset(clashing))
+    return overlaps
+
+
+def generate_timetable(sections, rooms, timeslots=None):
+    """
+    Assigns a timeslot and a room to each section without double booking an
+    instructor, a student or a room.
+
+    Parameters:
+    -----------
+    sections : list
+        `Section` tuples.
+    rooms : dict
+        room name -> capacity.
+    timeslots : list, optional
+        Candidate timeslots (tuples of `Meeting`); `default_timeslots()` if omitted.
+
+    Returns:
+    --------
+    Timetable
+    """
+    started = time.perf_counter()
+    timeslots = timeslots if timeslots is not None else default_timeslots()
+    overlaps = _slot_overlaps(timeslots)
+    slot_count = len(timeslots)
+    result = Timetable(timeslots)
+
+    # Conflict graph: sections sharing an instructor or a student
+    by_section = {section.section_id: section for section in sections}
+    sharing = defaultdict(list)
+    for section in sections:
+        if section.instructor is not None:
+            sharing[("instructor", section.instructor)].append(section.section_id)
+        for student in section.students:
+            sharing[("student", student)].append(section.section_id)
+    neighbours = {section_id: set() for section_id in by_section}
+    for members in sharing.values():
+        if len(members) > 1:
+            for section_id in members:
+                neighbours[section_id].update(members)
+    for section_id, linked in neighbours.items():
+        linked.discard(section_id)
+
+    # blocked[s][slot] counts placed neighbours that make `slot` unusable for s
+    blocked = {section_id: [0] * slot_count for section_id in by_section}
+    saturation = dict.fromkeys(by_section, 0)
+    rooms_by_size = sorted(rooms.items(), key=lambda item: (item[1], item[0]))
+    room_busy = {room: set() for room in rooms}
+    slot_load = [0] * slot_count
+
+    heap = [(0, -len(neighbours[sid]), sid) for sid in by_section]
+    heapq.heapify(heap)
+    done = set()
+
+    while heap:
+        neg_saturation, _, section_id = heapq.heappop(heap)
+        if section_id in done or -neg_saturation != saturation[section_id]:
+            continue
+        done.add(section_id)
+        section = by_section[section_id]
+        section_blocked = blocked[section_id]
+
+        choice = None
+        for slot in sorted(range(slot_count), key=slot_load.__getitem__):
+            if section_blocked[slot]:
+                continue
+            clashing = overlaps[slot]
+            for room, capacity in rooms_by_size:
+                if capacity >= section.size and room_busy[room].isdisjoint(clashing):
+                    choice = (slot, room)
+                    break
+            if choice is not None:
+                break
+
+        if choice is None:
+            result.unscheduled.append(section_id)
+            continue
+
+        slot, room = choice
+        result.placements[section_id] = choice
+        room_busy[room].add(slot)
+        slot_load[slot] += 1
+        for other in neighbours[section_id]:
+            if other in done:
+                continue
+            other_blocked = blocked[other]
+            for clash in overlaps[slot]:
+                if other_blocked[clash] == 0:
+                    saturation[other] += 1
+                other_blocked[clash] += 1
+            heapq.heappush(heap, (-saturation[other], -len(neighbours[other]), other))
+
+    if result.unscheduled:
+        _repair(result, by_section, neighbours, overlaps, rooms_by_size, room_busy)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _free_room(size, clashing, rooms_by_size, room_busy):
+    for room, capacity in rooms_by_size:
+        if capacity >= size and room_busy[room].isdisjoint(clashing):
+            return room
+    return None
+
+
+def _repair(result, by_section, neighbours, overlaps, rooms_by_size, room_busy):
+    # One step of local search for each leftover section: if a single placed
+    # neighbour is all that blocks a slot, try moving that neighbour elsewhere.
+    placements = result.placements
+    slot_count = len(overlaps)
+    still_unscheduled = []
+    for section_id in result.unscheduled:
+        section = by_section[section_id]
+        placed = False
+        for slot in range(slot_count):
+            clashing = overlaps[slot]
+            blockers = [other for other in neighbours[section_id]
+                        if other in placements and placements[other][0] in clashing]
+            if len(blockers) > 1:
+                continue
+            if not blockers:
+                room = _free_room(section.size, clashing, rooms_by_size, room_busy)
+                if room is not None:
+                    placements[section_id] = (slot, room)
+                    room_busy[room].add(slot)
+                    placed = True
+                    break
+                continue
+            blocker = blockers[0]
+            old_slot, old_room = placements[blocker]
+            room_busy[old_room].discard(old_slot)
+            for new_slot in range(slot_count):
+                if new_slot in clashing or any(
+                        other in placements and other != blocker
+                        and placements[other][0] in overlaps[new_slot]
+                        for other in neighbours[blocker]):
+                    continue
+                new_room = _free_room(by_section[blocker].size, overlaps[new_slot],
+                                      rooms_by_size, room_busy)
+                if new_room is None:
+                    continue
+                room_busy[new_room].add(new_slot)
+                room = _free_room(section.size, clashing, rooms_by_size, room_busy)
+                if room is None:
+                    room_busy[new_room].discard(new_slot)
+                    continue
+                placements[blocker] = (new_slot, new_room)
+                placements[section_id] = (slot, room)
+                room_busy[room].add(slot)
+                placed = True
+                break
+            if placed:
+                break
+            room_busy[old_room].add(old_slot)
+        if not placed:
+            still_unscheduled.append(section_id)
+    result.unscheduled = still_unscheduled
+
+
+def _benchmark(section_count=2000, student_count=12000, seed=1):
+    # Synthetic term: students take 5 sections from their program (blocks of
+    # 10 sections), instructors teach 3 sections each
+    rng = random.Random(seed)
+    roster = defaultdict(list)
+    programs = max(1, section_count // 10)
+    for student in range(student_count):
+        first = rng.randrange(programs) * 10
+        program = range(first, min(first + 10, section_count))
+        for section in rng.sample(program, min(5, len(program))):
+            roster[section].append(f"S{student}")
+    sections = [Section(f"SEC{n}", f"I{n // 3}", len(roster[n]), roster[n])
+                for n in range(section_count)]
+    rooms = {f"R{n}": rng.choice((40, 60, 80, 120)) for n in range(section_count // 12)}
+    timetable = generate_timetable(sections, rooms)
+    print(f"{section_count} sections: {len(timetable.placements)} placed, "
+          f"{len(timetable.unscheduled)} unscheduled in {timetable.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    _benchmark()
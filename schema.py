@@ -0,0 +1,343 @@
+"""
+schema.py
+=========
+
+Versioned layout of the data files and a streaming migrator for the legacy
+ones.
+
+Version 2 (current) is JSON Lines: a header line, then one record per line.
+
+    {"format": "school-data", "version": 2}
+    {"type": "student", "id": "12345", "name": "John Doe", "age": 25, "email": "...", "courses": [...]}
+    {"type": "instructor", "id": "98765", "name": "Jane Smith", "age": 40, "email": "...", "courses": []}
+    {"type": "course", "id": "MATH101", "name": "Mathematics 101", "instructor": "...", "students": [...]}
+
+Every record of a type has exactly these keys, so loaders read them directly.
+Records may also carry a "campus" key (see shards.py), and courses a
+"capacity" (see registration.py), "meetings" (a list of "Mon 09:00-10:15"
+strings) and a "room" (see scheduling.py); these are omitted when not set.
+
+Version 1 is every file written before the header existed:
+
+- tkinter2: a JSON array of students keyed "n_entry" (or "name") / "Age" /
+  "email" / "id" / "registered_courses",
+- gui_PyQt5: an object {"students": [...], "instructors": [...], "courses": [...]}
+  with records keyed "ID" / "Name" / "Email" / "Courses".
+
+Legacy files are parsed incrementally (one record at a time from a small
+buffer) and upgraded record by record, so migrating never holds the whole
+file in memory.
+
+Functions:
+----------
+- detect_version
+- iter_records
+- write_records
+- migrate_file
+- student_record / instructor_record / course_record
+- record_to_student / record_to_pyqt / record_to_tkinter
+"""
+
+import json
+import os
+
+from Part12 import Student, person_fields, course_fields
+
+FORMAT = "school-data"
+SCHEMA_VERSION = 2
+RECORD_KEYS = {
+    "student": ("id", "name", "age", "email", "courses"),
+    "instructor": ("id", "name", "age", "email", "courses"),
+    "course": ("id", "name", "instructor", "students"),
+}
+_CHUNK = 64 * 1024
+_HEADER_LIMIT = 4096
+
+
+# --- canonical records ---
+
+def _with_campus(canonical, record):
+    campus = record.get("campus") if isinstance(record, dict) else getattr(record, "campus", "")
+    if campus:
+        canonical["campus"] = campus
+    return canonical
+
+
+def _person_record(kind, record):
+    fields = person_fields(record)
+    return _with_campus({"type": kind, "id": str(fields["id"]), "name": fields["name"],
+                         "age": fields["age"], "email": fields["email"],
+                         "courses": list(fields["courses"])}, record)
+
+
+def student_record(record):
+    """
+    Canonical version-2 record of a student (Student object or either GUI's dict).
+    """
+    return _person_record("student", record)
+
+
+def instructor_record(record):
+    return _person_record("instructor", record)
+
+
+def course_record(record):
+    fields = course_fields(record)
+    students = [entry if isinstance(entry, str) else person_fields(entry)["name"]
+                for entry in fields["students"]]
+    canonical = {"type": "course", "id": str(fields["id"]), "name": fields["name"],
+                 "instructor": fields["instructor"], "students": students}
+    if fields["capacity"] is not None:
+        canonical["capacity"] = fields["capacity"]
+    if fields["meetings"]:
+        canonical["meetings"] = [str(meeting) for meeting in fields["meetings"]]
+    if fields["room"]:
+        canonical["room"] = fields["room"]
+    return _with_campus(canonical, record)
+
+
+def record_to_student(record):
+    return Student(record["name"], record["age"], record["email"], record["id"],
+                   list(record["courses"]), record.get("campus", ""))
+
+
+def record_to_tkinter(record):
+    """
+    The dict layout tkinter2 keeps for an instructor or course record
+    ("n_entry"/"Age"/... or "course_name"/"instructor_name"/...).
+    """
+    if record["type"] == "course":
+        converted = {"course_name": record["name"], "id": record["id"],
+                     "instructor_name": record["instructor"],
+                     "enrolled_students": list(record["students"]),
+                     "capacity": record.get("capacity"),
+                     "meetings": list(record.get("meetings", [])),
+                     "room": record.get("room")}
+    else:
+        converted = {"n_entry": record["name"], "Age": record["age"], "email": record["email"],
+                     "id": record["id"], "assigned_courses": list(record["courses"])}
+    return _with_campus(converted, record)
+
+
+def record_to_pyqt(record):
+    """
+    The dict layout gui_PyQt5 keeps in memory ("ID"/"Name"/"Email"/"Courses").
+    """
+    if record["type"] == "course":
+        converted = {"ID": record["id"], "Name": record["name"]}
+        if record.get("capacity") is not None:
+            converted["Capacity"] = record["capacity"]
+        if record.get("meetings"):
+            converted["Meetings"] = list(record["meetings"])
+        if record.get("room"):
+            converted["Room"] = record["room"]
+    else:
+        converted = {"ID": record["id"], "Name": record["name"], "Email": record["email"],
+                     "Courses": list(record["courses"])}
+    return _with_campus(converted, record)
+
+
+_LEGACY_CONVERTERS = {"students": student_record, "instructors": instructor_record,
+                      "courses": course_record}
+
+
+def _check(record, line_number):
+    keys = RECORD_KEYS.get(record.get("type"))
+    if keys is None:
+        raise ValueError(f"Line {line_number}: unknown record type {record.get('type')!r}")
+    missing = [key for key in keys if key not in record]
+    if missing:
+        raise ValueError(f"Line {line_number}: {record['type']} record misses {', '.join(missing)}")
+    return record
+
+
+# --- incremental JSON reading for version-1 files ---
+
+class _StreamReader:
+    # Decodes JSON values one at a time from a file, keeping only a small buffer
+    def __init__(self, file_handler):
+        self.file = file_handler
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.file.read(_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or "" at the end of the file
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in data file, found {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise ValueError("Data file is not valid JSON") from None
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def _legacy_records(file_handler):
+    reader = _StreamReader(file_handler)
+    start = reader.peek()
+    if start == "[":
+        for item in reader.array_items():
+            yield student_record(item)
+    elif start == "{":
+        reader.expect("{")
+        while reader.peek() != "}":
+            key = reader.value()
+            reader.expect(":")
+            convert = _LEGACY_CONVERTERS.get(key)
+            if convert is not None and reader.peek() == "[":
+                for item in reader.array_items():
+                    yield convert(item)
+            else:
+                reader.value()
+            if reader.peek() == ",":
+                reader.pos += 1
+        reader.expect("}")
+    elif start:
+        raise ValueError("Unrecognized data file layout")
+
+
+# --- files ---
+
+def _read_header(file_handler):
+    # Legacy files may be one huge line, so only a short prefix is read
+    first = file_handler.readline(_HEADER_LIMIT)
+    try:
+        header = json.loads(first)
+    except ValueError:
+        return None
+    if isinstance(header, dict) and header.get("format") == FORMAT:
+        return header
+    return None
+
+
+def detect_version(path):
+    """
+    Returns the schema version of a data file (1 for files without a header).
+    """
+    with open(path, "r", encoding="utf-8") as file_handler:
+        header = _read_header(file_handler)
+    return 1 if header is None else header["version"]
+
+
+def iter_records(path, types=None):
+    """
+    Yields the canonical records of a data file of any version, one at a time.
+
+    Parameters:
+    -----------
+    path : str
+        The data file.
+    types : iterable, optional
+        Only records of these types ("student", "instructor", "course").
+    """
+    wanted = set(types) if types else None
+    with open(path, "r", encoding="utf-8") as file_handler:
+        header = _read_header(file_handler)
+        if header is None:
+            file_handler.seek(0)
+            records = _legacy_records(file_handler)
+        elif header["version"] > SCHEMA_VERSION:
+            raise ValueError(f"{path} uses schema version {header['version']}, "
+                             f"newer than the supported {SCHEMA_VERSION}")
+        else:
+            # Lines as write_records writes them start with their type, so
+            # records of other types are skipped without being parsed
+            skipped = tuple(f'{{"type": "{kind}"' for kind in RECORD_KEYS
+                            if wanted is not None and kind not in wanted)
+            records = (_check(json.loads(line), number)
+                       for number, line in enumerate(file_handler, start=2)
+                       if line.strip() and not (skipped and line.startswith(skipped)))
+        for record in records:
+            if wanted is None or record["type"] in wanted:
+                yield record
+
+
+def write_records(path, records):
+    """
+    Writes canonical records as a version-2 file. The file is replaced only
+    after it has been written completely.
+
+    Returns:
+    --------
+    int
+        Number of records written.
+    """
+    temp_path = path + ".tmp"
+    count = 0
+    with open(temp_path, "w", encoding="utf-8") as file_handler:
+        file_handler.write(json.dumps({"format": FORMAT, "version": SCHEMA_VERSION}) + "\n")
+        for record in records:
+            file_handler.write(json.dumps(_check(record, count + 2)) + "\n")
+            count += 1
+    os.replace(temp_path, path)
+    return count
+
+
+def migrate_file(path, backup=True):
+    """
+    Upgrades a data file to the current version in one streaming pass.
+
+    Parameters:
+    -----------
+    path : str
+        The data file; rewritten in place.
+    backup : bool
+        Keep the original as `<path>.v<old version>.bak`.
+
+    Returns:
+    --------
+    int or None
+        Number of records migrated, or None if the file was already current.
+    """
+    version = detect_version(path)
+    if version == SCHEMA_VERSION:
+        return None
+    temp_path = path + ".migrating"
+    count = write_records(temp_path, iter_records(path))
+    if backup:
+        os.replace(path, f"{path}.v{version}.bak")
+    os.replace(temp_path, path)
+    return count
@@ -0,0 +1,266 @@
+"""
+school_store.py
+===============
+
+Data layer that announces its changes.
+
+Every mutation of a student, instructor or course list goes through a
+`RecordStore`, which publishes a typed `ChangeEvent` (inserted / updated /
+deleted / reloaded, entity, record ID, changed fields) on an `EventBus`.
+Persistence, table views, sort indexes and caches subscribe to the events and
+each does only the work that one change needs, instead of every mutator
+saving the whole file and redrawing every table.
+
+Inside `bus.transaction()` events are collected and delivered together when
+the outermost transaction ends, so a subscriber registered with `batch=True`
+(e.g. the JSON writer) runs once per transaction. `update_many` and
+`delete_many` change any number of selected records as one transaction.
+
+Classes:
+--------
+- ChangeEvent
+- EventBus
+- RecordStore
+
+Functions:
+----------
+- get_field
+- set_field
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from Part12 import record_id
+
+INSERTED = "inserted"
+UPDATED = "updated"
+DELETED = "deleted"
+RELOADED = "reloaded"
+
+ChangeEvent = namedtuple("ChangeEvent", "kind entity record_id changes record old_record generation")
+ChangeEvent.__doc__ = """
+One change in the store.
+
+kind : "inserted", "updated", "deleted" or "reloaded"
+entity : "student", "instructor" or "course"
+record_id : ID of the record (None for "reloaded")
+changes : dict of field -> (old value, new value); empty for inserts/deletes
+record : the record after the change (the removed record for deletes)
+old_record : the record before the change if it was replaced by a new object
+generation : value of the bus generation counter after this change
+"""
+
+_Subscriber = namedtuple("_Subscriber", "callback entities kinds batch")
+
+
+def get_field(record, field):
+    if isinstance(record, dict):
+        return record.get(field)
+    return getattr(record, field, None)
+
+
+def set_field(record, field, value):
+    if isinstance(record, dict):
+        record[field] = value
+    else:
+        setattr(record, field, value)
+
+
+def _fields(record):
+    if isinstance(record, dict):
+        return dict(record)
+    return dict(vars(record))
+
+
+class EventBus:
+    """
+    Delivers `ChangeEvent`s to subscribers.
+
+    Attributes:
+    -----------
+    generation : int
+        Incremented on every published event; caches can key on it.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._pending = None
+        self._depth = 0
+        self.generation = 0
+
+    def subscribe(self, callback, entities=None, kinds=None, batch=False):
+        """
+        Registers a subscriber and returns a handle for `unsubscribe`.
+
+        Parameters:
+        -----------
+        callback : callable
+            Called with one event, or with a list of events if `batch` is True.
+        entities, kinds : iterable, optional
+            Only events for these entities / kinds are delivered.
+        batch : bool
+            Deliver all matching events of a transaction in one call.
+        """
+        subscriber = _Subscriber(callback, frozenset(entities) if entities else None,
+                                 frozenset(kinds) if kinds else None, batch)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, handle):
+        if handle in self._subscribers:
+            self._subscribers.remove(handle)
+
+    def publish(self, kind, entity, record_id=None, changes=None, record=None, old_record=None):
+        self.generation += 1
+        event = ChangeEvent(kind, entity, record_id, changes or {}, record, old_record, self.generation)
+        if self._pending is not None:
+            self._pending.append(event)
+        else:
+            self._dispatch([event])
+        return event
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups the events published inside the block into one delivery.
+        Transactions can be nested; delivery happens when the outermost one ends.
+        """
+        if self._depth == 0:
+            self._pending = []
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                events, self._pending = self._pending, None
+                if events:
+                    self._dispatch(events)
+
+    def _dispatch(self, events):
+        # A failing subscriber (e.g. a view whose widgets are not built) must not
+        # keep the others, such as the audit log, from seeing the change; the
+        # first error is raised again once every subscriber has run.
+        error = None
+        for subscriber in list(self._subscribers):
+            matching = [event for event in events
+                        if (subscriber.entities is None or event.entity in subscriber.entities)
+                        and (subscriber.kinds is None or event.kind in subscriber.kinds)]
+            if not matching:
+                continue
+            for delivery in ([matching] if subscriber.batch else matching):
+                try:
+                    subscriber.callback(delivery)
+                except Exception as exc:
+                    if error is None:
+                        error = exc
+        if error is not None:
+            raise error
+
+
+class RecordStore:
+    """
+    A list of records of one entity whose mutations publish change events.
+
+    `records` is the live list, so existing code that reads `my_data_list` or
+    `students` keeps working; only writes have to go through the store.
+    """
+
+    def __init__(self, entity, records, bus, id_of=record_id):
+        self.entity = entity
+        self.records = records
+        self.bus = bus
+        self.id_of = id_of
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def find(self, record_id):
+        for record in self.records:
+            if self.id_of(record) == record_id:
+                return record
+        return None
+
+    def insert(self, record):
+        self.records.append(record)
+        self.bus.publish(INSERTED, self.entity, self.id_of(record), record=record)
+        return record
+
+    def update(self, record, **changes):
+        """
+        Changes fields of a record in place; only fields whose value differs are reported.
+        """
+        diff = {}
+        for field, value in changes.items():
+            old = get_field(record, field)
+            if old != value:
+                diff[field] = (old, value)
+                set_field(record, field, value)
+        if diff:
+            self.bus.publish(UPDATED, self.entity, self.id_of(record), diff, record)
+        return diff
+
+    def touch(self, record, field, old_value):
+        """
+        Reports a change already made to a mutable field (e.g. a list appended to).
+        """
+        new_value = get_field(record, field)
+        self.bus.publish(UPDATED, self.entity, self.id_of(record),
+                         {field: (old_value, new_value)}, record)
+
+    def replace(self, old_record, new_record):
+        """
+        Puts `new_record` where `old_record` was (the tkinter2 "_UPDATE_" style).
+        """
+        position = next(i for i, record in enumerate(self.records) if record is old_record)
+        self.records[position] = new_record
+        before = _fields(old_record)
+        after = _fields(new_record)
+        diff = {field: (before.get(field), after.get(field))
+                for field in set(before) | set(after) if before.get(field) != after.get(field)}
+        self.bus.publish(UPDATED, self.entity, self.id_of(new_record), diff, new_record, old_record)
+        return new_record
+
+    def update_many(self, records, **changes):
+        """
+        Applies the same field changes to several records as one transaction.
+        Returns the records that actually changed.
+        """
+        with self.bus.transaction():
+            return [record for record in records if self.update(record, **changes)]
+
+    def delete_many(self, records):
+        """
+        Deletes several records in one pass over the list, as one transaction.
+        Returns the deleted records in list order.
+        """
+        doomed = {id(record) for record in records}
+        kept, deleted = [], []
+        for record in self.records:
+            (deleted if id(record) in doomed else kept).append(record)
+        if deleted:
+            self.records[:] = kept
+            with self.bus.transaction():
+                for record in deleted:
+                    self.bus.publish(DELETED, self.entity, self.id_of(record), record=record)
+        return deleted
+
+    def delete(self, record):
+        for position, existing in enumerate(self.records):
+            if existing is record:
+                del self.records[position]
+                self.bus.publish(DELETED, self.entity, self.id_of(record), record=record)
+                return True
+        return False
+
+    def load(self, records):
+        """
+        Replaces the whole content (e.g. after reading a file). The list object is
+        kept, so references to `records` stay valid.
+        """
+        self.records[:] = records
+        self.bus.publish(RELOADED, self.entity)
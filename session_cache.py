@@ -0,0 +1,241 @@
+"""
+session_cache.py
+================
+
+Warm start: what one session built from the data file is kept in a cache
+file, so reopening the same, unchanged data file skips reading and
+re-indexing it.
+
+A cache file holds two pickles, one after the other:
+
+- header : the data file's size, modification time and SHA-1, the sort
+  column and the first page of table rows in that order. It is small and is
+  read at startup, so the table shows at once.
+- body   : the records themselves and snapshots of their sort and query
+  indexes (positions in the record list instead of object identities).
+
+`open_session` reads only the header and checks it against the data file: a
+file with the same size and modification time is trusted; otherwise it is
+hashed and accepted if its content did not change (e.g. it was copied).
+`WarmSession.start_hydration` then reads the body on a background thread
+while the first page is already on screen.
+
+The cache is a local pickle written by the application itself. Anything
+wrong with it (missing, outdated, unreadable) simply counts as a miss.
+
+Classes:
+--------
+- WarmSession
+
+Functions:
+----------
+- file_stamp
+- file_hash
+- save_session
+- open_session
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+import threading
+from itertools import islice
+
+CACHE_VERSION = 1
+FIRST_PAGE = 50     # rows kept for the first screen
+
+_READ_ERRORS = (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+                IndexError, KeyError, TypeError, ValueError)
+
+
+def file_stamp(path):
+    """
+    (size, modification time in ns) of a file, or None if it does not exist.
+    """
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (info.st_size, info.st_mtime_ns)
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file_handler:
+        for chunk in iter(lambda: file_handler.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_session(cache_path, data_path, entity, records, sorter=None, query=None,
+                 row_values=None, stamp=None, page_size=FIRST_PAGE):
+    """
+    Writes the warm-start cache of `records`, which must be what the data file
+    holds.
+
+    Parameters:
+    -----------
+    cache_path : str
+        The cache file; replaced atomically.
+    data_path : str
+        The data file the records were read from or last written to.
+    entity : str
+        "student", "instructor" or "course"; checked again when opening.
+    records : list
+        The records, pickled as they are.
+    sorter : TableSorter, optional
+        Its sort state and index snapshot are kept.
+    query : QueryIndex, optional
+        Its index snapshot is kept.
+    row_values : callable, optional
+        row_values(record) -> tuple of table cells; the first `page_size` rows
+        in sort order are kept for the first screen.
+    stamp : tuple, optional
+        `file_stamp` of the data file when the records were read or written.
+        If the file changed since, nothing is written, as the records no
+        longer match it.
+
+    Returns:
+    --------
+    bool
+        True if the cache was written.
+    """
+    current = file_stamp(data_path)
+    if current is None or (stamp is not None and stamp != current):
+        return False
+    records = list(records)
+    first_page = []
+    if row_values is not None:
+        ordered = sorter.ordered(records) if sorter is not None else records
+        first_page = [tuple(row_values(record)) for record in islice(ordered, page_size)]
+    header = {
+        "version": CACHE_VERSION, "entity": entity, "stamp": current, "hash": file_hash(data_path),
+        "count": len(records), "first_page": first_page,
+        "sort": (sorter.column, sorter.reverse) if sorter is not None else (None, False),
+    }
+    body = {
+        "records": records,
+        "sort": sorter.snapshot(records) if sorter is not None else None,
+        "query": query.snapshot(records) if query is not None else None,
+    }
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as file_handler:
+        pickle.dump(header, file_handler, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(body, file_handler, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
+    return True
+
+
+def open_session(cache_path, data_path, entity):
+    """
+    Opens the cache if it was written for the current content of the data
+    file. Returns a `WarmSession`, or None for a miss.
+    """
+    stamp = file_stamp(data_path)
+    if stamp is None:
+        return None
+    try:
+        with open(cache_path, "rb") as file_handler:
+            header = pickle.load(file_handler)
+            offset = file_handler.tell()
+        if header["version"] != CACHE_VERSION or header["entity"] != entity:
+            return None
+        cached_stamp = tuple(header["stamp"])
+        if cached_stamp != stamp and (cached_stamp[0] != stamp[0] or header["hash"] != file_hash(data_path)):
+            return None
+    except _READ_ERRORS:
+        return None
+    return WarmSession(cache_path, header, offset, stamp)
+
+
+class WarmSession:
+    """
+    A valid cache opened by `open_session`.
+
+    Attributes:
+    -----------
+    count : int
+        Number of cached records.
+    first_page : list
+        Table rows (tuples of cells) of the first screen, in sort order.
+    sort_column, reverse :
+        The sort state of the table when the cache was written.
+    stamp : tuple
+        `file_stamp` of the data file the cache was checked against.
+    """
+
+    def __init__(self, cache_path, header, offset, stamp):
+        self.cache_path = cache_path
+        self.count = header["count"]
+        self.first_page = header["first_page"]
+        self.sort_column, self.reverse = header["sort"]
+        self.stamp = stamp
+        self._offset = offset
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def hydrate(self, pause_gc=False):
+        """
+        Reads the body. Returns (records, sort snapshot, query snapshot); the
+        snapshots are None if they were not saved.
+
+        Parameters:
+        -----------
+        pause_gc : bool
+            Disables the garbage collector while unpickling, which would
+            otherwise walk the growing heap again and again (none of the new
+            objects can be garbage yet). The switch is process-wide, so only
+            a synchronous load on the caller's thread should use it;
+            `start_hydration` never does.
+
+        Raises:
+        -------
+        ValueError
+            If the body cannot be read or does not match the header.
+        """
+        collecting = pause_gc and gc.isenabled()
+        if collecting:
+            gc.disable()
+        try:
+            with open(self.cache_path, "rb") as file_handler:
+                file_handler.seek(self._offset)
+                body = pickle.load(file_handler)
+            records, sort_snapshot, query_snapshot = body["records"], body["sort"], body["query"]
+            if len(records) != self.count:
+                raise ValueError("record count differs from the header")
+        except _READ_ERRORS as error:
+            raise ValueError(f"Unreadable session cache {self.cache_path}: {error}") from None
+        finally:
+            if collecting:
+                gc.enable()
+        return records, sort_snapshot, query_snapshot
+
+    def start_hydration(self):
+        """
+        Runs `hydrate` on a background thread; poll `done` and then call `result`.
+        The garbage collector is left alone, as the UI thread keeps running.
+        """
+        def run():
+            try:
+                self._result = self.hydrate()
+            except Exception as error:   # reported by `result` on the caller's thread
+                self._error = error
+            finally:
+                self._done.set()
+
+        threading.Thread(target=run, name="session-hydration", daemon=True).start()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        """
+        Waits for the background hydration and returns what `hydrate`
+        returned, or raises its error.
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
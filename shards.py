@@ -0,0 +1,250 @@
+"""
+shards.py
+=========
+
+Students, instructors and courses partitioned into shards by campus (or
+department), one data file per shard.
+
+Each shard is a schema version-2 file `<directory>/<shard>.jsonl` holding
+the records of one campus. Opening the application for one campus loads
+only that file, and saving writes only the shards that changed.
+
+`ShardedStore` is the coordinator: it routes new records to their shard,
+and answers cross-campus queries by visiting every shard. Loaded shards are
+read from memory; the others are streamed from their files without being
+loaded.
+
+Records are the canonical dicts of schema.py. The shard of a record is its
+"campus" value; records without one go to `DEFAULT_SHARD`.
+
+Classes:
+--------
+- Shard
+- ShardedStore
+
+Functions:
+----------
+- campus_of
+- split_file
+"""
+
+import json
+import os
+import re
+from itertools import chain
+
+from schema import FORMAT, SCHEMA_VERSION, RECORD_KEYS, iter_records, write_records
+
+DEFAULT_SHARD = "main"
+SHARD_SUFFIX = ".jsonl"
+_SHARD_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def campus_of(record):
+    """
+    Shard name of a canonical record (or of a Student/Instructor/Course object).
+    """
+    value = record.get("campus") if isinstance(record, dict) else getattr(record, "campus", "")
+    return value or DEFAULT_SHARD
+
+
+def _check_name(name):
+    if not _SHARD_NAME.match(name):
+        raise ValueError(f"Invalid shard name {name!r}: use letters, digits, '-' and '_'")
+    return name
+
+
+class Shard:
+    """
+    The records of one campus, loaded from its file.
+
+    Attributes:
+    -----------
+    records : dict
+        Record type -> list of canonical records.
+    dirty : bool
+        True if the shard changed since it was loaded or saved.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.records = {kind: [] for kind in RECORD_KEYS}
+        self.dirty = False
+        if os.path.exists(path):
+            for record in iter_records(path):
+                self.records[record["type"]].append(record)
+
+    def __len__(self):
+        return sum(len(records) for records in self.records.values())
+
+    def find(self, kind, record_id):
+        for record in self.records[kind]:
+            if record["id"] == record_id:
+                return record
+        return None
+
+    def replace_all(self, kind, records):
+        self.records[kind] = list(records)
+        self.dirty = True
+
+    def save(self):
+        write_records(self.path, chain.from_iterable(self.records.values()))
+        self.dirty = False
+
+
+class ShardedStore:
+    """
+    Coordinator over the shard files of a directory.
+
+    Parameters:
+    -----------
+    directory : str
+        Folder holding one `<shard>.jsonl` file per shard; created if needed.
+    shard_of : callable
+        Returns the shard name of a record (default: its campus).
+    """
+
+    def __init__(self, directory, shard_of=campus_of):
+        self.directory = directory
+        self.shard_of = shard_of
+        self.loaded = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path_of(self, name):
+        return os.path.join(self.directory, _check_name(name) + SHARD_SUFFIX)
+
+    def shard_names(self):
+        """
+        Names of every shard on disk or loaded, without loading any of them.
+        """
+        names = {file_name[:-len(SHARD_SUFFIX)] for file_name in os.listdir(self.directory)
+                 if file_name.endswith(SHARD_SUFFIX)}
+        return sorted(names | set(self.loaded))
+
+    def open(self, name):
+        """
+        Loads one shard (once) and returns it.
+        """
+        shard = self.loaded.get(name)
+        if shard is None:
+            shard = self.loaded[name] = Shard(name, self.path_of(name))
+        return shard
+
+    def close(self, name, save=True):
+        shard = self.loaded.pop(name, None)
+        if shard is not None and save and shard.dirty:
+            shard.save()
+
+    def add(self, record):
+        """
+        Routes a canonical record to its shard (loading it) and returns the shard name.
+        """
+        name = self.shard_of(record)
+        shard = self.open(name)
+        shard.records[record["type"]].append(record)
+        shard.dirty = True
+        return name
+
+    def remove(self, kind, record_id):
+        """
+        Removes a record from whichever shard holds it. Returns the shard name or None.
+        """
+        located = self.find(kind, record_id)
+        if located is None:
+            return None
+        name = located[0]
+        records = self.open(name).records[kind]
+        for position, record in enumerate(records):
+            if record["id"] == record_id:
+                del records[position]
+                break
+        self.loaded[name].dirty = True
+        return name
+
+    def save(self):
+        """
+        Writes the shards that changed; untouched shards are not rewritten.
+        """
+        saved = []
+        for name, shard in self.loaded.items():
+            if shard.dirty:
+                shard.save()
+                saved.append(name)
+        return saved
+
+    def query(self, types=None, predicate=None, shards=None):
+        """
+        Cross-shard query: yields (shard name, record) for every matching record.
+
+        Parameters:
+        -----------
+        types : iterable, optional
+            Record types to visit ("student", "instructor", "course").
+        predicate : callable, optional
+            Only records for which predicate(record) is true.
+        shards : iterable, optional
+            Shard names to visit (default: all).
+        """
+        kinds = tuple(types) if types else tuple(RECORD_KEYS)
+        for name in (shards if shards is not None else self.shard_names()):
+            shard = self.loaded.get(name)
+            if shard is not None:
+                records = chain.from_iterable(shard.records[kind] for kind in kinds)
+            elif os.path.exists(self.path_of(name)):
+                records = iter_records(self.path_of(name), kinds)
+            else:
+                continue
+            for record in records:
+                if predicate is None or predicate(record):
+                    yield name, record
+
+    def find(self, kind, record_id):
+        """
+        Returns (shard name, record) for a record ID in any shard, or None.
+        Loaded shards are searched first.
+        """
+        names = list(self.loaded) + [name for name in self.shard_names() if name not in self.loaded]
+        for name, record in self.query((kind,), lambda rec: rec["id"] == record_id, names):
+            return name, record
+        return None
+
+    def counts(self, types=None):
+        """
+        Number of records per shard, e.g. students per campus.
+        """
+        result = {}
+        for name, _ in self.query(types):
+            result[name] = result.get(name, 0) + 1
+        return result
+
+
+def split_file(path, directory, shard_of=campus_of):
+    """
+    Splits a single data file (any schema version) into shard files in one
+    streaming pass. Existing shard files in `directory` are replaced.
+
+    Returns:
+    --------
+    dict
+        Shard name -> number of records written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    store = ShardedStore(directory, shard_of)
+    files = {}
+    counts = {}
+    try:
+        for record in iter_records(path):
+            name = shard_of(record)
+            handle = files.get(name)
+            if handle is None:
+                handle = files[name] = open(store.path_of(name) + ".tmp", "w", encoding="utf-8")
+                handle.write(json.dumps({"format": FORMAT, "version": SCHEMA_VERSION}) + "\n")
+            handle.write(json.dumps(record) + "\n")
+            counts[name] = counts.get(name, 0) + 1
+    finally:
+        for handle in files.values():
+            handle.close()
+    for name in files:
+        os.replace(store.path_of(name) + ".tmp", store.path_of(name))
+    return counts
@@ -0,0 +1,226 @@
+"""
+sort_index.py
+=============
+
+Presorted indexes behind the clickable column headers of both GUIs.
+
+Each sortable column keeps its records in key order at all times, so a header
+click only walks an index that is already sorted (forwards or backwards), and
+adding a record costs one binary search instead of a full re-sort.
+
+Classes:
+--------
+- SortIndex
+- TableSorter
+
+Key sets:
+---------
+- STUDENT_SORT_KEYS / INSTRUCTOR_SORT_KEYS : name, age, email, id
+- COURSE_SORT_KEYS : course_name, id, instructor
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+from Part12 import person_fields
+
+
+def _text_key(value):
+    return str(value).lower()
+
+
+def _age_key(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+STUDENT_SORT_KEYS = {
+    "name": lambda rec: _text_key(person_fields(rec)["name"]),
+    "age": lambda rec: _age_key(person_fields(rec)["age"]),
+    "email": lambda rec: _text_key(person_fields(rec)["email"]),
+    "id": lambda rec: _text_key(person_fields(rec)["id"]),
+}
+
+INSTRUCTOR_SORT_KEYS = STUDENT_SORT_KEYS
+
+# Courses are dicts in both GUIs: tkinter2 uses "course_name"/"id"/"instructor_name",
+# gui_PyQt5 uses "ID"/"Name" and has no instructor column.
+COURSE_SORT_KEYS = {
+    "course_name": lambda rec: _text_key(rec.get("course_name", rec.get("Name", ""))),
+    "id": lambda rec: _text_key(rec.get("id", rec.get("ID", ""))),
+    "instructor": lambda rec: _text_key(rec.get("instructor_name") or ""),
+}
+
+
+class SortIndex:
+    """
+    Keeps records ordered by one key function.
+
+    Entries are (key, identity) pairs where identity is `id(record)`, so two
+    records with the same key stay distinct. The key each record was indexed
+    under is remembered, which lets `remove` work even after the record was
+    edited in place.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._entries = []
+        self._key_of = {}
+        self._records = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def insert(self, record):
+        ident = id(record)
+        if ident in self._records:
+            self.remove(record)
+        key = self.key(record)
+        insort(self._entries, (key, ident))
+        self._key_of[ident] = key
+        self._records[ident] = record
+
+    def remove(self, record):
+        ident = id(record)
+        if ident not in self._records:
+            return
+        entry = (self._key_of.pop(ident), ident)
+        del self._records[ident]
+        pos = bisect_left(self._entries, entry)
+        del self._entries[pos]
+
+    def rebuild(self, records):
+        self._records = {id(rec): rec for rec in records}
+        self._key_of = {ident: self.key(rec) for ident, rec in self._records.items()}
+        self._entries = sorted((key, ident) for ident, key in self._key_of.items())
+
+    def snapshot(self, position_of):
+        # (key, position) pairs in key order; `position_of` maps id(record) to its position
+        return [(key, position_of[ident]) for key, ident in self._entries]
+
+    def restore(self, records, entries):
+        # Inverse of `snapshot` for the same records; no key function is called
+        self._records = {id(rec): rec for rec in records}
+        self._key_of = {id(records[position]): key for key, position in entries}
+        if len(self._key_of) != len(self._records):
+            raise ValueError("Sort index snapshot does not match the records")
+        # Ties were ordered by the identities of the previous session
+        self._entries = sorted((key, id(records[position])) for key, position in entries)
+
+    def ordered(self, reverse=False, only=None):
+        """
+        Yields records in key order.
+
+        Parameters:
+        -----------
+        reverse : bool
+            Walk the index from the largest key down.
+        only : set, optional
+            Identities (`id(record)`) to keep, e.g. the rows matching the
+            current search. Everything else is skipped.
+        """
+        entries = reversed(self._entries) if reverse else self._entries
+        records = self._records
+        if only is None:
+            for _, ident in entries:
+                yield records[ident]
+        else:
+            for _, ident in entries:
+                if ident in only:
+                    yield records[ident]
+
+    def following(self, record, reverse=False):
+        """
+        Yields the records that come after `record` in key order (before it if
+        `reverse`), e.g. to find where a new row goes among the visible ones.
+        """
+        ident = id(record)
+        if ident not in self._records:
+            return
+        entry = (self._key_of[ident], ident)
+        if reverse:
+            for position in range(bisect_left(self._entries, entry) - 1, -1, -1):
+                yield self._records[self._entries[position][1]]
+        else:
+            for position in range(bisect_right(self._entries, entry), len(self._entries)):
+                yield self._records[self._entries[position][1]]
+
+
+class TableSorter:
+    """
+    One `SortIndex` per column of a table plus the current sort state.
+
+    `toggle(column)` mimics a header click: a new column sorts ascending, the
+    same column again flips the direction.
+    """
+
+    def __init__(self, keys):
+        self.indexes = {column: SortIndex(key) for column, key in keys.items()}
+        self.column = None
+        self.reverse = False
+
+    def toggle(self, column):
+        if column not in self.indexes:
+            raise KeyError(f"Unknown sort column: {column}")
+        if column == self.column:
+            self.reverse = not self.reverse
+        else:
+            self.column = column
+            self.reverse = False
+
+    def insert(self, record):
+        for index in self.indexes.values():
+            index.insert(record)
+
+    def remove(self, record):
+        for index in self.indexes.values():
+            index.remove(record)
+
+    def replace(self, old_record, new_record):
+        self.remove(old_record)
+        self.insert(new_record)
+
+    def rebuild(self, records):
+        for index in self.indexes.values():
+            index.rebuild(records)
+
+    def snapshot(self, records):
+        """
+        The column indexes with positions in `records` instead of record
+        identities, to `restore` in another session (see session_cache.py).
+        """
+        position_of = {id(rec): position for position, rec in enumerate(records)}
+        return {column: index.snapshot(position_of) for column, index in self.indexes.items()}
+
+    def restore(self, records, snapshot):
+        """
+        Like `rebuild`, from a `snapshot` of the same records in the same
+        order, without computing any key. Raises ValueError if the snapshot
+        does not fit.
+        """
+        if set(snapshot) != set(self.indexes):
+            raise ValueError("Sort index snapshot has other columns")
+        for column, index in self.indexes.items():
+            index.restore(records, snapshot[column])
+
+    def ordered(self, records, only=None):
+        """
+        Yields `records` in the current sort order, or unchanged if no column
+        has been selected yet. `only` is passed through to `SortIndex.ordered`.
+        """
+        if self.column is None:
+            for rec in records:
+                if only is None or id(rec) in only:
+                    yield rec
+            return
+        yield from self.indexes[self.column].ordered(self.reverse, only)
+
+    def following(self, record):
+        """
+        Records after `record` in the current sort order; empty if no column
+        has been selected (new rows then simply go to the end).
+        """
+        if self.column is None:
+            return iter(())
+        return self.indexes[self.column].following(record, self.reverse)
@@ -0,0 +1,93 @@
+"""
+startup_benchmark.py
+====================
+
+Measures how long tkinter2.py takes to put its window on screen as the
+dataset grows, with lazy tabs (the default), with every tab built up front
+(SMS_EAGER_TABS=1) and with lazy tabs reopening the same data (warm: the
+warm-start cache written by a first run is used, see session_cache.py).
+
+For each size a `school_data.json` with that many students is written to a
+temporary folder and the app is started there with SMS_STARTUP_PROBE=1, which
+makes it print its timings and close itself. SMS_STARTUP_EPOCH tells it when
+the process was launched, so interpreter start-up and imports are counted.
+
+- first_window : seconds from launch until the main window is mapped
+- first_tab    : seconds until the first visible tab is built and filled
+                 (warm: showing the cached first page)
+
+With lazy tabs, first_window must stay under TARGET_FIRST_WINDOW and must not
+grow with the dataset (largest size within FLAT_TOLERANCE of the smallest).
+
+Usage:
+------
+    python startup_benchmark.py [size ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from schema import write_records
+
+TARGET_FIRST_WINDOW = 0.5   # seconds
+FLAT_TOLERANCE = 1.5        # largest/smallest first_window ratio allowed
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tkinter2.py")
+
+
+def write_dataset(directory, size):
+    students = ({
+        "type": "student",
+        "id": str(100000 + n),
+        "name": f"Student {n}",
+        "age": 18 + n % 10,
+        "email": f"student{n}@example.com",
+        "courses": ["Mathematics 101"] if n % 2 else ["Physics 102"]
+    } for n in range(size))
+    write_records(os.path.join(directory, "school_data.json"), students)
+
+
+def measure(size, eager=False, warm=False):
+    """
+    Starts the app once on a dataset of `size` students and returns
+    (first_window, first_tab) in seconds. With `warm`, the app is started
+    once before, so the measured start finds a warm-start cache.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        write_dataset(directory, size)
+        env = dict(os.environ, SMS_STARTUP_PROBE="1")
+        if eager:
+            env["SMS_EAGER_TABS"] = "1"
+        for _ in range(2 if warm else 1):
+            env["SMS_STARTUP_EPOCH"] = repr(time.time())
+            output = subprocess.run([sys.executable, APP], cwd=directory, env=env,
+                                    capture_output=True, text=True, timeout=300).stdout
+    for line in output.splitlines():
+        if line.startswith("first_window="):
+            fields = dict(part.split("=") for part in line.split())
+            return float(fields["first_window"]), float(fields["first_tab"])
+    raise RuntimeError(f"No startup timings reported for size {size}:\n{output}")
+
+
+def main(sizes):
+    print(f"{'students':>9} {'mode':>6} {'first_window':>13} {'first_tab':>10}")
+    lazy_windows = []
+    for size in sizes:
+        for mode in ("lazy", "eager", "warm"):
+            first_window, first_tab = measure(size, eager=mode == "eager", warm=mode == "warm")
+            if mode == "lazy":
+                lazy_windows.append(first_window)
+            print(f"{size:>9} {mode:>6} {first_window:>13.3f} {first_tab:>10.3f}")
+
+    ok = max(lazy_windows) <= TARGET_FIRST_WINDOW
+    ok = ok and lazy_windows[-1] <= lazy_windows[0] * FLAT_TOLERANCE
+    print(f"lazy first_window target {TARGET_FIRST_WINDOW}s, flat within x{FLAT_TOLERANCE}: "
+          f"{'PASS' if ok else 'FAIL'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
@@ -0,0 +1,251 @@
+"""
+sync.py
+=======
+
+Offline replicas of the school data that reconcile by exchanging deltas.
+
+A replica is a directory holding an append-only change log (`changes.log`,
+one JSON line per change) and its identity (`replica.json`). Every change
+carries the replica it was made on ("origin"), that replica's change counter
+and the record's version vector ({replica: counter}).
+
+Each replica knows, per origin, the highest counter it has received. A sync
+sends each side only the log entries above the other side's knowledge, found
+by binary search in per-origin lists, so its cost grows with the number of
+changes since the last sync, not with the number of records.
+
+Concurrent edits (neither version vector dominates the other) are kept as
+"heads" of the record. The visible version is the head with the highest
+(vector sum, origin, content) key, so every replica that has seen the same
+changes shows the same record. A record with more than one head is an open
+conflict until someone saves a new version of it, which supersedes all heads.
+
+Classes:
+--------
+- Conflict
+- SyncResult
+- Replica
+
+Functions:
+----------
+- sync
+"""
+
+import json
+import os
+import uuid
+from bisect import bisect_right
+from collections import namedtuple
+
+LOG_FILE = "changes.log"
+STATE_FILE = "replica.json"
+
+Conflict = namedtuple("Conflict", "kind record_id shown others")
+Conflict.__doc__ = """An edited record with concurrent versions: the one shown and the ones hidden."""
+
+SyncResult = namedtuple("SyncResult", "sent received changed_here changed_there conflicts")
+SyncResult.__doc__ = """Counts of exchanged changes, (kind, ID) keys changed on each side, open conflicts."""
+
+
+def _dominates(first, second):
+    # True if version vector `first` has seen everything `second` has
+    return all(first.get(replica, 0) >= counter for replica, counter in second.items())
+
+
+def _merged(vectors):
+    merged = {}
+    for vector in vectors:
+        for replica, counter in vector.items():
+            if counter > merged.get(replica, 0):
+                merged[replica] = counter
+    return merged
+
+
+def _rank(entry):
+    # Deterministic order among concurrent versions
+    return (sum(entry["vv"].values()), entry["origin"],
+            json.dumps(entry["record"], sort_keys=True))
+
+
+class Replica:
+    """
+    One replica directory.
+
+    Parameters:
+    -----------
+    directory : str
+        Created if needed. A new directory gets a fresh replica ID.
+    replica_id : str, optional
+        ID for a new replica (default: random).
+    """
+
+    def __init__(self, directory, replica_id=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._state_path = os.path.join(directory, STATE_FILE)
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r") as file_handler:
+                state = json.load(file_handler)
+            self.replica_id = state["replica_id"]
+            self._floor = state.get("floor", {})
+        else:
+            self.replica_id = replica_id or uuid.uuid4().hex[:8]
+            self._floor = {}   # knowledge kept across compaction
+            self._save_state()
+
+        self._heads = {}       # (kind, id) -> list of entries not superseded
+        self._by_origin = {}   # origin -> entries in counter order
+        self._counters = {}    # origin -> counters, parallel to _by_origin
+        self._log_path = os.path.join(directory, LOG_FILE)
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "r") as file_handler:
+                for line in file_handler:
+                    if line.strip():
+                        self._integrate(json.loads(line))
+
+    # --- reading ---
+
+    def knowledge(self):
+        """
+        Highest counter received per origin; what a peer must send beyond.
+        """
+        known = dict(self._floor)
+        for origin, counters in self._counters.items():
+            known[origin] = max(counters[-1], known.get(origin, 0))
+        return known
+
+    def get(self, kind, record_id):
+        """
+        The visible version of a record, or None if it does not exist or was deleted.
+        """
+        heads = self._heads.get((kind, record_id))
+        return max(heads, key=_rank)["record"] if heads else None
+
+    def records(self, kind=None):
+        for (record_kind, _), heads in self._heads.items():
+            if kind is None or record_kind == kind:
+                record = max(heads, key=_rank)["record"]
+                if record is not None:
+                    yield record
+
+    def conflicts(self):
+        found = []
+        for (kind, record_id), heads in self._heads.items():
+            if len(heads) > 1:
+                ordered = sorted(heads, key=_rank, reverse=True)
+                found.append(Conflict(kind, record_id, ordered[0]["record"],
+                                      [entry["record"] for entry in ordered[1:]]))
+        return found
+
+    # --- local edits ---
+
+    def put(self, record):
+        """
+        Records a local edit of a canonical record (see schema.py). Saving a
+        record that has a conflict resolves it.
+        """
+        return self._local_change(record["type"], record["id"], record)
+
+    def delete(self, kind, record_id):
+        return self._local_change(kind, record_id, None)
+
+    def _local_change(self, kind, record_id, record):
+        heads = self._heads.get((kind, record_id), [])
+        if len(heads) == 1 and heads[0]["record"] == record:
+            return None
+        counter = self.knowledge().get(self.replica_id, 0) + 1
+        vector = _merged(entry["vv"] for entry in heads)
+        vector[self.replica_id] = counter
+        entry = {"origin": self.replica_id, "counter": counter, "kind": kind, "id": record_id,
+                 "vv": vector, "record": record}
+        self._append([entry])
+        self._integrate(entry)
+        return entry
+
+    # --- exchange ---
+
+    def changes_since(self, knowledge):
+        """
+        Log entries a peer with the given knowledge has not received yet.
+        """
+        delta = []
+        for origin, entries in self._by_origin.items():
+            start = bisect_right(self._counters[origin], knowledge.get(origin, 0))
+            delta.extend(entries[start:])
+        return delta
+
+    def apply(self, entries):
+        """
+        Integrates entries received from a peer. Returns the set of (kind, ID)
+        keys whose visible version changed.
+        """
+        known = self.knowledge()
+        fresh = [entry for entry in sorted(entries, key=lambda e: (e["origin"], e["counter"]))
+                 if entry["counter"] > known.get(entry["origin"], 0)]
+        self._append(fresh)
+        changed = set()
+        for entry in fresh:
+            key = (entry["kind"], entry["id"])
+            before = self.get(*key)
+            self._integrate(entry)
+            if self.get(*key) != before:
+                changed.add(key)
+        return changed
+
+    def _integrate(self, entry):
+        origin = entry["origin"]
+        counters = self._counters.setdefault(origin, [])
+        if counters and entry["counter"] <= counters[-1]:
+            return
+        counters.append(entry["counter"])
+        self._by_origin.setdefault(origin, []).append(entry)
+
+        key = (entry["kind"], entry["id"])
+        heads = self._heads.get(key, [])
+        if any(_dominates(head["vv"], entry["vv"]) for head in heads):
+            return
+        self._heads[key] = [head for head in heads if not _dominates(entry["vv"], head["vv"])] + [entry]
+
+    def _append(self, entries):
+        if not entries:
+            return
+        with open(self._log_path, "a") as file_handler:
+            for entry in entries:
+                file_handler.write(json.dumps(entry) + "\n")
+
+    def compact(self):
+        """
+        Rewrites the log keeping only the current heads, so it stops growing
+        with superseded edits. What has been received from each origin is
+        remembered in replica.json. Returns the number of entries kept.
+        """
+        kept = sorted((entry for heads in self._heads.values() for entry in heads),
+                      key=lambda e: (e["origin"], e["counter"]))
+        self._floor = self.knowledge()
+        self._save_state()
+        temp_path = self._log_path + ".tmp"
+        with open(temp_path, "w") as file_handler:
+            for entry in kept:
+                file_handler.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self._log_path)
+        self._by_origin = {}
+        self._counters = {}
+        for entry in kept:
+            self._by_origin.setdefault(entry["origin"], []).append(entry)
+            self._counters.setdefault(entry["origin"], []).append(entry["counter"])
+        return len(kept)
+
+    def _save_state(self):
+        with open(self._state_path, "w") as file_handler:
+            json.dump({"replica_id": self.replica_id, "floor": self._floor}, file_handler)
+
+def sync(first, second):
+    """
+    Exchanges the missing changes between two replicas in both directions.
+    """
+    to_second = first.changes_since(second.knowledge())
+    to_first = second.changes_since(first.knowledge())
+    changed_there = second.apply(to_second)
+    changed_here = first.apply(to_first)
+    return SyncResult(len(to_second), len(to_first), changed_here, changed_there,
+                      first.conflicts())
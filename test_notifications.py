@@ -0,0 +1,90 @@
+import pytest
+
+from notifications import LocalSMTPServer, Mail, Outbox
+
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def start(**options):
+        server = LocalSMTPServer(**options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def outbox_for(server, **options):
+    host, port = server.address
+    options.setdefault("backoff", 0.01)
+    return Outbox(host, port, **options)
+
+
+def mails(count):
+    return [Mail(f"student{n}@uni.edu", f"Subject {n}", f"Body {n}\n") for n in range(count)]
+
+
+def recipients(server):
+    return [address for _, to, _ in server.messages for address in to]
+
+
+def test_temporary_failures_are_retried(server_factory):
+    server = server_factory(fail_every=3)
+    outbox = outbox_for(server, connections=1)
+    for mail in mails(9):
+        outbox.send(mail)
+
+    assert outbox.flush(10)
+    outbox.close()
+    stats = outbox.stats()
+    assert outbox.failed == []
+    assert stats["sent"] == 9 and stats["failed"] == 0
+    assert stats["retries"] >= 3
+    assert sorted(recipients(server)) == sorted(mail.to for mail in mails(9))
+
+
+def test_retries_stop_after_max_attempts(server_factory):
+    server = server_factory(fail_every=1)
+    outbox = outbox_for(server, connections=1, max_attempts=3)
+    outbox.send(mails(1)[0])
+
+    assert outbox.flush(10)
+    outbox.close()
+    [(mail, reason)] = outbox.failed
+    assert mail == mails(1)[0]
+    assert reason.startswith("SMTPDataError") and "451" in reason
+    assert outbox.stats()["retries"] == 2
+    assert server.messages == []
+
+
+def test_rejected_recipient_is_given_up_at_once(server_factory):
+    server = server_factory(reject=["student1@uni.edu"])
+    outbox = outbox_for(server, connections=1)
+    for mail in mails(3):
+        outbox.send(mail)
+
+    assert outbox.flush(10)
+    outbox.close()
+    [(mail, reason)] = outbox.failed
+    assert mail.to == "student1@uni.edu"
+    assert reason.startswith("SMTPRecipientsRefused")
+    assert outbox.stats()["retries"] == 0
+    assert sorted(recipients(server)) == ["student0@uni.edu", "student2@uni.edu"]
+
+
+def test_malformed_recipient_is_given_up_without_injecting_headers(server_factory):
+    server = server_factory()
+    outbox = outbox_for(server, connections=1)
+    outbox.send(Mail("x@y.z\nBcc: v@e.com", "Subject", "Body\n"))
+    outbox.send(mails(1)[0])
+
+    assert outbox.flush(10)
+    outbox.close()
+    [(mail, _)] = outbox.failed
+    assert mail.to == "x@y.z\nBcc: v@e.com"
+    assert outbox.stats()["sent"] == 1
+    assert recipients(server) == ["student0@uni.edu"]
+    assert all("v@e.com" not in text for _, _, text in server.messages)
@@ -0,0 +1,76 @@
+from sync import Replica, sync
+
+
+def student(name, age=20):
+    return {"type": "student", "id": "S1", "name": name, "age": age,
+            "email": "s1@uni.edu", "courses": []}
+
+
+def replicas(tmp_path):
+    first = Replica(str(tmp_path / "a"), "a")
+    second = Replica(str(tmp_path / "b"), "b")
+    first.put(student("Ann"))
+    sync(first, second)
+    return first, second
+
+
+def test_concurrent_edits_show_the_same_winner_and_a_conflict(tmp_path):
+    first, second = replicas(tmp_path)
+    first.put(student("Ann Lee"))
+    second.put(student("Ann", age=21))
+
+    result = sync(first, second)
+
+    # Both vectors sum to 2, so the higher origin ("b") wins on every replica
+    assert first.get("student", "S1") == second.get("student", "S1") == student("Ann", age=21)
+    assert result.changed_here == {("student", "S1")}
+    assert result.changed_there == set()
+    for replica in (first, second):
+        [conflict] = replica.conflicts()
+        assert (conflict.kind, conflict.record_id) == ("student", "S1")
+        assert conflict.shown == student("Ann", age=21)
+        assert conflict.others == [student("Ann Lee")]
+    assert result.conflicts == first.conflicts()
+
+
+def test_saving_a_conflicted_record_resolves_it(tmp_path):
+    first, second = replicas(tmp_path)
+    first.put(student("Ann Lee"))
+    second.put(student("Ann", age=21))
+    sync(first, second)
+
+    first.put(student("Ann Lee", age=21))
+    result = sync(first, second)
+
+    assert result.conflicts == [] and second.conflicts() == []
+    assert second.get("student", "S1") == student("Ann Lee", age=21)
+
+
+def test_compaction_then_resync(tmp_path):
+    first, second = replicas(tmp_path)
+    for age in range(21, 31):
+        first.put(student("Ann", age=age))
+    sync(first, second)
+    known = first.knowledge()
+
+    assert first.compact() == 1
+    assert first.knowledge() == known
+    # Reopening the compacted replica keeps what it had received
+    first = Replica(first.directory)
+    assert first.knowledge() == known
+    assert first.get("student", "S1") == student("Ann", age=30)
+
+    first.put(student("Ann", age=31))
+    second.put(dict(student("Bob"), id="S2"))
+    result = sync(first, second)
+
+    # Only the changes made since the last sync travel
+    assert (result.sent, result.received) == (1, 1)
+    assert first.get("student", "S2") == second.get("student", "S2")
+    assert second.get("student", "S1") == student("Ann", age=31)
+
+    # A new replica gets the current version of everything from the compacted log
+    third = Replica(str(tmp_path / "c"), "c")
+    sync(third, first)
+    assert sorted(map(repr, third.records())) == sorted(map(repr, first.records()))
+    assert third.conflicts() == []
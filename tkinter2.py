@@ -35,23 +35,64 @@ Functions:
 - process_request
 - MouseButtonUpCallBack
 - register_student_for_course
+
+Every change to the three lists goes through a `RecordStore` (see
+school_store.py); the change subscribers keep the sort indexes, Treeviews,
+dropdowns and `school_data.json` in step with each change. The Treeviews
+show one page of rows at a time, read from keyset-paged views of the lists
+(see paging.py), so filling a table or showing search results does not
+walk every record. Student changes
+are also logged in a local replica that the "Sync" button reconciles with
+another copy of the data (see sync.py). On exit the students and their
+indexes are cached, so reopening an unchanged data file is instant (see
+session_cache.py). Every change is recorded, with who made it and the values
+before and after, in the audit log in SMS_AUDIT_DIR (default "audit"); the
+"History" button shows a student's entries (see audit.py). Every version of
+every record is kept in SMS_HISTORY_FILE (default "history.jsonl"), and
+"As Of" shows a student as it was on a given date (see history.py). With
+SMS_SMTP_HOST set, students get a confirmation email for every registration,
+waitlist place and promotion, sent in the background (see notifications.py).
 """
 
+import os
+import time
+
+# Startup timings count from here, before the imports below; the startup
+# benchmark passes the time it launched the process (SMS_STARTUP_EPOCH) so
+# interpreter start-up counts too
+STARTUP_STARTED = float(os.environ.get("SMS_STARTUP_EPOCH") or time.time())
+
 import tkinter as tk
-from tkinter import ttk, messagebox
-from Part12 import Student, Instructor, Course  # Importing classes from Part1.py
-import json
+from tkinter import ttk, messagebox, filedialog, simpledialog
+from Part12 import Student, Instructor, Course, person_fields, record_id  # Importing classes from Part1.py
+from sort_index import TableSorter, STUDENT_SORT_KEYS, INSTRUCTOR_SORT_KEYS, COURSE_SORT_KEYS
+from attendance import AttendanceStore
+from dedup import DedupIndex, merge
+from reports import generate_reports
+from derived_cache import DerivedCache
+from query import QueryIndex, compile_query
+from paging import students_collection, instructors_collection, courses_collection
+from registration import RegistrationDesk, ENROLLED, WAITLISTED, DROPPED
+from scheduling import parse_meetings, time_clashes, booking_clashes
+from schema import (iter_records, write_records, migrate_file, student_record, instructor_record,
+                    course_record, record_to_student, record_to_tkinter)
+from shards import ShardedStore, campus_of
+from sync import Replica, sync
+from session_cache import open_session, save_session, file_stamp
+from audit import AuditLog, describe
+from history import History, HISTORY_FILE, parse_time
+from notifications import Outbox, registration_message, DEFAULT_SENDER
+from validation import Validator
+from school_store import EventBus, RecordStore, INSERTED, UPDATED, DELETED, RELOADED
+import datetime
+import multiprocessing
+from itertools import chain
 
 global my_data_list
 global currentRowIndex
 my_data_list = [
-    {
-        "name": "John Doe",
-        "id": "12345",
-        "Age": 25,
-        "email": "johndoe@example.com",
-        "registered_courses": ["Mathematics 101", "Physics 102"]
-    }
+    Student("John Doe", 25, "johndoe@example.com", "12345",
+            ["Mathematics 101", "Physics 102"])
 ]
 
 instructor_data_list = [
@@ -78,10 +119,73 @@ course_data_list = [
     }
 ]
 
+# Presorted indexes behind the clickable column headers; the tables are in
+# ID order until a header is clicked
+student_sorter = TableSorter(STUDENT_SORT_KEYS)
+student_sorter.rebuild(my_data_list)
+student_sorter.toggle("id")
+instructor_sorter = TableSorter(INSTRUCTOR_SORT_KEYS)
+instructor_sorter.rebuild(instructor_data_list)
+instructor_sorter.toggle("id")
+course_sorter = TableSorter(COURSE_SORT_KEYS)
+course_sorter.rebuild(course_data_list)
+course_sorter.toggle("id")
+
+# All writes go through these stores, which publish change events on `bus`
+bus = EventBus()
+student_store = RecordStore("student", my_data_list, bus)
+instructor_store = RecordStore("instructor", instructor_data_list, bus)
+course_store = RecordStore("course", course_data_list, bus)
+# The tables show TABLE_PAGE_SIZE rows at a time, read page by page from these
+# keyset-paged views (see paging.py); "More Rows" appends the next page
+TABLE_PAGE_SIZE = 200
+table_pages = {"student": students_collection(my_data_list, bus),
+               "instructor": instructors_collection(instructor_data_list, bus),
+               "course": courses_collection(course_data_list, bus)}
+page_cursors = {}    # entity -> cursor of the next page, None once every row is shown
+page_matches = {}    # entity -> id(record) of the rows a search matched, None for all
+TABLE_WIDGETS = {"student": ("trv", "btnMoreStudents"),
+                 "instructor": ("trv_instructor", "btnMoreInstructors"),
+                 "course": ("trv_course", "btnMoreCourses")}
+# Row strings and enrollment lists, invalidated by the events of `bus`
+derived_values = DerivedCache(bus)
+# ID / email / course / age indexes behind the search boxes, see query.py
+student_query = QueryIndex("student", my_data_list, bus)
+instructor_query = QueryIndex("instructor", instructor_data_list, bus)
+course_query = QueryIndex("course", course_data_list, bus)
+# Blocking indexes behind the duplicate checks and the "Duplicates" button
+student_dedup = DedupIndex(my_data_list, bus, "student")
+instructor_dedup = DedupIndex(instructor_data_list, bus, "instructor")
+# Seats and waitlists per course, keyed by course name like the course lists;
+# students moved off a waitlist get a confirmation email
+seat_desk = RegistrationDesk(on_promote=lambda course_name, student_name: send_confirmation(
+    student_name, course_name, ENROLLED, promoted=True))
+# Confirmation emails go through this outbox's threads, never the UI thread;
+# SMS_SMTP_HOST, SMS_SMTP_PORT and SMS_SMTP_FROM choose the server
+SMTP_HOST = os.environ.get("SMS_SMTP_HOST")
+outbox = Outbox(SMTP_HOST, int(os.environ.get("SMS_SMTP_PORT", "25")),
+                os.environ.get("SMS_SMTP_FROM", DEFAULT_SENDER)) if SMTP_HOST else None
+OUTBOX_CLOSE_TIMEOUT = 10   # seconds the exit waits for queued emails
+# Who changed what and when, see audit.py
+audit_log = AuditLog(os.environ.get("SMS_AUDIT_DIR", "audit"))
+# Every version of every record, for as-of queries, see history.py
+record_history = History(os.environ.get("SMS_HISTORY_FILE", HISTORY_FILE))
+
+# With SMS_CAMPUS=<name> the app works on one campus: only that shard of
+# SMS_SHARD_DIR (default "shards") is loaded and saved, see shards.py. The
+# shard holds the campus's students, instructors and courses.
+CAMPUS = os.environ.get("SMS_CAMPUS")
+campus_shards = ShardedStore(os.environ.get("SMS_SHARD_DIR", "shards")) if CAMPUS else None
+if campus_shards is not None:
+    try:
+        campus_shards.path_of(CAMPUS)
+    except ValueError as error:
+        raise SystemExit(f"SMS_CAMPUS: {error}") from None
+
 
 # creating the first window
 window = tk.Tk()
-window.title("School Management System")
+window.title(f"School Management System - {CAMPUS}" if CAMPUS else "School Management System")
 window.configure(bg='LightBlue')
 
 notebook = ttk.Notebook(window)
@@ -96,9 +200,6 @@ instructor_frame.pack()
 
 course_frame = tk.Frame(window)
 course_frame.pack()
-# creating the student label frame inside the frame
-student = tk.LabelFrame(student_frame, text="New student")
-student.grid(row=0, column=0, sticky="news", padx=20, pady=10)
 
 student_frame.pack(fill="both", expand=True)
 instructor_frame.pack(fill="both", expand=True)
@@ -108,79 +209,70 @@ course_frame.pack(fill="both", expand=True)
 notebook.add(student_frame, text="Students")
 notebook.add(instructor_frame, text="Instructors")
 notebook.add(course_frame, text="Courses")
-# creating all the widget inside the student frame
-name = tk.Label(student, text="Name:")
-name.grid(row=0, column=0)
-
-age = tk.Label(student, text="Age:")
-age.grid(row=0, column=2)
-
-email = tk.Label(student, text="Email:")
-email.grid(row=0, column=3)
-
-id = tk.Label(student, text="ID:")
-id.grid(row=0, column=4)
-
-n_entry = tk.Entry(student)
-n_entry.grid(row=1, column=0)
-age_spinbox = tk.Spinbox(student, from_=17, to=100)
-age_spinbox.grid(row=1, column=2)
-email_entry = tk.Entry(student)
-email_entry.grid(row=1, column=3)
-id1_entry = tk.Entry(student)
-id1_entry.grid(row=1, column=4)
-# Create a dropdown for course registration in the student section
-course_label = tk.Label(student, text="Register for Course:")
-course_label.grid(row=2, column=0, padx=10, pady=5)
-
-course_dropdown = ttk.Combobox(student)
-course_dropdown['values'] = [course['course_name']
-                             for course in course_data_list]
-course_dropdown.grid(row=2, column=1, padx=10, pady=5)
-
-
-for widget in student.winfo_children():
-    widget.grid_configure(padx=10, pady=5)
-
-trv = ttk.Treeview(student, columns=(1, 2, 3, 4), show="headings", height="16")
-trv.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
-
-trv.heading(1, text="Name", anchor="center")
-trv.heading(2, text="Age", anchor="center")
-trv.heading(3, text="Email", anchor="center")
-trv.heading(4, text="ID", anchor="center")
-
-# w: west
-trv.column("#1", anchor="w", width=140, stretch=True)
-trv.column("#2", anchor="w", width=140, stretch=True)
-trv.column("#3", anchor="w", width=140, stretch=True)
-trv.column("#4", anchor="w", width=140, stretch=True)
 
 
 def load_json_from_file():
     """
-    Loads student data from a JSON file and updates the global `my_data_list`.
-    Converts each loaded entry into a `Student` object.
-    """
-    global my_data_list
-    with open("school_data.json", "r") as file_handler:
-        data = json.load(file_handler)
-        # Convert dict to Student objects
-        my_data_list = [Student.from_dict(entry) for entry in data]
-    file_handler.close()
+    Loads the data file into `my_data_list`, `instructor_data_list` and
+    `course_data_list`.
+    A file in an older layout is first upgraded in place (see schema.py), then
+    each student record is converted into a `Student` object and instructors
+    and courses into tkinter2's dicts. In campus mode only the campus shard
+    is read.
+    """
+    global data_file_stamp
+    if campus_shards is not None:
+        load_instructors_and_courses()
+        records = campus_shards.open(CAMPUS).records["student"]
+    else:
+        migrate_file("school_data.json")
+        load_instructors_and_courses()
+        records = list(iter_records("school_data.json", ("student",)))
+        data_file_stamp = file_stamp("school_data.json")
+    student_store.load([record_to_student(record) for record in records])
     print('file has been read and closed')
 
 
-def save_json_to_file():
+def load_instructors_and_courses():
     """
-    Saves the current student data into a JSON file.
+    Loads the instructor and course records of `school_data.json`, if it
+    exists; the built-in examples stay otherwise. In campus mode those of the
+    campus shard are loaded, as its students are.
+    """
+    records = {"instructor": [], "course": []}
+    if campus_shards is not None:
+        shard = campus_shards.open(CAMPUS)
+        for kind in records:
+            records[kind] = [record_to_tkinter(record) for record in shard.records[kind]]
+    elif not os.path.exists("school_data.json"):
+        return
+    else:
+        for record in iter_records("school_data.json", records):
+            records[record["type"]].append(record_to_tkinter(record))
+    instructor_store.load(records["instructor"])
+    course_store.load(records["course"])
+
 
-    Writes the content of the global `my_data_list` into 'school_data.json'.
+def save_json_to_file():
     """
-    global my_data_list
-    with open("school_data.json", "w") as file_handler:
-        json.dump([student.to_dict()
-                  for student in my_data_list], file_handler, indent=4)
+    Saves the current data into the data file.
+
+    Writes the students, instructors and courses into 'school_data.json' in
+    the current schema version, or into the campus shard in campus mode.
+    """
+    global data_file_stamp
+    students = (student_record(student) for student in my_data_list)
+    instructors = (instructor_record(instructor) for instructor in instructor_data_list)
+    courses = (course_record(course) for course in course_data_list)
+    if campus_shards is not None:
+        shard = campus_shards.open(CAMPUS)
+        shard.replace_all("student", students)
+        shard.replace_all("instructor", instructors)
+        shard.replace_all("course", courses)
+        campus_shards.save()
+    else:
+        write_records("school_data.json", chain(students, instructors, courses))
+        data_file_stamp = file_stamp("school_data.json")
 
 
 def remove_all_data_from_trv():
@@ -193,21 +285,82 @@ def remove_all_data_from_trv():
         trv.delete(item)
 
 
+def sort_treeview(entity, column):
+    """
+    Sorts a table by one column when its header is clicked.
+
+    Clicking the same header again reverses the order. The table then shows
+    the first page in the new order, of the current search results if any.
+
+    Parameters:
+    -----------
+    entity : str
+        "student", "instructor" or "course".
+    column : str
+        The sort key name (see `sort_index`).
+    """
+    sorters[entity].toggle(column)
+    fill_table(entity, page_matches.get(entity))
+
+
+def fill_table(entity, matches=None):
+    """
+    Clears a table and shows the first page of its records in the current
+    sort order.
+
+    Parameters:
+    -----------
+    entity : str
+        "student", "instructor" or "course".
+    matches : set, optional
+        `id(record)` of the records a search found; only those are shown.
+    """
+    tree = globals()[TABLE_WIDGETS[entity][0]]
+    for item in tree.get_children():
+        tree.delete(item)
+    page_matches[entity] = matches
+    page_cursors[entity] = None
+    show_next_page(entity)
+
+
+def show_next_page(entity):
+    """
+    Appends the next page of a table's rows and enables "More Rows" while
+    pages are left.
+    """
+    tree_name, button_name = TABLE_WIDGETS[entity]
+    tree = globals()[tree_name]
+    sorter = sorters[entity]
+    matches = page_matches.get(entity)
+    values_of = {"student": student_row_values, "instructor": instructor_row_values,
+                 "course": course_row_values}[entity]
+    page = table_pages[entity].page(
+        sort=sorter.column or "id", reverse=sorter.reverse, cursor=page_cursors.get(entity),
+        page_size=TABLE_PAGE_SIZE, predicate=None if matches is None else lambda record: id(record) in matches)
+    for record in page.rows:
+        if not tree.exists(id(record)):
+            tree.insert('', index='end', iid=id(record), text="", values=values_of(record))
+    page_cursors[entity] = page.next_cursor
+    if button_name in globals():
+        globals()[button_name]["state"] = "normal" if page.next_cursor else "disabled"
+
+
 def load_trv_with_json():
     """
-    Loads data from `my_data_list` into the Treeview widget.
-    Iterates over the `my_data_list` and adds each student as a row in the Treeview widget.
+    Shows the first page of `my_data_list` in the student Treeview, following
+    the current column sort.
     """
-    global my_data_list
+    fill_table("student")
 
-    remove_all_data_from_trv()
 
-    rowIndex = 1
-    for student in my_data_list:
-        # Now using the Student object attributes instead of dict keys
-        trv.insert('', index='end', iid=rowIndex, text="",
-                   values=(student.name, student.age, student._email, student.student_id))
-        rowIndex += 1
+def student_row_values(student):
+    """
+    Returns the Treeview values (name, age, email, ID) of a student record.
+    """
+    def row(record):
+        fields = person_fields(record)
+        return (fields["name"], fields["age"], fields["email"], fields["id"])
+    return derived_values.for_record("row", "student", student, row)
 
 
 def clear_all_fields():
@@ -315,34 +468,88 @@ def load_edit_field_with_row_data(_tuple):
     id1_entry.insert(0, _tuple[3])
 
 
+def run_query(index, search_value):
+    """
+    Runs a search box query (see query.py) and returns the matching records,
+    or None after showing the error if the query is invalid.
+    """
+    try:
+        return index.search(search_value)
+    except ValueError as error:
+        messagebox.showerror("Search Error", str(error))
+        return None
+
+
 def search_student(search_value):
     """
-    Searches for students by name or ID and displays the results in the Treeview widget.
+    Searches for students and displays the results in the Treeview widget.
 
     Parameters:
     -----------
     search_value : str
-        The value to search for in the student's name or ID.
+        A name or ID, or a query such as "age>=20 and course:PHYS102".
 
     Displays a message if no matching student is found.
     """
-    # Clear current Treeview
-    remove_all_data_from_trv()
+    if not search_value.strip():
+        load_trv_with_json()
+        return
+    results = run_query(student_query, search_value)
+    if results is None:
+        return
 
-    # Search for students matching by name or ID
-    rowIndex = 1
-    for student in my_data_list:
-        if search_value.lower() in student.name.lower() or search_value == student.student_id:
-            trv.insert('', index='end', iid=rowIndex, text="", values=(
-                student.name, student.age, student._email, student.student_id))
-            rowIndex += 1
+    matches = {id(student) for student in results}
+    fill_table("student", matches)
 
     # If no match found
-    if rowIndex == 1:
+    if not matches:
+        elsewhere = search_other_campuses(search_value)
+        if elsewhere:
+            messagebox.showinfo(
+                "Search Result", f"No student found on {CAMPUS}; matches on: {', '.join(elsewhere)}")
+            return
         messagebox.showinfo(
             "Search Result", "No student found with that Name or ID")
 
 
+def explain_student_search(search_value):
+    """
+    Shows how a student search would run: the index used and the row estimates.
+    """
+    try:
+        plan = student_query.explain(search_value)
+    except ValueError as error:
+        messagebox.showerror("Search Error", str(error))
+        return
+    messagebox.showinfo("Search Plan", plan)
+
+
+def search_other_campuses(search_value):
+    """
+    In campus mode, returns the other campuses that have a student matching
+    `search_value` by name or ID. Their shards are streamed, not loaded.
+    """
+    if campus_shards is None:
+        return []
+    others = [name for name in campus_shards.shard_names() if name != CAMPUS]
+    predicate = compile_query(search_value, "student").predicate
+    matches = campus_shards.query(
+        ("student",), lambda record: predicate(record_to_student(record)), others)
+    return sorted({name for name, _ in matches})
+
+
+def find_student(search_value):
+    """
+    Returns the student whose name or ID equals `search_value`, or None.
+    Unlike `search_student`, the Treeview is left as it is.
+    """
+    for student in my_data_list:
+        fields = person_fields(student)
+        if search_value in (fields["name"], fields["id"]):
+            return student
+    return None
+
+
 def cancel():
     """
     Clears all input fields and sets the form state to 'New'.
@@ -373,17 +580,71 @@ def add_entry():
     to add the new student.
     """
     Name = n_entry.get()
-    Age = int(age_spinbox.get())
-    Email = email_entry.get()
+    Email = email_entry.get().strip()
     ID = id1_entry.get()
 
-    new_student = Student(Name, Age, Email, ID)
-    my_data_list.append(new_student)
-    save_json_to_file()
-    load_trv_with_json()
+    record = {"type": "student", "id": ID, "name": Name, "age": age_spinbox.get(), "email": Email}
+    if not form_is_valid(record, my_data_list):
+        return
+    new_student = Student(Name, int(record["age"]), Email, ID, campus=CAMPUS or "")
+    if not confirm_not_duplicate(new_student, student_dedup):
+        return
+    student_store.insert(new_student)
     clear_all_fields()
 
 
+def form_is_valid(record, records, current_id=None):
+    """
+    Checks a record typed into a form with the shared rules (see
+    validation.py) and shows all of its problems at once.
+
+    Parameters:
+    -----------
+    record : dict
+        The canonical record ("type", "id", "name", ...) built from the form.
+    records : list
+        The existing records of the same type, whose IDs are taken.
+    current_id : str, optional
+        The ID of the record being updated, which the record may keep.
+
+    Returns:
+    --------
+    bool
+        True if the record may be saved.
+    """
+    validator = Validator(ids={record["type"]: (record_id(other) for other in records)})
+    issues = validator.validate(record, current_id)
+    if issues:
+        messagebox.showwarning("Input Error", "\n".join(issue.message for issue in issues))
+    return not issues
+
+
+def confirm_not_duplicate(new_record, index):
+    """
+    Checks a record against existing ones before it is added.
+
+    A record whose ID is already taken is refused. A likely duplicate (similar
+    name with the same email, etc.) asks the user for confirmation.
+
+    Returns:
+    --------
+    bool
+        True if the record may be added.
+    """
+    new_id = person_fields(new_record)["id"]
+    if index.with_id(new_id):
+        messagebox.showwarning("Duplicate", f"ID {new_id} is already in use")
+        return False
+    matches = index.matches_for(new_record)
+    if matches:
+        existing = person_fields(matches[0].second)
+        return messagebox.askyesno(
+            "Possible duplicate",
+            f"This looks like {existing['name']} ({existing['email']}, ID {existing['id']}). "
+            "Add anyway?")
+    return True
+
+
 def update_entry():
     """
     Updates an existing student entry in `my_data_list`.
@@ -392,8 +653,8 @@ def update_entry():
     information.
     """
     Name = n_entry.get()
-    Age = int(age_spinbox.get())
-    Email = email_entry.get()
+    Age = age_spinbox.get()
+    Email = email_entry.get().strip()
     ID = id1_entry.get()
 
     process_request('_UPDATE_', Name, Age, Email, ID)
@@ -406,11 +667,9 @@ def delete_entry():
     Retrieves the name entered in the form and processes the request to delete the student.
     """
     Name = n_entry.get()
-    student = search_student(Name)
+    student = find_student(Name)
     if student:
-        my_data_list.remove(student)
-        save_json_to_file()
-        load_trv_with_json()
+        student_store.delete(student)
         clear_all_fields()
 
 
@@ -434,32 +693,29 @@ def process_request(command_type, name_value, age_value, email_value, id_value):
     id_value : str
         The ID of the student.
     """
-    global my_data_list
-
+    record = {"type": "student", "id": id_value, "name": name_value, "age": age_value, "email": email_value}
     if command_type == "_UPDATE_":
-        student = search_student(name_value)
+        student = find_student(name_value)
         if student:
-            student.age = int(age_value)
-            student._email = email_value
-            student.student_id = id_value
-        row = find_row_in_my_data_list(name_value)
-        if row >= 0:
-            data = {"n_entry": name_value,
-                    "Age": age_value, "email": email_value, "id": id_value}
-            my_data_list[row] = data
+            if not form_is_valid(record, my_data_list, person_fields(student)["id"]):
+                return
+            student_store.update(student, age=int(age_value),
+                                 _email=email_value, student_id=id_value)
 
     elif command_type == "_INSERT_":
+        if not form_is_valid(record, my_data_list):
+            return
         new_student = Student(name=name_value, age=int(
-            age_value), _email=email_value, student_id=id_value)
-        my_data_list.append(new_student)
+            age_value), _email=email_value, student_id=id_value, campus=CAMPUS or "")
+        student_store.insert(new_student)
 
     elif command_type == "_DELETE_":
-        student = search_student(name_value)
+        student = find_student(name_value)
         if student:
-            my_data_list.remove(student)
+            with bus.transaction():
+                release_seats(student)
+                student_store.delete(student)
 
-    save_json_to_file()
-    load_trv_with_json()
     clear_all_fields()
 
 
@@ -486,190 +742,853 @@ def MouseButtonUpCallBack(event):
     id1_entry.insert(0, lastTuple[3])
 
 
-# Add this above the Treeview in the student frame
-search_label = tk.Label(student, text="Search by Name or ID:")
-search_label.grid(row=3, column=0, padx=10, pady=5)
+def course_seats(course):
+    """
+    Returns the course's key in `seat_desk` (its name), first giving the desk
+    the course's capacity and enrolled students if it does not know them yet.
+    """
+    course_name = course["course_name"]
+    if not seat_desk.is_open(course_name):
+        open_seats(course)
+    return course_name
+
+
+def open_seats(course):
+    """
+    (Re)reads a course's capacity and enrolled students into `seat_desk`,
+    keeping its waitlist. Returns the students who got a freed seat.
+    """
+    course_name = course["course_name"]
+    enrolled = list(course["enrolled_students"]) + [
+        student.name for student in derived_values.enrollment(course_name, my_data_list)]
+    return seat_desk.open(course_name, course.get("capacity"), dict.fromkeys(enrolled))
+
+
+def set_enrollment(student_name, course, enrolled, student=None):
+    """
+    Adds (or, with enrolled=False, removes) a registration on both the
+    student's course list and the course's list of enrolled students.
+    Pass `student` when the caller already has the record, to skip the lookup.
+    """
+    course_name = course["course_name"]
+    if student is None:
+        student = find_student(student_name)
+    with bus.transaction():
+        if student is not None:
+            registered = list(student.registered_courses)
+            if enrolled and course_name not in registered:
+                student.register_course(course_name)
+            elif not enrolled and course_name in registered:
+                student.registered_courses.remove(course_name)
+            if student.registered_courses != registered:
+                student_store.touch(student, "registered_courses", registered)
+
+        members = list(course["enrolled_students"])
+        if enrolled and student_name not in members:
+            course["enrolled_students"].append(student_name)
+        elif not enrolled and student_name in members:
+            course["enrolled_students"].remove(student_name)
+        if course["enrolled_students"] != members:
+            course_store.touch(course, "enrolled_students", members)
+
+
+def apply_promotions(course, promoted, announce=True):
+    """
+    Enrolls the students that `seat_desk` moved off a course's waitlist and,
+    if `announce`, tells the user who they are.
+    """
+    for student_name in promoted:
+        set_enrollment(student_name, course, True)
+    if promoted and announce:
+        messagebox.showinfo(
+            "Waitlist", f"Moved from the {course['course_name']} waitlist: {', '.join(promoted)}")
+
+
+def find_course(course_name):
+    return next((c for c in course_data_list if c['course_name'] == course_name), None)
+
 
-search_entry = tk.Entry(student)
-search_entry.grid(row=3, column=1, padx=10, pady=5)
+def timetable_clashes(student, course):
+    """
+    IDs of the student's other courses that meet at the same time as `course`.
+    """
+    taken = [find_course(course_name) for course_name in student.registered_courses]
+    return time_clashes(course, [other for other in taken if other is not None])
 
-search_button = tk.Button(student, text="Search",
-                          command=lambda: search_student(search_entry.get()))
-search_button.grid(row=3, column=2, padx=10, pady=5)
 
-clear_button = tk.Button(student, text="Clear Search",
-                         command=load_trv_with_json)  # To reload all data
-clear_button.grid(row=3, column=3, padx=10, pady=5)
+def send_confirmation(student, course_name, status, position=None, promoted=False):
+    """
+    Queues the confirmation email of a registration outcome for `student` (a
+    Student or a student name). Only ENROLLED and WAITLISTED outcomes are
+    confirmed, and nothing is sent without SMS_SMTP_HOST.
+    """
+    if outbox is None or status not in (ENROLLED, WAITLISTED):
+        return
+    if isinstance(student, str):
+        student = find_student(student)
+    if student is not None:
+        outbox.send(registration_message(student.name, person_fields(student)["email"], course_name,
+                                         status, position, promoted))
+
+
+def release_seats(student, announce=True):
+    """
+    Gives up the seats (and waitlist places) of a student who is being
+    deleted; freed seats go to the next students on the waitlists.
+    Returns the names of the promoted students.
+    """
+    for course in course_data_list:
+        if course["course_name"] in student.registered_courses or student.name in course["enrolled_students"]:
+            course_seats(course)
+    promoted = []
+    for outcome in seat_desk.withdraw(student.name):
+        course = find_course(outcome.course)
+        if outcome.status == DROPPED and course is not None:
+            set_enrollment(student.name, course, False, student)
+            moved = [outcome.promoted] if outcome.promoted else []
+            apply_promotions(course, moved, announce)
+            promoted.extend(moved)
+    return promoted
 
 
 def register_student_for_course():
     """
     Registers a student for a course based on the selected values.
 
-    The function retrieves the selected student and course, updates the student's registered
-    courses, and updates the course's enrolled students.
+    A seat is taken through `seat_desk`: the student's registered courses and
+    the course's enrolled students are updated if a seat was free, otherwise
+    the student joins the course's waitlist. A course that meets at the same
+    time as one of the student's courses is refused.
 
-    Displays an info message upon successful registration or a warning if an error occurs.
+    Displays an info message with the outcome or a warning if an error occurs.
     """
     selected_course = course_dropdown.get()
-    student_name = n_entry.get()
+    student = find_student(n_entry.get())
+    course = find_course(selected_course)
+    if not (student and course):
+        messagebox.showwarning("Error", "Student or Course not found!")
+        return
+    clashes = timetable_clashes(student, course)
+    if clashes:
+        messagebox.showwarning("Time Clash", f"{selected_course} meets at the same time as "
+                                             f"{student.name}'s course {', '.join(clashes)}")
+        return
 
-    student = search_student(student_name)
-    if student and selected_course:
-        student.register_course(selected_course)
+    outcome = seat_desk.register(student.name, course_seats(course))
+    send_confirmation(student, selected_course, outcome.status, outcome.position)
+    if outcome.status == ENROLLED:
+        set_enrollment(student.name, course, True)
+        messagebox.showinfo(
+            "Success", f"{student.name} has been registered for {selected_course}")
+    elif outcome.status == WAITLISTED:
+        messagebox.showinfo(
+            "Course Full", f"{selected_course} is full; {student.name} is number "
+                           f"{outcome.position} on the waitlist")
+    else:
+        messagebox.showinfo("Registration", f"{student.name} is {outcome.status} for {selected_course}")
 
-        course = next(
-            (c for c in course_data_list if c['course_name'] == selected_course), None)
-        if course:
-            if student_name not in course['enrolled_students']:
-                course['enrolled_students'].append(student_name)
 
-        save_json_to_file()
+def drop_student_from_course():
+    """
+    Drops the selected course (or its waitlist place) for the student in the
+    form. The freed seat goes to the first student on the waitlist.
+    """
+    selected_course = course_dropdown.get()
+    student = find_student(n_entry.get())
+    course = find_course(selected_course)
+    if not (student and course):
+        messagebox.showwarning("Error", "Student or Course not found!")
+        return
 
-        messagebox.showinfo(
-            "Success", f"{student_name} has been registered for {selected_course}")
+    outcome = seat_desk.drop(student.name, course_seats(course))
+    if outcome.status == DROPPED:
+        set_enrollment(student.name, course, False)
+        apply_promotions(course, [outcome.promoted] if outcome.promoted else [])
+    messagebox.showinfo("Drop Course", f"{student.name}: {outcome.status} ({selected_course})")
+
+
+# --- BULK ACTIONS ---
+# The Treeviews allow selecting many rows (Ctrl/Shift-click). Each bulk action
+# runs as one transaction: the student file is written once and every view
+# handles the whole batch of changes in one delivery.
+
+BULK_FIELDS = {"age": "Age", "campus": "Campus"}
+
+
+def selected_students():
+    """
+    Returns the students of the rows selected in the student Treeview.
+    """
+    by_identity = {id(student): student for student in my_data_list}
+    return [by_identity[int(iid)] for iid in trv.selection() if int(iid) in by_identity]
+
+
+def delete_selected_students():
+    """
+    Deletes every selected student after one confirmation. Their seats go to
+    the next students on the waitlists.
+    """
+    students = selected_students()
+    if not students:
+        messagebox.showwarning("Delete", "Select one or more students first")
+        return
+    if not messagebox.askyesno("Delete", f"Delete {len(students)} selected students?"):
+        return
+    promoted = []
+    with bus.transaction():
+        for student in students:
+            promoted.extend(release_seats(student, announce=False))
+        student_store.delete_many(students)
+    clear_all_fields()
+    message = f"{len(students)} students deleted"
+    if promoted:
+        message += f"\nMoved off waitlists: {', '.join(promoted)}"
+    messagebox.showinfo("Delete", message)
+
+
+def register_selected_students():
+    """
+    Registers every selected student for the course in the dropdown; those
+    who find the course full join its waitlist in selection order. Students
+    with a course at the same time are skipped.
+    """
+    selected_course = course_dropdown.get()
+    course = find_course(selected_course)
+    students = selected_students()
+    if not (students and course):
+        messagebox.showwarning("Error", "Select students and a course first!")
+        return
+
+    by_name = {student.name: student for student in students if not timetable_clashes(student, course)}
+    outcomes = seat_desk.register_many(list(by_name), course_seats(course))
+    with bus.transaction():
+        for outcome in outcomes:
+            if outcome.status == ENROLLED:
+                set_enrollment(outcome.student, course, True, by_name[outcome.student])
+    counts = {}
+    for outcome in outcomes:
+        send_confirmation(by_name[outcome.student], selected_course, outcome.status, outcome.position)
+        counts[outcome.status] = counts.get(outcome.status, 0) + 1
+    clashing = len({student.name for student in students}) - len(by_name)
+    if clashing:
+        counts["skipped (time clash)"] = clashing
+    messagebox.showinfo("Registration", f"{selected_course}: " + ", ".join(
+        f"{count} {status}" for status, count in counts.items()))
+
+
+def edit_selected_students():
+    """
+    Sets one field (age or campus) to the same value for every selected student.
+    In campus mode, another campus moves the students there (see `move_to_campus`).
+    """
+    students = selected_students()
+    if not students:
+        messagebox.showwarning("Edit", "Select one or more students first")
+        return
+    field = simpledialog.askstring(
+        "Edit selected", f"Field to set for {len(students)} students ({' or '.join(BULK_FIELDS)}):")
+    if field is None:
+        return
+    field = field.strip().lower()
+    if field not in BULK_FIELDS:
+        messagebox.showwarning("Edit", f"Only {' and '.join(BULK_FIELDS)} can be set for several students")
+        return
+    value = simpledialog.askstring("Edit selected", f"New {BULK_FIELDS[field].lower()}:")
+    if value is None:
+        return
+    value = value.strip()
+    problems = Validator().validate_field("student", field, value)
+    if problems:
+        messagebox.showwarning("Edit", "\n".join(problems))
+        return
+    if field == "age":
+        value = int(value)
+    if field == "campus" and campus_shards is not None and campus_of({"campus": value}) != CAMPUS:
+        move_to_campus(students, value)
+        return
+    changed = student_store.update_many(students, **{field: value})
+    messagebox.showinfo("Edit", f"{BULK_FIELDS[field]} changed for {len(changed)} students")
+
+
+def move_to_campus(students, campus):
+    """
+    In campus mode, moves students to another campus: they are saved into
+    that campus's shard and leave this one (and the table).
+    """
+    target = campus_of({"campus": campus})
+    try:
+        campus_shards.path_of(target)
+    except ValueError as error:
+        messagebox.showwarning("Edit", str(error))
+        return
+    if not messagebox.askyesno(
+            "Edit", f"Move {len(students)} students to {target}? They will no longer be listed here."):
+        return
+    with bus.transaction():
+        student_store.update_many(students, campus=campus)
+        for student in students:
+            campus_shards.add(student_record(student))
+        # Saving this campus (see persist_records) also writes the target shard
+        student_store.delete_many(students)
+    clear_all_fields()
+    messagebox.showinfo("Edit", f"{len(students)} students moved to {target}")
+
+
+DUPLICATE_PROMPTS = 20   # pairs "Duplicates" asks about at most
+
+
+def merge_students(keep, drop):
+    """
+    Folds the student `drop` into `keep` (see `dedup.merge`) and updates the
+    seats of their courses: `keep` holds the seats of both, `drop` leaves any
+    waitlist, and a seat freed because both were enrolled goes to the waitlist.
+    Returns the names of the promoted students.
+    """
+    affected = [course for course in course_data_list
+                if seat_desk.is_open(course["course_name"]) and (
+                    course["course_name"] in drop.registered_courses
+                    or drop.name in course["enrolled_students"])]
+    merge(keep, drop, student_store, course_store)
+    promoted = []
+    for course in affected:
+        moved = open_seats(course)
+        apply_promotions(course, moved, announce=False)
+        promoted.extend(moved)
+    if drop.name != keep.name:
+        # Only waitlist places are left for `drop` on the desk
+        for outcome in seat_desk.withdraw(drop.name):
+            if outcome.promoted:
+                apply_promotions(find_course(outcome.course), [outcome.promoted], announce=False)
+                promoted.append(outcome.promoted)
+    return promoted
+
+
+def merge_duplicate_students():
+    """
+    Lists likely duplicate students, most certain first, and offers to merge
+    each pair into the first of the two.
+    """
+    matches = student_dedup.duplicates()
+    if not matches:
+        messagebox.showinfo("Duplicates", "No likely duplicate students found")
+        return
+    merged, promoted = 0, []
+    for match in matches[:DUPLICATE_PROMPTS]:
+        if match.first not in student_dedup or match.second not in student_dedup:
+            continue   # one of them was merged away by an earlier answer
+        keep, drop = person_fields(match.first), person_fields(match.second)
+        if messagebox.askyesno(
+                "Duplicates",
+                f"Merge {drop['name']} (ID {drop['id']}, {drop['email']}) into "
+                f"{keep['name']} (ID {keep['id']}, {keep['email']})?\n"
+                f"Same {', '.join(match.reasons) or 'nothing'}; score {match.score:.2f}"):
+            promoted.extend(merge_students(match.first, match.second))
+            merged += 1
+    message = f"{merged} of {len(matches)} likely duplicates merged"
+    if promoted:
+        message += f"\nMoved off waitlists: {', '.join(promoted)}"
+    messagebox.showinfo("Duplicates", message)
+
+
+def assign_instructor_to_selected_courses():
+    """
+    Makes the instructor in the course form's dropdown the instructor of
+    every course selected in the course Treeview. Courses meeting at the same
+    time as one the instructor already teaches are skipped.
+    """
+    instructor_name = instructor_dropdown.get()
+    by_identity = {id(course): course for course in course_data_list}
+    courses = [by_identity[int(iid)] for iid in trv_course.selection() if int(iid) in by_identity]
+    if not (courses and instructor_name):
+        messagebox.showwarning("Error", "Select courses and an instructor first!")
+        return
+    teaching = [course for course in course_data_list if course["instructor_name"] == instructor_name]
+    assignable = []
+    for course in courses:
+        if course["instructor_name"] != instructor_name and not time_clashes(course, teaching):
+            teaching.append(course)
+            assignable.append(course)
+    changed = course_store.update_many(assignable, instructor_name=instructor_name)
+    message = f"{instructor_name} assigned to {len(changed)} more courses"
+    skipped = sum(course["instructor_name"] != instructor_name for course in courses) - len(assignable)
+    if skipped:
+        message += f"\n{skipped} skipped: they meet when {instructor_name} already teaches"
+    messagebox.showinfo("Assign Instructor", message)
+
+
+def reset_seats(event):
+    """
+    Change subscriber: reloaded data may have different enrollments, so the
+    desk re-reads every course on its next use.
+    """
+    seat_desk.clear()
+
+
+def generate_report_files():
+    """
+    Writes a schedule for every student and a roster for every course into a
+    chosen folder, with a progress bar while the worker processes run.
+    """
+    out_dir = filedialog.askdirectory(title="Folder for the reports")
+    if not out_dir:
+        return
+    progress_window = tk.Toplevel(window)
+    progress_window.title("Generating reports")
+    progress_bar = ttk.Progressbar(progress_window, length=300, mode="determinate")
+    progress_bar.pack(padx=20, pady=10)
+    progress_label = tk.Label(progress_window, text="")
+    progress_label.pack(padx=20, pady=5)
+
+    def show_progress(done, total):
+        progress_bar['maximum'] = total
+        progress_bar['value'] = done
+        progress_label.config(text=f"{done} / {total} reports")
+        progress_window.update()
+
+    # This script builds its window at import time, so the pool must fork
+    # rather than spawn workers that would re-run it; without fork, render here.
+    if "fork" in multiprocessing.get_all_start_methods():
+        options = {"mp_context": multiprocessing.get_context("fork")}
     else:
-        messagebox.showwarning("Error", "Student or Course not found!")
+        options = {"workers": 1}
+    try:
+        written = generate_reports(my_data_list, course_data_list, out_dir,
+                                   progress=show_progress, **options)
+    finally:
+        progress_window.destroy()
+    messagebox.showinfo("Reports", f"{written} reports written to {out_dir}")
 
 
-# Add a button to trigger the registration
-register_button = tk.Button(
-    student, text="Register for Course", command=register_student_for_course)
-register_button.grid(row=2, column=2, padx=10, pady=5)
+# --- REPLICA SYNC ---
+# Student edits are also recorded in the local replica (SMS_REPLICA_DIR,
+# default "replica"); "Sync" exchanges only the missing changes with another
+# replica folder, e.g. a registrar's laptop copy. See sync.py.
+replica = None
+applying_sync = False
 
-trv.bind("<ButtonRelease>", MouseButtonUpCallBack)
 
+def get_replica():
+    """
+    Opens the local replica on first use; a new replica starts from the current students.
+    """
+    global replica
+    if replica is None:
+        replica = Replica(os.environ.get("SMS_REPLICA_DIR", "replica"))
+        if not replica.knowledge():
+            for student in my_data_list:
+                replica.put(student_record(student))
+    return replica
 
-ButtonFrame = tk.LabelFrame(
-    student, text='', bg="lightgray", font=('Consolas', 14))
-ButtonFrame.grid(row=5, column=0, columnspan=6)
 
-btnShow = tk.Button(ButtonFrame, text="Print", padx=20,
-                    pady=10, command=print_all_entries)
-btnShow.pack(side=tk.LEFT)
+def record_in_replica(event):
+    """
+    Change subscriber: logs a local student change in the replica.
+    """
+    if applying_sync or event.kind == RELOADED:
+        return
+    local = get_replica()
+    if event.kind == DELETED:
+        local.delete("student", str(event.record_id))
+        return
+    # A changed student ID removes the record under its old ID
+    old_id = event.changes.get("student_id", (None,))[0]
+    if event.old_record is not None:
+        old_id = record_id(event.old_record)
+    if old_id is not None and str(old_id) != str(event.record_id):
+        local.delete("student", str(old_id))
+    local.put(student_record(event.record))
+
+
+def sync_with_replica():
+    """
+    Syncs the local replica with a chosen replica folder, applies the received
+    changes to `my_data_list` and lists any conflicting edits.
+    """
+    global applying_sync
+    peer_dir = filedialog.askdirectory(title="Replica folder to sync with")
+    if not peer_dir:
+        return
+    local = get_replica()
+    result = sync(local, Replica(peer_dir))
+
+    applying_sync = True
+    try:
+        with bus.transaction():
+            for kind, student_id in result.changed_here:
+                if kind != "student":
+                    continue
+                record = local.get(kind, student_id)
+                existing = student_store.find(student_id)
+                if record is None:
+                    if existing is not None:
+                        student_store.delete(existing)
+                elif existing is None:
+                    student_store.insert(record_to_student(record))
+                else:
+                    student_store.replace(existing, record_to_student(record))
+    finally:
+        applying_sync = False
+
+    messagebox.showinfo("Sync", f"Sent {result.sent} and received {result.received} changes")
+    if result.conflicts:
+        lines = [f"ID {conflict.record_id}: showing {(conflict.shown or {}).get('name', '(deleted)')}, "
+                 f"also edited as {', '.join((other or {}).get('name', '(deleted)') for other in conflict.others)}"
+                 for conflict in result.conflicts]
+        messagebox.showwarning(
+            "Sync conflicts",
+            "These students were edited on both sides. Save the correct version to resolve:\n"
+            + "\n".join(lines))
+
+
+# --- AUDIT HISTORY ---
+HISTORY_LINES = 30   # most recent entries shown by "History"
+
+
+def show_student_history():
+    """
+    Shows the audit entries of the student in the form (by ID, else name),
+    including those from before its ID was changed.
+    """
+    student = find_student(id1_entry.get()) or find_student(n_entry.get())
+    if student is None:
+        messagebox.showwarning("History", "Student not found!")
+        return
+    entries = audit_log.query("student", person_fields(student)["id"])
+    lines = [describe(entry) for entry in entries[-HISTORY_LINES:]]
+    if len(entries) > HISTORY_LINES:
+        lines.insert(0, f"(last {HISTORY_LINES} of {len(entries)} changes)")
+    messagebox.showinfo(f"History - {student.name}", "\n".join(lines) or "No recorded changes")
 
-btnAdd = tk.Button(ButtonFrame, text="Add", padx=20,
-                   pady=10, command=add_entry)
-btnAdd.pack(side=tk.LEFT)
 
-btnUpdate = tk.Button(ButtonFrame, text="Update", padx=20,
-                      pady=10, command=update_entry)
-btnUpdate.pack(side=tk.LEFT)
+def show_student_as_of():
+    """
+    Shows the student in the form (by ID, else name) as it was on a date
+    the user enters, with the courses it was enrolled in then.
+    """
+    student = find_student(id1_entry.get()) or find_student(n_entry.get())
+    if student is None:
+        messagebox.showwarning("As Of", "Student not found!")
+        return
+    text = simpledialog.askstring("As Of", "Date (YYYY-MM-DD or YYYY-MM-DD HH:MM):")
+    if not text:
+        return
+    try:
+        when = parse_time(text)
+    except ValueError:
+        messagebox.showwarning("As Of", f"Not a date: {text}")
+        return
+    state = record_history.as_of("student", person_fields(student)["id"], when)
+    if state is None:
+        messagebox.showinfo(f"As Of {text}", f"{student.name} was not a student then")
+        return
+    messagebox.showinfo(f"As Of {text}", "\n".join([
+        f"ID: {state['id']}", f"Name: {state['name']}", f"Age: {state['age']}",
+        f"Email: {state['email']}", f"Courses: {', '.join(map(str, state['courses'])) or '(none)'}"]))
 
-btnDelete = tk.Button(ButtonFrame, text="Delete", padx=20,
-                      pady=10, command=delete_entry)
-btnDelete.pack(side=tk.LEFT)
 
-btnClear = tk.Button(ButtonFrame, text="Clear",
-                     padx=20, pady=10, command=cancel)
-btnClear.pack(side=tk.LEFT)
+# --- WARM START ---
+# Reopening an unchanged school_data.json shows the first page of the student
+# table from the warm-start cache (see session_cache.py) at once. The records
+# and their sort and search indexes are read from the cache on a background
+# thread and loaded when ready; until then the student buttons are disabled,
+# so nothing can be saved over the file before the real records are in.
+# Set SMS_WARM_CACHE to choose the cache file, or to "" to turn this off.
 
-btnExit = tk.Button(ButtonFrame, text="Exit", padx=20,
-                    pady=10, command=window.quit)
-btnExit.pack(side=tk.LEFT)
+WARM_CACHE = os.environ.get("SMS_WARM_CACHE", "session.cache")
+WARM_POLL_MS = 20
+data_file_stamp = None   # school_data.json as last read or written here
+warm_cache_state = None  # (file stamp, sort column, reverse) the cache was written for
+sort_snapshots = {}      # entity -> sort index snapshot for its next reload
+hydrating = False        # the students are still being read from the cache
+save_pending = False     # an instructor or course change waits for them to be saved
 
-load_json_from_file()
-load_trv_with_json()
 
+def set_student_actions(state):
+    """
+    Sets the state ("normal" or "disabled") of every button of the Students
+    tab except Exit.
+    """
+    for frame in (student, ButtonFrame):
+        for widget in frame.winfo_children():
+            if isinstance(widget, tk.Button) and widget is not btnExit:
+                widget["state"] = state
 
-# --- INSTRUCTOR SECTION ---
 
-def load_trv_with_instructor_data():
+def warm_start():
     """
-    Loads instructor data into the TreeView widget from the global instructor data list.
+    Shows the student table from the warm-start cache if it was written for
+    the current `school_data.json`, and starts reading the records behind it.
+
+    Returns:
+    --------
+    bool
+        False if there is no usable cache; nothing has been done then.
+    """
+    if campus_shards is not None or not WARM_CACHE:
+        return False
+    session = open_session(WARM_CACHE, "school_data.json", "student")
+    if session is None:
+        return False
+    global hydrating
+    load_instructors_and_courses()
+    student_sorter.column, student_sorter.reverse = session.sort_column, session.reverse
+    # Negative item IDs never collide with the id(record) of a real row
+    for position, values in enumerate(session.first_page):
+        trv.insert('', index='end', iid=-1 - position, text="", values=values)
+    set_student_actions("disabled")
+    hydrating = True
+    session.start_hydration()
+    window.after(WARM_POLL_MS, finish_warm_start, session)
+    return True
+
+
+def finish_warm_start(session):
+    """
+    Loads the records of the warm-start cache once the background read is
+    done; the "reloaded" event then restores the indexes from their snapshots
+    and fills the Treeview. Falls back to reading `school_data.json` if the
+    cache could not be read or the file changed in the meantime.
+    """
+    global data_file_stamp, warm_cache_state, hydrating, save_pending
+    if not session.done():
+        window.after(WARM_POLL_MS, finish_warm_start, session)
+        return
+    try:
+        records, sort_snapshot, query_snapshot = session.result()
+    except ValueError as error:
+        print(error)
+        records = None
+    if records is None or file_stamp("school_data.json") != session.stamp:
+        load_json_from_file()
+    else:
+        data_file_stamp = session.stamp
+        warm_cache_state = (session.stamp, session.sort_column, session.reverse)
+        if sort_snapshot is not None:
+            sort_snapshots["student"] = sort_snapshot
+        student_query.restore_on_reload(query_snapshot)
+        student_store.load(records)
+    hydrating = False
+    if save_pending:
+        save_pending = False
+        save_json_to_file()
+    set_student_actions("normal")
+
+
+def save_warm_cache():
     """
-    global instructor_data_list
+    Writes the warm-start cache for the next launch, if the students were
+    loaded in this session, `school_data.json` still holds what was last read
+    or written here and the cache does not already match it.
+    """
+    if campus_shards is not None or not WARM_CACHE or data_file_stamp is None:
+        return
+    if warm_cache_state == (data_file_stamp, student_sorter.column, student_sorter.reverse):
+        return
+    try:
+        save_session(WARM_CACHE, "school_data.json", "student", my_data_list, student_sorter,
+                     student_query, student_row_values, stamp=data_file_stamp)
+    except OSError as error:
+        print(f"Warm-start cache not written: {error}")
+
+
+def build_student_tab():
+    """
+    Builds the Students tab: the form, search bar, buttons and the student
+    Treeview, then loads `school_data.json` into it.
+    """
+    global student, name, age, email, id_label, n_entry, age_spinbox, email_entry
+    global id1_entry, course_label, course_dropdown, trv, search_label, search_entry
+    global search_button, clear_button, register_button, ButtonFrame, btnShow, btnAdd
+    global btnUpdate, btnDelete, btnClear, btnReports, btnSync, btnExit, btnMoreStudents
+
+    # creating the student label frame inside the frame
+    student = tk.LabelFrame(student_frame, text="New student")
+    student.grid(row=0, column=0, sticky="news", padx=20, pady=10)
+
+    # creating all the widget inside the student frame
+    name = tk.Label(student, text="Name:")
+    name.grid(row=0, column=0)
+
+    age = tk.Label(student, text="Age:")
+    age.grid(row=0, column=2)
+
+    email = tk.Label(student, text="Email:")
+    email.grid(row=0, column=3)
+
+    id_label = tk.Label(student, text="ID:")
+    id_label.grid(row=0, column=4)
+
+    n_entry = tk.Entry(student)
+    n_entry.grid(row=1, column=0)
+    age_spinbox = tk.Spinbox(student, from_=17, to=100)
+    age_spinbox.grid(row=1, column=2)
+    email_entry = tk.Entry(student)
+    email_entry.grid(row=1, column=3)
+    id1_entry = tk.Entry(student)
+    id1_entry.grid(row=1, column=4)
+    # Create a dropdown for course registration in the student section
+    course_label = tk.Label(student, text="Register for Course:")
+    course_label.grid(row=2, column=0, padx=10, pady=5)
+
+    course_dropdown = ttk.Combobox(student)
+    course_dropdown['values'] = [course['course_name']
+                                 for course in course_data_list]
+    course_dropdown.grid(row=2, column=1, padx=10, pady=5)
+
+    for widget in student.winfo_children():
+        widget.grid_configure(padx=10, pady=5)
+
+    trv = ttk.Treeview(student, columns=(1, 2, 3, 4), show="headings", height="16",
+                       selectmode="extended")
+    trv.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
+
+    trv.heading(1, text="Name", anchor="center", command=lambda: sort_treeview("student", "name"))
+    trv.heading(2, text="Age", anchor="center", command=lambda: sort_treeview("student", "age"))
+    trv.heading(3, text="Email", anchor="center", command=lambda: sort_treeview("student", "email"))
+    trv.heading(4, text="ID", anchor="center", command=lambda: sort_treeview("student", "id"))
+
+    btnMoreStudents = tk.Button(student, text="More Rows", state="disabled",
+                                command=lambda: show_next_page("student"))
+    btnMoreStudents.grid(row=22, column=0, padx=10, pady=5)
+
+    # w: west
+    trv.column("#1", anchor="w", width=140, stretch=True)
+    trv.column("#2", anchor="w", width=140, stretch=True)
+    trv.column("#3", anchor="w", width=140, stretch=True)
+    trv.column("#4", anchor="w", width=140, stretch=True)
+
+    # Add this above the Treeview in the student frame
+    search_label = tk.Label(student, text="Search (name, ID or query):")
+    search_label.grid(row=3, column=0, padx=10, pady=5)
+
+    search_entry = tk.Entry(student)
+    search_entry.grid(row=3, column=1, padx=10, pady=5)
+
+    search_button = tk.Button(student, text="Search",
+                              command=lambda: search_student(search_entry.get()))
+    search_button.grid(row=3, column=2, padx=10, pady=5)
 
-    remove_all_data_from_trv_instructor()
+    clear_button = tk.Button(student, text="Clear Search",
+                             command=load_trv_with_json)  # To reload all data
+    clear_button.grid(row=3, column=3, padx=10, pady=5)
 
-    rowIndex = 1
+    explain_button = tk.Button(student, text="Explain",
+                               command=lambda: explain_student_search(search_entry.get()))
+    explain_button.grid(row=3, column=4, padx=10, pady=5)
 
-    for key in instructor_data_list:
-        iName = key["n_entry"]
-        iAge = key["Age"]
-        iEmail = key["email"]
-        iID = key["id"]
-        trv_instructor.insert('', index='end', iid=rowIndex,
-                              text="", values=(iName, iAge, iEmail, iID))
-        rowIndex += 1
+    # Add a button to trigger the registration
+    register_button = tk.Button(
+        student, text="Register for Course", command=register_student_for_course)
+    register_button.grid(row=2, column=2, padx=10, pady=5)
 
+    drop_button = tk.Button(
+        student, text="Drop Course", command=drop_student_from_course)
+    drop_button.grid(row=2, column=3, padx=10, pady=5)
 
-# creating the instructor label frame inside the frame
-instructor = tk.LabelFrame(instructor_frame, text="New Instructor")
-instructor.grid(row=1, column=0, sticky="news", padx=20, pady=10)
+    trv.bind("<ButtonRelease>", MouseButtonUpCallBack)
 
-# Creating all the widget inside the instructor frame
-nameInstructor = tk.Label(instructor, text="Name:")
-nameInstructor.grid(row=0, column=0)
+    # Actions on every selected row (Ctrl/Shift-click to select several)
+    selected_label = tk.Label(student, text="Selected rows:")
+    selected_label.grid(row=4, column=0, padx=10, pady=5)
 
-ageInstructor = tk.Label(instructor, text="Age:")
-ageInstructor.grid(row=0, column=2)
+    delete_selected_button = tk.Button(
+        student, text="Delete Selected", command=delete_selected_students)
+    delete_selected_button.grid(row=4, column=1, padx=10, pady=5)
 
-emailInstructor = tk.Label(instructor, text="Email:")
-emailInstructor.grid(row=0, column=3)
+    register_selected_button = tk.Button(
+        student, text="Register Selected", command=register_selected_students)
+    register_selected_button.grid(row=4, column=2, padx=10, pady=5)
 
-idInstructor = tk.Label(instructor, text="ID:")
-idInstructor.grid(row=0, column=4)
+    edit_selected_button = tk.Button(
+        student, text="Edit Selected", command=edit_selected_students)
+    edit_selected_button.grid(row=4, column=3, padx=10, pady=5)
 
-name_entry_Instructor = tk.Entry(instructor)
-name_entry_Instructor.grid(row=1, column=0)
-age_spinbox_Instructor = tk.Spinbox(instructor, from_=25, to=100)
-age_spinbox_Instructor.grid(row=1, column=2)
-email_entry_Instructor = tk.Entry(instructor)
-email_entry_Instructor.grid(row=1, column=3)
-id_entry_Instructor = tk.Entry(instructor)
-id_entry_Instructor.grid(row=1, column=4)
+    ButtonFrame = tk.LabelFrame(
+        student, text='', bg="lightgray", font=('Consolas', 14))
+    ButtonFrame.grid(row=5, column=0, columnspan=6)
 
+    btnShow = tk.Button(ButtonFrame, text="Print", padx=20,
+                        pady=10, command=print_all_entries)
+    btnShow.pack(side=tk.LEFT)
 
-search_label_instructor = tk.Label(instructor, text="Search by Name or ID:")
-search_label_instructor.grid(row=2, column=0, padx=10, pady=5)
+    btnAdd = tk.Button(ButtonFrame, text="Add", padx=20,
+                       pady=10, command=add_entry)
+    btnAdd.pack(side=tk.LEFT)
 
-search_entry_instructor = tk.Entry(instructor)
-search_entry_instructor.grid(row=2, column=1, padx=10, pady=5)
+    btnUpdate = tk.Button(ButtonFrame, text="Update", padx=20,
+                          pady=10, command=update_entry)
+    btnUpdate.pack(side=tk.LEFT)
+
+    btnDelete = tk.Button(ButtonFrame, text="Delete", padx=20,
+                          pady=10, command=delete_entry)
+    btnDelete.pack(side=tk.LEFT)
 
-search_button_instructor = tk.Button(
-    instructor, text="Search", command=lambda: search_instructor(search_entry_instructor.get()))
-search_button_instructor.grid(row=2, column=2, padx=10, pady=5)
+    btnClear = tk.Button(ButtonFrame, text="Clear",
+                         padx=20, pady=10, command=cancel)
+    btnClear.pack(side=tk.LEFT)
 
-clear_button_instructor = tk.Button(instructor, text="Clear Search",
-                                    command=load_trv_with_instructor_data)  # To reload all instructor data
-clear_button_instructor.grid(row=2, column=3, padx=10, pady=5)
+    btnReports = tk.Button(ButtonFrame, text="Reports", padx=20,
+                           pady=10, command=generate_report_files)
+    btnReports.pack(side=tk.LEFT)
+
+    btnSync = tk.Button(ButtonFrame, text="Sync", padx=20,
+                        pady=10, command=sync_with_replica)
+    btnSync.pack(side=tk.LEFT)
+
+    btnHistory = tk.Button(ButtonFrame, text="History", padx=20,
+                           pady=10, command=show_student_history)
+    btnHistory.pack(side=tk.LEFT)
+
+    btnAsOf = tk.Button(ButtonFrame, text="As Of", padx=20,
+                        pady=10, command=show_student_as_of)
+    btnAsOf.pack(side=tk.LEFT)
+
+    btnDuplicates = tk.Button(ButtonFrame, text="Duplicates", padx=20,
+                              pady=10, command=merge_duplicate_students)
+    btnDuplicates.pack(side=tk.LEFT)
+
+    btnExit = tk.Button(ButtonFrame, text="Exit", padx=20,
+                        pady=10, command=window.quit)
+    btnExit.pack(side=tk.LEFT)
+
+    # Reading the file publishes a "reloaded" event, which fills the Treeview
+    if not warm_start():
+        load_json_from_file()
+
+
+# --- INSTRUCTOR SECTION ---
+
+def load_trv_with_instructor_data():
+    """
+    Shows the first page of the instructors in the instructor TreeView.
+    """
+    fill_table("instructor")
 
-# Add a Treeview to display instructor data
-trv_instructor = ttk.Treeview(instructor, columns=(
-    1, 2, 3, 4), show="headings", height="16")
-trv_instructor.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
 
-trv_instructor.heading(1, text="Name", anchor="center")
-trv_instructor.heading(2, text="Age", anchor="center")
-trv_instructor.heading(3, text="Email", anchor="center")
-trv_instructor.heading(4, text="ID", anchor="center")
+def instructor_row_values(instructor):
+    """
+    Returns the Treeview values (name, age, email, ID) of an instructor record.
+    """
+    return derived_values.for_record("row", "instructor", instructor, lambda record: (
+        record["n_entry"], record["Age"], record["email"], record["id"]))
 
-trv_instructor.column("#1", anchor="w", width=140, stretch=True)
-trv_instructor.column("#2", anchor="w", width=140, stretch=True)
-trv_instructor.column("#3", anchor="w", width=140, stretch=True)
-trv_instructor.column("#4", anchor="w", width=140, stretch=True)
 
 # --- FUNCTIONS FOR INSTRUCTORS ---
 
 
 def search_instructor(search_value):
     """
-    Searches and displays instructors by name or ID in the TreeView based on the search value.
+    Searches and displays instructors by name, ID or query (see query.py) in the TreeView.
     """
-    # Clear current Treeview for instructors
-    remove_all_data_from_trv_instructor()
+    results = run_query(instructor_query, search_value) if search_value.strip() else instructor_data_list
+    if results is None:
+        return
 
-    # Search for instructors matching by name or ID
-    rowIndex = 1
-    for key in instructor_data_list:
-        if search_value.lower() in key["n_entry"].lower() or search_value == key["id"]:
-            trv_instructor.insert('', index='end', iid=rowIndex, text="", values=(
-                key["n_entry"], key["Age"], key["email"], key["id"]))
-            rowIndex += 1
+    matches = {id(key) for key in results} if search_value.strip() else None
+    fill_table("instructor", matches)
 
     # If no match found
-    if rowIndex == 1:
+    if not results:
         messagebox.showinfo(
             "Search Result", "No instructor found with that Name or ID")
 
@@ -717,7 +1636,7 @@ def add_entry_instructor():
     """
     Name = name_entry_Instructor.get()
     Age = age_spinbox_Instructor.get()
-    Email = email_entry_Instructor.get()
+    Email = email_entry_Instructor.get().strip()
     ID = id_entry_Instructor.get()
 
     process_instructor_request('_INSERT_', Name, Age, Email, ID)
@@ -729,7 +1648,7 @@ def update_entry_instructor():
     """
     Name = name_entry_Instructor.get()
     Age = age_spinbox_Instructor.get()
-    Email = email_entry_Instructor.get()
+    Email = email_entry_Instructor.get().strip()
     ID = id_entry_Instructor.get()
 
     process_instructor_request('_UPDATE_', Name, Age, Email, ID)
@@ -747,26 +1666,32 @@ def process_instructor_request(command_type, name_value, age_value, email_value,
     """
     Processes insert, update, or delete requests for instructor data and refreshes the TreeView.
     """
-    global instructor_data_list
-
+    record = {"type": "instructor", "id": id_value, "name": name_value, "age": age_value,
+              "email": email_value}
     if command_type == "_UPDATE_":
         row = find_instructor_row(name_value)
         if row >= 0:
-            data = {"n_entry": name_value, "Age": age_value,
-                    "email": email_value, "id": id_value}
-            instructor_data_list[row] = data
+            if not form_is_valid(record, instructor_data_list, instructor_data_list[row]["id"]):
+                return
+            # Keeps what the form does not show (assigned courses, campus)
+            data = dict(instructor_data_list[row], n_entry=name_value, Age=age_value,
+                        email=email_value, id=id_value)
+            instructor_store.replace(instructor_data_list[row], data)
 
     if command_type == "_INSERT_":
         data = {"n_entry": name_value, "Age": age_value,
-                "email": email_value, "id": id_value}
-        instructor_data_list.append(data)
+                "email": email_value, "id": id_value, "campus": CAMPUS or ""}
+        if not form_is_valid(record, instructor_data_list):
+            return
+        if not confirm_not_duplicate(data, instructor_dedup):
+            return
+        instructor_store.insert(data)
 
     if command_type == "_DELETE_":
         row = find_instructor_row(name_value)
         if row >= 0:
-            del instructor_data_list[row]
+            instructor_store.delete(instructor_data_list[row])
 
-    load_trv_with_instructor_data()
     clear_instructor_fields()
 
 # Bind instructor TreeView selection
@@ -798,125 +1723,136 @@ def load_instructor_field_with_row_data(_tuple):
     id_entry_Instructor.insert(0, _tuple[3])
 
 
-trv_instructor.bind("<ButtonRelease>", MouseButtonUpCallBackInstructor)
+def build_instructor_tab():
+    """
+    Builds the Instructors tab and fills its Treeview.
+    """
+    global instructor, nameInstructor, ageInstructor, emailInstructor, idInstructor
+    global name_entry_Instructor, age_spinbox_Instructor, email_entry_Instructor
+    global id_entry_Instructor, search_label_instructor, search_entry_instructor
+    global search_button_instructor, clear_button_instructor, trv_instructor
+    global ButtonFrameInstructor, btnAddInstructor, btnUpdateInstructor
+    global btnDeleteInstructor, btnClearInstructor, btnMoreInstructors
 
-# --- INSTRUCTOR BUTTONS ---
+    # creating the instructor label frame inside the frame
+    instructor = tk.LabelFrame(instructor_frame, text="New Instructor")
+    instructor.grid(row=1, column=0, sticky="news", padx=20, pady=10)
 
-ButtonFrameInstructor = tk.LabelFrame(
-    instructor, text='', bg="lightgray", font=('Consolas', 14))
-ButtonFrameInstructor.grid(row=5, column=0, columnspan=6)
+    # Creating all the widget inside the instructor frame
+    nameInstructor = tk.Label(instructor, text="Name:")
+    nameInstructor.grid(row=0, column=0)
 
-btnAddInstructor = tk.Button(
-    ButtonFrameInstructor, text="Add", padx=20, pady=10, command=add_entry_instructor)
-btnAddInstructor.pack(side=tk.LEFT)
+    ageInstructor = tk.Label(instructor, text="Age:")
+    ageInstructor.grid(row=0, column=2)
 
-btnUpdateInstructor = tk.Button(
-    ButtonFrameInstructor, text="Update", padx=20, pady=10, command=update_entry_instructor)
-btnUpdateInstructor.pack(side=tk.LEFT)
+    emailInstructor = tk.Label(instructor, text="Email:")
+    emailInstructor.grid(row=0, column=3)
 
-btnDeleteInstructor = tk.Button(
-    ButtonFrameInstructor, text="Delete", padx=20, pady=10, command=delete_entry_instructor)
-btnDeleteInstructor.pack(side=tk.LEFT)
+    idInstructor = tk.Label(instructor, text="ID:")
+    idInstructor.grid(row=0, column=4)
 
-btnClearInstructor = tk.Button(
-    ButtonFrameInstructor, text="Clear", padx=20, pady=10, command=clear_instructor_fields)
-btnClearInstructor.pack(side=tk.LEFT)
+    name_entry_Instructor = tk.Entry(instructor)
+    name_entry_Instructor.grid(row=1, column=0)
+    age_spinbox_Instructor = tk.Spinbox(instructor, from_=25, to=100)
+    age_spinbox_Instructor.grid(row=1, column=2)
+    email_entry_Instructor = tk.Entry(instructor)
+    email_entry_Instructor.grid(row=1, column=3)
+    id_entry_Instructor = tk.Entry(instructor)
+    id_entry_Instructor.grid(row=1, column=4)
 
-load_trv_with_instructor_data()
-# creating course label frame
-course = tk.LabelFrame(course_frame, text="New course")
-course.grid(row=2, column=0, sticky="news", padx=20, pady=10)
+    search_label_instructor = tk.Label(instructor, text="Search (name, ID or query):")
+    search_label_instructor.grid(row=2, column=0, padx=10, pady=5)
 
-# creating widget inside the course label frame
-name = tk.Label(course, text="Course Name:")
-name.grid(row=0, column=0)
+    search_entry_instructor = tk.Entry(instructor)
+    search_entry_instructor.grid(row=2, column=1, padx=10, pady=5)
 
-id = tk.Label(course, text="ID:")
-id.grid(row=0, column=1)
+    search_button_instructor = tk.Button(
+        instructor, text="Search", command=lambda: search_instructor(search_entry_instructor.get()))
+    search_button_instructor.grid(row=2, column=2, padx=10, pady=5)
 
-name_entry = tk.Entry(course)
-name_entry.grid(row=1, column=0)
-id_entry = tk.Entry(course)
-id_entry.grid(row=1, column=1)
+    clear_button_instructor = tk.Button(instructor, text="Clear Search",
+                                        command=load_trv_with_instructor_data)  # To reload all instructor data
+    clear_button_instructor.grid(row=2, column=3, padx=10, pady=5)
 
-Instructor = tk.Label(course, text="Assign Instructor")
-Instructor.grid(row=0, column=2)
+    # Add a Treeview to display instructor data
+    trv_instructor = ttk.Treeview(instructor, columns=(
+        1, 2, 3, 4), show="headings", height="16")
+    trv_instructor.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
 
-Instructor = ttk.Combobox(course)
-# I have to fix this and add the available instructors
-Instructor.grid(row=1, column=2)
+    trv_instructor.heading(1, text="Name", anchor="center",
+                           command=lambda: sort_treeview("instructor", "name"))
+    trv_instructor.heading(2, text="Age", anchor="center",
+                           command=lambda: sort_treeview("instructor", "age"))
+    trv_instructor.heading(3, text="Email", anchor="center",
+                           command=lambda: sort_treeview("instructor", "email"))
+    trv_instructor.heading(4, text="ID", anchor="center",
+                           command=lambda: sort_treeview("instructor", "id"))
 
-submit_button = tk.Button(course, text="Submit")
-submit_button.grid(row=2, column=0)
+    btnMoreInstructors = tk.Button(instructor, text="More Rows", state="disabled",
+                                   command=lambda: show_next_page("instructor"))
+    btnMoreInstructors.grid(row=22, column=0, padx=10, pady=5)
 
-# Add search functionality for course frame
+    trv_instructor.column("#1", anchor="w", width=140, stretch=True)
+    trv_instructor.column("#2", anchor="w", width=140, stretch=True)
+    trv_instructor.column("#3", anchor="w", width=140, stretch=True)
+    trv_instructor.column("#4", anchor="w", width=140, stretch=True)
 
+    trv_instructor.bind("<ButtonRelease>", MouseButtonUpCallBackInstructor)
 
-def load_trv_with_course_data():
-    """
-    Loads course data into the TreeView widget from the global course data list.
-    Clears existing entries before adding new ones.
-    """
-    global course_data_list
-    # Clear the current content in the course TreeView
-    remove_all_data_from_trv_course()
+    # --- INSTRUCTOR BUTTONS ---
 
-    # Populate TreeView with course data
-    rowIndex = 1
-    for course in course_data_list:
-        trv_course.insert('', index='end', iid=rowIndex, text="", values=(
-            course["course_name"], course["id"], course["instructor_name"]))
-        rowIndex += 1
+    ButtonFrameInstructor = tk.LabelFrame(
+        instructor, text='', bg="lightgray", font=('Consolas', 14))
+    ButtonFrameInstructor.grid(row=5, column=0, columnspan=6)
 
+    btnAddInstructor = tk.Button(
+        ButtonFrameInstructor, text="Add", padx=20, pady=10, command=add_entry_instructor)
+    btnAddInstructor.pack(side=tk.LEFT)
 
-search_label_course = tk.Label(course, text="Search by Course Name or ID:")
-search_label_course.grid(row=2, column=0, padx=10, pady=5)
+    btnUpdateInstructor = tk.Button(
+        ButtonFrameInstructor, text="Update", padx=20, pady=10, command=update_entry_instructor)
+    btnUpdateInstructor.pack(side=tk.LEFT)
 
-search_entry_course = tk.Entry(course)
-search_entry_course.grid(row=2, column=1, padx=10, pady=5)
+    btnDeleteInstructor = tk.Button(
+        ButtonFrameInstructor, text="Delete", padx=20, pady=10, command=delete_entry_instructor)
+    btnDeleteInstructor.pack(side=tk.LEFT)
 
-search_button_course = tk.Button(
-    course, text="Search", command=lambda: search_course(search_entry_course.get()))
-search_button_course.grid(row=2, column=2, padx=10, pady=5)
+    btnClearInstructor = tk.Button(
+        ButtonFrameInstructor, text="Clear", padx=20, pady=10, command=clear_instructor_fields)
+    btnClearInstructor.pack(side=tk.LEFT)
 
-clear_button_course = tk.Button(
-    course, text="Clear Search", command=load_trv_with_course_data)
-clear_button_course.grid(row=2, column=3, padx=10, pady=5)
-# Add TreeView to display course data
-trv_course = ttk.Treeview(course, columns=(
-    1, 2, 3), show="headings", height="16")
-trv_course.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
+    load_trv_with_instructor_data()
 
-trv_course.heading(1, text="Course Name", anchor="center")
-trv_course.heading(2, text="Course ID", anchor="center")
-trv_course.heading(3, text="Instructor", anchor="center")
 
-trv_course.column("#1", anchor="w", width=140, stretch=True)
-trv_course.column("#2", anchor="w", width=140, stretch=True)
-trv_course.column("#3", anchor="w", width=140, stretch=True)
+def load_trv_with_course_data():
+    """
+    Shows the first page of the courses in the course TreeView.
+    """
+    fill_table("course")
+
 
-for widget in course.winfo_children():
-    widget.grid_configure(padx=10, pady=5)
+def course_row_values(course):
+    """
+    Returns the Treeview values (name, ID, instructor) of a course record.
+    """
+    return derived_values.for_record("row", "course", course, lambda record: (
+        record["course_name"], record["id"], record["instructor_name"]))
 
 
 # -------courses functions--------
 def search_course(search_value):
     """
-    Searches and displays courses by name or ID in the TreeView based on the search value.
+    Searches and displays courses by name, ID or query (see query.py) in the TreeView.
     """
-    # Clear current Treeview for courses
-    remove_all_data_from_trv_course()
+    results = run_query(course_query, search_value) if search_value.strip() else course_data_list
+    if results is None:
+        return
 
-    # Search for courses matching by name or ID
-    rowIndex = 1
-    for key in course_data_list:
-        if search_value.lower() in key["course_name"].lower() or search_value == key["id"]:
-            trv_course.insert('', index='end', iid=rowIndex, text="", values=(
-                key["course_name"], key["id"], key["instructor_name"]))
-            rowIndex += 1
+    matches = {id(key) for key in results} if search_value.strip() else None
+    fill_table("course", matches)
 
     # If no match found
-    if rowIndex == 1:
+    if not results:
         messagebox.showinfo(
             "Search Result", "No course found with that Name or ID")
 
@@ -935,7 +1871,10 @@ def clear_course_fields():
     """
     name_entry.delete(0, tk.END)
     id_entry.delete(0, tk.END)
-    Instructor.set('')  # Clear the instructor dropdown
+    capacity_entry.delete(0, tk.END)
+    meetings_entry.delete(0, tk.END)
+    room_entry.delete(0, tk.END)
+    instructor_dropdown.set('')  # Clear the instructor dropdown
 
 
 def find_course_row(value):
@@ -963,9 +1902,10 @@ def add_entry_course():
     """
     course_name = name_entry.get()
     course_id = id_entry.get()
-    instructor_name = Instructor.get()
+    instructor_name = instructor_dropdown.get()
 
-    process_course_request('_INSERT_', course_name, course_id, instructor_name)
+    process_course_request('_INSERT_', course_name, course_id, instructor_name, capacity_entry.get(),
+                           meetings_entry.get(), room_entry.get())
 
 
 def update_entry_course():
@@ -974,9 +1914,10 @@ def update_entry_course():
     """
     course_name = name_entry.get()
     course_id = id_entry.get()
-    instructor_name = Instructor.get()
+    instructor_name = instructor_dropdown.get()
 
-    process_course_request('_UPDATE_', course_name, course_id, instructor_name)
+    process_course_request('_UPDATE_', course_name, course_id, instructor_name, capacity_entry.get(),
+                           meetings_entry.get(), room_entry.get())
 
 
 def delete_entry_course():
@@ -987,42 +1928,62 @@ def delete_entry_course():
     process_course_request('_DELETE_', course_name, None, None)
 
 
-def process_course_request(command_type, course_name_value, course_id_value, instructor_name_value):
+def process_course_request(command_type, course_name_value, course_id_value, instructor_name_value,
+                           capacity_value="", meetings_value="", room_value=""):
     """
     Processes insert, update, or delete requests for course data and refreshes the TreeView.
-    """
-    global course_data_list
+    An empty capacity means the course has no seat limit. Meetings are entered as
+    "Mon 09:00-10:15, Wed 09:00-10:15"; a course may not meet when its instructor
+    or its room is booked by another course.
+    """
+    meetings, room = [], room_value.strip() or None
+    if command_type in ("_INSERT_", "_UPDATE_"):
+        row = find_course_row(course_name_value) if command_type == "_UPDATE_" else -1
+        record = {"type": "course", "id": course_id_value, "name": course_name_value,
+                  "capacity": str(capacity_value).strip()}
+        if not form_is_valid(record, course_data_list, course_data_list[row]["id"] if row >= 0 else None):
+            return
+        try:
+            meetings = [str(meeting) for meeting in parse_meetings(meetings_value)]
+        except ValueError as error:
+            messagebox.showwarning("Invalid Meetings", str(error))
+            return
+        others = [course for n, course in enumerate(course_data_list) if n != row]
+        clashes = booking_clashes({"id": course_id_value, "instructor_name": instructor_name_value,
+                                   "meetings": meetings, "room": room}, others)
+        if clashes:
+            messagebox.showwarning("Time Clash", "\n".join(
+                f"The {kind} is booked by course {course_id} at that time" for kind, course_id in clashes))
+            return
+    capacity = int(capacity_value) if str(capacity_value).strip() else None
 
     if command_type == "_UPDATE_":
         row = find_course_row(course_name_value)
         if row >= 0:
-            data = {"course_name": course_name_value,
-                    "id": course_id_value, "instructor_name": instructor_name_value}
-            course_data_list[row] = data
+            old = course_data_list[row]
+            data = dict(old, course_name=course_name_value, id=course_id_value,
+                        instructor_name=instructor_name_value,
+                        enrolled_students=old.get("enrolled_students", []), capacity=capacity,
+                        meetings=meetings, room=room)
+            course_store.replace(old, data)
+            if seat_desk.is_open(course_name_value):
+                apply_promotions(data, seat_desk.set_capacity(course_name_value, capacity))
 
     if command_type == "_INSERT_":
-        data = {"course_name": course_name_value,
-                "id": course_id_value, "instructor_name": instructor_name_value}
-        course_data_list.append(data)
+        data = {"course_name": course_name_value, "id": course_id_value,
+                "instructor_name": instructor_name_value, "enrolled_students": [],
+                "capacity": capacity, "meetings": meetings, "room": room, "campus": CAMPUS or ""}
+        course_store.insert(data)
 
     if command_type == "_DELETE_":
         row = find_course_row(course_name_value)
         if row >= 0:
-            del course_data_list[row]
+            course_store.delete(course_data_list[row])
+            seat_desk.close(course_name_value)
 
-    load_trv_with_course_data()
     clear_course_fields()
 
 
-# Dropdown for available instructors in course frame
-Instructor = ttk.Combobox(course)
-Instructor.grid(row=1, column=2)
-Instructor['values'] = [instructor['n_entry']
-                        # Populate with instructor names
-                        for instructor in instructor_data_list]
-Instructor.set('')  # Clear the default value
-
-
 def MouseButtonUpCallBackCourse(event):
     """
     Loads the selected course's details into the input fields when clicked in the TreeView.
@@ -1043,31 +2004,484 @@ def load_course_field_with_row_data(_tuple):
     name_entry.insert(0, _tuple[0])
     id_entry.delete(0, tk.END)
     id_entry.insert(0, _tuple[1])
-    Instructor.set(_tuple[2])  # Set the instructor in the dropdown
+    instructor_dropdown.set(_tuple[2])  # Set the instructor in the dropdown
+    capacity_entry.delete(0, tk.END)
+    course = find_course(_tuple[0])
+    if course is not None and course.get("capacity") is not None:
+        capacity_entry.insert(0, course["capacity"])
+    meetings_entry.delete(0, tk.END)
+    room_entry.delete(0, tk.END)
+    if course is not None:
+        meetings_entry.insert(0, ", ".join(course.get("meetings") or ()))
+        room_entry.insert(0, course.get("room") or "")
+
+
+def build_course_tab():
+    """
+    Builds the Courses tab, its instructor dropdown and its Treeview.
+    """
+    global course, name, id_label_course, name_entry, id_entry, instructor_dropdown
+    global submit_button, search_label_course, search_entry_course, search_button_course
+    global clear_button_course, trv_course, ButtonFrameCourse, btnAddCourse
+    global btnUpdateCourse, btnDeleteCourse, btnClearCourse, capacity_label, capacity_entry
+    global btnAssignCourse, meetings_label, meetings_entry, room_label, room_entry, btnMoreCourses
+
+    # creating course label frame
+    course = tk.LabelFrame(course_frame, text="New course")
+    course.grid(row=2, column=0, sticky="news", padx=20, pady=10)
+
+    # creating widget inside the course label frame
+    name = tk.Label(course, text="Course Name:")
+    name.grid(row=0, column=0)
+
+    id_label_course = tk.Label(course, text="ID:")
+    id_label_course.grid(row=0, column=1)
+
+    name_entry = tk.Entry(course)
+    name_entry.grid(row=1, column=0)
+    id_entry = tk.Entry(course)
+    id_entry.grid(row=1, column=1)
+
+    capacity_label = tk.Label(course, text="Capacity:")
+    capacity_label.grid(row=0, column=3)
+    capacity_entry = tk.Entry(course)
+    capacity_entry.grid(row=1, column=3)
+
+    meetings_label = tk.Label(course, text="Meetings (Mon 09:00-10:15, ...):")
+    meetings_label.grid(row=0, column=4)
+    meetings_entry = tk.Entry(course)
+    meetings_entry.grid(row=1, column=4)
+
+    room_label = tk.Label(course, text="Room:")
+    room_label.grid(row=0, column=5)
+    room_entry = tk.Entry(course)
+    room_entry.grid(row=1, column=5)
+
+    instructor_label_course = tk.Label(course, text="Assign Instructor")
+    instructor_label_course.grid(row=0, column=2)
+
+    instructor_dropdown = ttk.Combobox(course)
+    # I have to fix this and add the available instructors
+    instructor_dropdown.grid(row=1, column=2)
+
+    submit_button = tk.Button(course, text="Submit")
+    submit_button.grid(row=2, column=0)
+
+    # Add search functionality for course frame
+    search_label_course = tk.Label(course, text="Search (course name, ID or query):")
+    search_label_course.grid(row=2, column=0, padx=10, pady=5)
+
+    search_entry_course = tk.Entry(course)
+    search_entry_course.grid(row=2, column=1, padx=10, pady=5)
+
+    search_button_course = tk.Button(
+        course, text="Search", command=lambda: search_course(search_entry_course.get()))
+    search_button_course.grid(row=2, column=2, padx=10, pady=5)
+
+    clear_button_course = tk.Button(
+        course, text="Clear Search", command=load_trv_with_course_data)
+    clear_button_course.grid(row=2, column=3, padx=10, pady=5)
+    # Add TreeView to display course data
+    trv_course = ttk.Treeview(course, columns=(
+        1, 2, 3), show="headings", height="16", selectmode="extended")
+    trv_course.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
+
+    trv_course.heading(1, text="Course Name", anchor="center",
+                       command=lambda: sort_treeview("course", "course_name"))
+    trv_course.heading(2, text="Course ID", anchor="center",
+                       command=lambda: sort_treeview("course", "id"))
+    trv_course.heading(3, text="Instructor", anchor="center",
+                       command=lambda: sort_treeview("course", "instructor"))
+
+    btnMoreCourses = tk.Button(course, text="More Rows", state="disabled",
+                               command=lambda: show_next_page("course"))
+    btnMoreCourses.grid(row=22, column=0, padx=10, pady=5)
+
+    trv_course.column("#1", anchor="w", width=140, stretch=True)
+    trv_course.column("#2", anchor="w", width=140, stretch=True)
+    trv_course.column("#3", anchor="w", width=140, stretch=True)
+
+    for widget in course.winfo_children():
+        widget.grid_configure(padx=10, pady=5)
+
+    # Dropdown for available instructors in course frame
+    instructor_dropdown = ttk.Combobox(course)
+    instructor_dropdown.grid(row=1, column=2)
+    instructor_dropdown['values'] = [instructor['n_entry']
+                                     # Populate with instructor names
+                                     for instructor in instructor_data_list]
+    instructor_dropdown.set('')  # Clear the default value
+
+    # --- COURSE BUTTONS ---
+    ButtonFrameCourse = tk.LabelFrame(
+        course, text='', bg="lightgray", font=('Consolas', 14))
+    ButtonFrameCourse.grid(row=5, column=0, columnspan=6)
+
+    btnAddCourse = tk.Button(ButtonFrameCourse, text="Add",
+                             padx=20, pady=10, command=add_entry_course)
+    btnAddCourse.pack(side=tk.LEFT)
+
+    btnUpdateCourse = tk.Button(
+        ButtonFrameCourse, text="Update", padx=20, pady=10, command=update_entry_course)
+    btnUpdateCourse.pack(side=tk.LEFT)
+
+    btnDeleteCourse = tk.Button(
+        ButtonFrameCourse, text="Delete", padx=20, pady=10, command=delete_entry_course)
+    btnDeleteCourse.pack(side=tk.LEFT)
+
+    btnClearCourse = tk.Button(
+        ButtonFrameCourse, text="Clear", padx=20, pady=10, command=clear_course_fields)
+    btnClearCourse.pack(side=tk.LEFT)
+
+    btnAssignCourse = tk.Button(
+        ButtonFrameCourse, text="Assign Instructor to Selected", padx=20, pady=10,
+        command=assign_instructor_to_selected_courses)
+    btnAssignCourse.pack(side=tk.LEFT)
+
+    trv_course.bind("<ButtonRelease>", MouseButtonUpCallBackCourse)
+
+    load_trv_with_course_data()
+
+
+# --- ATTENDANCE SECTION ---
+
+attendance_frame = tk.Frame(window)
+attendance_frame.pack(fill="both", expand=True)
+notebook.add(attendance_frame, text="Attendance")
+
+
+def students_in_course(course_id):
+    """
+    Returns the students of `my_data_list` registered for a course, matched by
+    course ID or course name.
+    """
+    course = next((c for c in course_data_list if c['id'] == course_id), None)
+    by_id = derived_values.enrollment(course_id, my_data_list)
+    if not course:
+        return by_id
+    by_name = derived_values.enrollment(course['course_name'], my_data_list)
+    listed = {id(student) for student in by_id}
+    return by_id + [student for student in by_name if id(student) not in listed]
+
+
+def load_trv_with_attendance():
+    """
+    Shows the roster of the selected course with each student's mark for the
+    selected date and their overall attendance rate in that course.
+    """
+    for item in trv_attendance.get_children():
+        trv_attendance.delete(item)
+
+    course_id = attendance_course_dropdown.get()
+    if not course_id:
+        return
+    try:
+        day = attendance_date_entry.get()
+        status_of = {True: "Present", False: "Absent", None: ""}
+        for student in students_in_course(course_id):
+            status = attendance_store.is_present(course_id, day, student.student_id)
+            rate = attendance_store.student_course_rate(student.student_id, course_id)
+            trv_attendance.insert('', index='end', iid=id(student), text="", values=(
+                student.name, student.student_id, status_of[status],
+                "" if rate is None else f"{rate:.0%}"))
+    except ValueError:
+        messagebox.showwarning("Error", "Date must be in YYYY-MM-DD format")
+        return
+
+    rate = attendance_store.course_rate(course_id)
+    attendance_rate_label.config(
+        text=f"Course attendance rate: {'-' if rate is None else f'{rate:.0%}'}")
+
+
+def mark_selected_attendance(present):
+    """
+    Marks every selected student in the attendance Treeview as present or absent.
+    """
+    course_id = attendance_course_dropdown.get()
+    # Rows are keyed by id(student), since two students may share an ID
+    roster = {id(student): student for student in students_in_course(course_id)} if course_id else {}
+    selected = [roster[int(iid)] for iid in trv_attendance.selection() if int(iid) in roster]
+    if not course_id or not selected:
+        messagebox.showwarning("Error", "Select a course and at least one student")
+        return
+    student_ids = list(dict.fromkeys(student.student_id for student in selected))
+    try:
+        attendance_store.mark_many(course_id, attendance_date_entry.get(),
+                                   student_ids if present else (), () if present else student_ids)
+    except ValueError:
+        messagebox.showwarning("Error", "Date must be in YYYY-MM-DD format")
+        return
+    load_trv_with_attendance()
+
+
+def build_attendance_tab():
+    """
+    Builds the Attendance tab and opens the attendance store.
+    """
+    global attendance_store, attendance, attendance_course_label
+    global attendance_course_dropdown, attendance_date_label, attendance_date_entry
+    global attendance_rate_label, trv_attendance, ButtonFrameAttendance
+    global btnShowAttendance, btnPresent, btnAbsent
+
+    attendance_store = AttendanceStore()
+
+    attendance = tk.LabelFrame(attendance_frame, text="Attendance")
+    attendance.grid(row=0, column=0, sticky="news", padx=20, pady=10)
+
+    attendance_course_label = tk.Label(attendance, text="Course:")
+    attendance_course_label.grid(row=0, column=0)
+
+    attendance_course_dropdown = ttk.Combobox(attendance)
+    attendance_course_dropdown['values'] = [course['id'] for course in course_data_list]
+    attendance_course_dropdown.grid(row=0, column=1)
+
+    attendance_date_label = tk.Label(attendance, text="Date (YYYY-MM-DD):")
+    attendance_date_label.grid(row=0, column=2)
+
+    attendance_date_entry = tk.Entry(attendance)
+    attendance_date_entry.insert(0, datetime.date.today().isoformat())
+    attendance_date_entry.grid(row=0, column=3)
+
+    attendance_rate_label = tk.Label(attendance, text="Course attendance rate: -")
+    attendance_rate_label.grid(row=2, column=0, columnspan=4)
+
+    trv_attendance = ttk.Treeview(attendance, columns=(
+        1, 2, 3, 4), show="headings", height="16")
+    trv_attendance.grid(row=6, column=0, sticky="news", rowspan=16, columnspan=4)
+
+    trv_attendance.heading(1, text="Name", anchor="center")
+    trv_attendance.heading(2, text="ID", anchor="center")
+    trv_attendance.heading(3, text="Status", anchor="center")
+    trv_attendance.heading(4, text="Attendance Rate", anchor="center")
+
+    trv_attendance.column("#1", anchor="w", width=140, stretch=True)
+    trv_attendance.column("#2", anchor="w", width=140, stretch=True)
+    trv_attendance.column("#3", anchor="w", width=140, stretch=True)
+    trv_attendance.column("#4", anchor="w", width=140, stretch=True)
+
+    attendance_course_dropdown.bind("<<ComboboxSelected>>", lambda event: load_trv_with_attendance())
 
+    # --- ATTENDANCE BUTTONS ---
+    ButtonFrameAttendance = tk.LabelFrame(
+        attendance, text='', bg="lightgray", font=('Consolas', 14))
+    ButtonFrameAttendance.grid(row=5, column=0, columnspan=6)
 
-# --- COURSE BUTTONS ---
-ButtonFrameCourse = tk.LabelFrame(
-    course, text='', bg="lightgray", font=('Consolas', 14))
-ButtonFrameCourse.grid(row=5, column=0, columnspan=6)
+    btnShowAttendance = tk.Button(ButtonFrameAttendance, text="Show", padx=20,
+                                  pady=10, command=load_trv_with_attendance)
+    btnShowAttendance.pack(side=tk.LEFT)
 
-btnAddCourse = tk.Button(ButtonFrameCourse, text="Add",
-                         padx=20, pady=10, command=add_entry_course)
-btnAddCourse.pack(side=tk.LEFT)
+    btnPresent = tk.Button(ButtonFrameAttendance, text="Mark Present", padx=20,
+                           pady=10, command=lambda: mark_selected_attendance(True))
+    btnPresent.pack(side=tk.LEFT)
 
-btnUpdateCourse = tk.Button(
-    ButtonFrameCourse, text="Update", padx=20, pady=10, command=update_entry_course)
-btnUpdateCourse.pack(side=tk.LEFT)
+    btnAbsent = tk.Button(ButtonFrameAttendance, text="Mark Absent", padx=20,
+                          pady=10, command=lambda: mark_selected_attendance(False))
+    btnAbsent.pack(side=tk.LEFT)
 
-btnDeleteCourse = tk.Button(
-    ButtonFrameCourse, text="Delete", padx=20, pady=10, command=delete_entry_course)
-btnDeleteCourse.pack(side=tk.LEFT)
+    for widget in attendance.winfo_children():
+        widget.grid_configure(padx=10, pady=5)
+
+
+# --- CHANGE SUBSCRIBERS ---
+# Each subscriber does only what one change needs: the sort indexes move one
+# record, a Treeview inserts, edits or removes one row, and the student file is
+# written once per transaction. The view subscribers take a transaction's
+# changes together, so dropdowns and the attendance list are redone once. Tabs that have not been built yet are skipped;
+# they read the current data when they are built.
+
+stores = {"student": student_store, "instructor": instructor_store, "course": course_store}
+sorters = {"student": student_sorter, "instructor": instructor_sorter, "course": course_sorter}
+
+
+def update_sort_indexes(event):
+    """
+    Keeps the presorted column indexes of the changed table up to date.
+    """
+    sorter = sorters[event.entity]
+    if event.kind == RELOADED:
+        records = stores[event.entity].records
+        snapshot = sort_snapshots.pop(event.entity, None)
+        if snapshot is not None:
+            try:
+                sorter.restore(records, snapshot)
+                return
+            except ValueError:
+                pass
+        sorter.rebuild(records)
+    elif event.kind == INSERTED:
+        sorter.insert(event.record)
+    elif event.kind == DELETED:
+        sorter.remove(event.record)
+    else:
+        sorter.replace(event.old_record or event.record, event.record)
+
+
+def apply_change_to_tree(tree, sorter, event, values_of, more_pending=False):
+    """
+    Applies one change event to a Treeview without redrawing it.
+
+    An updated row keeps its place unless a sort column is selected, in which
+    case it moves to its sorted position among the rows currently shown. Rows
+    hidden by a search stay hidden. With `more_pending` (pages of the table
+    not shown yet), a row that sorts after every shown row is left for a
+    later page.
+    """
+    old = event.old_record if event.old_record is not None else event.record
+    if event.kind == DELETED:
+        if tree.exists(id(old)):
+            tree.delete(id(old))
+        return
+    position = 'end'
+    if event.kind == UPDATED:
+        if not tree.exists(id(old)):
+            return
+        position = tree.index(id(old))
+        tree.delete(id(old))
+    for following in sorter.following(event.record):
+        if tree.exists(id(following)):
+            position = tree.index(id(following))
+            break
+    else:
+        if more_pending:
+            return
+        if sorter.column is not None:
+            position = 'end'
+    tree.insert('', index=position, iid=id(event.record), text="",
+                values=values_of(event.record))
+
+
+def refresh_student_view(events):
+    if "trv" not in globals():
+        return
+    if any(event.kind == RELOADED for event in events):
+        load_trv_with_json()
+    else:
+        for event in events:
+            apply_change_to_tree(trv, student_sorter, event, student_row_values,
+                                 page_cursors.get("student") is not None)
+    roster_fields = {"name", "student_id", "registered_courses"}
+    if "trv_attendance" in globals() and any(
+            event.kind != UPDATED or roster_fields & set(event.changes) for event in events):
+        load_trv_with_attendance()
+
+
+def refresh_instructor_view(events):
+    if "trv_instructor" in globals():
+        if any(event.kind == RELOADED for event in events):
+            load_trv_with_instructor_data()
+        else:
+            for event in events:
+                apply_change_to_tree(trv_instructor, instructor_sorter, event, instructor_row_values,
+                                     page_cursors.get("instructor") is not None)
+    if "instructor_dropdown" in globals() and any(
+            event.kind != UPDATED or "n_entry" in event.changes for event in events):
+        instructor_dropdown['values'] = [instructor['n_entry'] for instructor in instructor_data_list]
+
+
+def refresh_course_view(events):
+    if "trv_course" in globals():
+        if any(event.kind == RELOADED for event in events):
+            load_trv_with_course_data()
+        else:
+            for event in events:
+                apply_change_to_tree(trv_course, course_sorter, event, course_row_values,
+                                     page_cursors.get("course") is not None)
+    if not any(event.kind != UPDATED or {"course_name", "id"} & set(event.changes) for event in events):
+        return
+    if "course_dropdown" in globals():
+        course_dropdown['values'] = [course['course_name'] for course in course_data_list]
+    if "attendance_course_dropdown" in globals():
+        attendance_course_dropdown['values'] = [course['id'] for course in course_data_list]
+
+
+def persist_records(events):
+    global save_pending
+    # Until the students are read, saving would write the file without them
+    save_pending = hydrating
+    if not hydrating:
+        save_json_to_file()
+
+
+bus.subscribe(update_sort_indexes)
+bus.subscribe(refresh_student_view, entities=("student",), batch=True)
+bus.subscribe(refresh_instructor_view, entities=("instructor",), batch=True)
+bus.subscribe(refresh_course_view, entities=("course",), batch=True)
+bus.subscribe(persist_records, entities=("student", "instructor", "course"),
+              kinds=(INSERTED, UPDATED, DELETED), batch=True)
+bus.subscribe(record_in_replica, entities=("student",))
+bus.subscribe(reset_seats, kinds=(RELOADED,))
+audit_log.attach(bus)
+record_history.attach(bus, {"student": student_store, "instructor": instructor_store,
+                            "course": course_store})
+
+
+# --- TAB CONSTRUCTION ---
+# Tabs are built the first time they are shown, so the window appears before
+# any Treeview is filled or any data file is read. Set SMS_EAGER_TABS=1 to
+# build every tab up front instead.
+LAZY_TABS = os.environ.get("SMS_EAGER_TABS") != "1"
+
+tab_builders = {
+    str(student_frame): build_student_tab,
+    str(instructor_frame): build_instructor_tab,
+    str(course_frame): build_course_tab,
+    str(attendance_frame): build_attendance_tab,
+}
+
+
+def build_selected_tab(event=None):
+    """
+    Builds the currently selected notebook tab if it has not been built yet.
+    """
+    builder = tab_builders.pop(notebook.select(), None)
+    if builder is not None:
+        builder()
+        startup_times.setdefault("first_tab", time.time() - STARTUP_STARTED)
+        report_startup()
+
+
+def record_first_window(event):
+    """
+    Records the time from process start until the main window is first mapped.
+    """
+    if event.widget is window and "first_window" not in startup_times:
+        startup_times["first_window"] = time.time() - STARTUP_STARTED
+        report_startup()
+
+
+def report_startup():
+    """
+    With SMS_STARTUP_PROBE=1 (see startup_benchmark.py), prints the startup
+    timings once both are known and closes the application.
+    """
+    if os.environ.get("SMS_STARTUP_PROBE") != "1":
+        return
+    if "first_window" in startup_times and "first_tab" in startup_times:
+        print(f"first_window={startup_times['first_window']:.4f} "
+              f"first_tab={startup_times['first_tab']:.4f}", flush=True)
+        window.after_idle(window.destroy)
 
-btnClearCourse = tk.Button(
-    ButtonFrameCourse, text="Clear", padx=20, pady=10, command=clear_course_fields)
-btnClearCourse.pack(side=tk.LEFT)
 
-trv_course.bind("<ButtonRelease>", MouseButtonUpCallBackCourse)
+startup_times = {}
+window.bind("<Map>", record_first_window)
 
+if LAZY_TABS:
+    notebook.bind("<<NotebookTabChanged>>", build_selected_tab)
+    window.after_idle(build_selected_tab)
+else:
+    for builder in list(tab_builders.values()):
+        builder()
+    tab_builders.clear()
+    startup_times["first_tab"] = time.time() - STARTUP_STARTED
 
 window.mainloop()
+# The window goes first, so writing the warm-start cache does not delay closing
+try:
+    window.destroy()
+except tk.TclError:
+    pass
+save_warm_cache()
+audit_log.close()
+record_history.close()
+if outbox is not None:
+    outbox.close(OUTBOX_CLOSE_TIMEOUT)
@@ -0,0 +1,267 @@
+"""
+validation.py
+=============
+
+Rule-based validation of students, instructors and courses, shared by
+`Person`, both GUIs and the data-file importers.
+
+The rules are built once, when the module is imported: patterns are
+compiled and ranges fixed, so checking a record only runs them. A
+`Validator` checks canonical records (the version-2 layout of schema.py,
+see `student_record` and friends) one at a time or a whole batch in one
+pass, and reports every problem of a record instead of stopping at the
+first one.
+
+Rules:
+------
+- required   : ID and name are not empty
+- email      : the address looks like name@domain.tld
+- age        : a whole number from 0 to MAX_AGE
+- capacity   : empty or a whole number of seats
+- unique ID  : no other record of the same type has the ID
+- course     : every course a person lists exists (by name or ID)
+
+Usage:
+------
+    python validation.py DATA_FILE
+
+lists every invalid record of a data file (any schema version).
+
+Classes:
+--------
+- Rule
+- Issue
+- Validator
+
+Functions:
+----------
+- check_person
+- validate_file
+"""
+
+import re
+import sys
+from collections import namedtuple
+
+# Matched against the whole value: no whitespace or control characters, which
+# could break an email header (e.g. "a@b.c\nBcc: ..."), anywhere in it
+_EMAIL_CHAR = r"[^@\s\x00-\x1f\x7f]"
+EMAIL_PATTERN = re.compile(rf"{_EMAIL_CHAR}+@{_EMAIL_CHAR}+\.{_EMAIL_CHAR}+")
+MAX_AGE = 150
+
+Rule = namedtuple("Rule", "name field check")
+Rule.__doc__ = """One validation rule: check(value, context) returns an error message, or
+None if the field's value is fine. `context` is the `Validator` for rules
+that compare with other records, else unused."""
+
+Issue = namedtuple("Issue", "field rule message")
+Issue.__doc__ = """One problem of a record: the field, the rule it breaks and a message for the user."""
+
+
+def _required(label):
+    def check(value, context):
+        if value is None or not str(value).strip():
+            return f"{label} is required"
+        return None
+    return check
+
+
+def _email(value, context):
+    if not isinstance(value, str) or not EMAIL_PATTERN.fullmatch(value):
+        return "Invalid email format"
+    return None
+
+
+def _age(value, context):
+    try:
+        age = int(value)
+    except (TypeError, ValueError):
+        return "Age must be a whole number"
+    if age < 0:
+        return "Age cannot be negative"
+    if age > MAX_AGE:
+        return f"Age cannot be over {MAX_AGE}"
+    return None
+
+
+def _capacity(value, context):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not (isinstance(value, int) and value >= 0 or str(value).isdigit()):
+        return "Capacity must be a whole number of seats"
+    return None
+
+
+def _unique_id(value, context):
+    # The record's own ID (see `current_id`) is not a clash
+    value = str(value)
+    if value != context.current_id and value in context.ids.get(context.entity, ()):
+        return f"ID {value} is already in use"
+    return None
+
+
+def _courses(value, context):
+    # Checked against the known courses; a batch adds its own at the end
+    if context.courses is None:
+        return None
+    unknown = [str(course) for course in value if str(course) not in context.courses]
+    if unknown:
+        return f"Unknown course: {', '.join(unknown)}"
+    return None
+
+
+_PERSON_RULES = (
+    Rule("required", "id", _required("ID")),
+    Rule("required", "name", _required("Name")),
+    Rule("age", "age", _age),
+    Rule("email", "email", _email),
+    Rule("unique", "id", _unique_id),
+    Rule("course", "courses", _courses),
+)
+RULES = {
+    "student": _PERSON_RULES,
+    "instructor": _PERSON_RULES,
+    "course": (
+        Rule("required", "id", _required("ID")),
+        Rule("required", "name", _required("Name")),
+        Rule("capacity", "capacity", _capacity),
+        Rule("unique", "id", _unique_id),
+    ),
+}
+
+
+def check_person(age, email):
+    """
+    The checks `Person` makes on creation. Raises ValueError naming every
+    problem, e.g. "Age cannot be negative; Invalid email format".
+    """
+    problems = [message for message in (_age(age, None), _email(email, None)) if message]
+    if problems:
+        raise ValueError("; ".join(problems))
+
+
+class Validator:
+    """
+    Checks canonical records against `RULES`.
+
+    Parameters:
+    -----------
+    ids : dict, optional
+        entity -> IDs already taken, for the unique ID rule.
+    courses : iterable, optional
+        Names and IDs of the existing courses, for the course rule. Without
+        it, course references are not checked.
+    rules : dict, optional
+        entity -> rules, instead of `RULES`.
+    """
+
+    def __init__(self, ids=None, courses=None, rules=None):
+        self.rules = RULES if rules is None else rules
+        self.ids = {entity: {str(value) for value in values} for entity, values in (ids or {}).items()}
+        self.courses = None if courses is None else {str(course) for course in courses}
+        # Set while a record is checked, for the rules that compare
+        self.entity = None
+        self.current_id = None
+
+    def validate(self, record, current_id=None):
+        """
+        Every `Issue` of one record, in rule order (empty if it is valid).
+        Pass `current_id` when the record replaces one with that ID, so it
+        does not clash with itself.
+        """
+        self.entity = record["type"]
+        self.current_id = None if current_id is None else str(current_id)
+        issues = []
+        for rule in self.rules[self.entity]:
+            message = rule.check(record.get(rule.field), self)
+            if message is not None:
+                issues.append(Issue(rule.field, rule.name, message))
+        return issues
+
+    def validate_field(self, entity, field, value):
+        """
+        The messages of the rules on one field, e.g. for a bulk edit that
+        sets only that field (empty if the value is fine).
+        """
+        self.entity = entity
+        self.current_id = None
+        messages = (rule.check(value, self) for rule in self.rules[entity] if rule.field == field)
+        return [message for message in messages if message is not None]
+
+    def check(self, record, current_id=None):
+        """
+        Raises ValueError with every problem of the record.
+        """
+        issues = self.validate(record, current_id)
+        if issues:
+            raise ValueError("; ".join(issue.message for issue in issues))
+
+    def validate_batch(self, records):
+        """
+        Checks a batch of records in one pass. Each record's ID counts as
+        taken for the records after it, and the courses of the batch are
+        valid references wherever they appear in it.
+
+        Returns:
+        --------
+        dict
+            Row (0-based position in `records`) -> list of `Issue`, only for
+            the rows that have any.
+        """
+        known_courses = self.courses
+        # References are checked once the whole batch is seen
+        self.courses = None
+        references = []
+        problems = {}
+        try:
+            for row, record in enumerate(records):
+                issues = self.validate(record)
+                self.ids.setdefault(record["type"], set()).add(str(record.get("id")))
+                if record["type"] == "course":
+                    if known_courses is not None:
+                        known_courses.update((str(record.get("id")), str(record.get("name"))))
+                elif record.get("courses") and known_courses is not None:
+                    references.append((row, record["courses"]))
+                if issues:
+                    problems[row] = issues
+        finally:
+            self.courses = known_courses
+        for row, courses in references:
+            message = _courses(courses, self)
+            if message is not None:
+                problems.setdefault(row, []).append(Issue("courses", "course", message))
+        return problems
+
+
+def validate_file(path):
+    """
+    Validates every record of a data file in one pass; returns the (record
+    number, type, ID, issues) of the invalid ones.
+    """
+    from schema import iter_records   # schema imports Part12, which imports this module
+
+    labels = []
+
+    def records():
+        for record in iter_records(path):
+            labels.append((record["type"], record.get("id")))
+            yield record
+
+    problems = Validator(courses=()).validate_batch(records())
+    return [(row + 1,) + labels[row] + (problems[row],) for row in sorted(problems)]
+
+
+def main(args):
+    if not args:
+        print("Usage: python validation.py DATA_FILE")
+        return 1
+    invalid = validate_file(args[0])
+    for number, entity, record_id, issues in invalid:
+        print(f"record {number} ({entity} {record_id}): "
+              + "; ".join(issue.message for issue in issues))
+    print(f"{len(invalid)} invalid records")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))